@@ -1,56 +1,112 @@
 """
-Add 'source' Column
+Add 'source', 'page' and 'source_row' Columns
 Adds 'source' column at the very beginning (position 0) of each file
 Header row gets 'source', all other rows get 'mcs1996'
+Adds 'page' column at position 1 with the page number from the filename
+(used later to join commodity names and units onto the combined file)
+Adds 'source_row' column at position 2: the row each data row came from in
+the extracted table (world_production/), so every final row can be traced
+back to its edition, page and table row
 """
 
-import pandas as pd
+import re
 from pathlib import Path
 
+from cleaning_odd_pages import find_years_row
+from cleaning_script import find_year_row
+from csv_io import read_csv, to_csv
+from parallel_executor import exit_on_errors, run_per_file, print_summary
+
 # Configuration
 input_folder = "world_production_final_headers"
 output_folder = "world_production_with_source"
+extracted_folder = "world_production"        # cleaning_script.py input
+cleaned_folder = "world_production_cleaned"  # cleaning_odd_pages.py input
+source = "mcs1996"
 
-# Create output folder
-Path(output_folder).mkdir(exist_ok=True)
 
-print(f"Adding 'source' column to files in {input_folder}/...\n")
+def first_data_row(csv_name, extracted_folder=extracted_folder, cleaned_folder=cleaned_folder):
+    """Row of the extracted page table that the first data row comes from
 
-# Process each CSV file
-csv_files = list(Path(input_folder).glob("*.csv"))
+    cleaning_script.py and cleaning_odd_pages.py only cut rows off the top
+    (and bottom) of the table and merge_headers.py drops the second header
+    row, so data row i of the final table is extracted row first_data_row + i - 1.
+    The cuts are found again with the same functions on the same files.
+    """
+    extracted = read_csv(Path(extracted_folder) / csv_name, header=None)
+    cleaned = read_csv(Path(cleaned_folder) / csv_name, header=None)
+    cut_step_2 = max(0, find_year_row(extracted) - 1)
+    cut_step_3 = max(0, find_years_row(cleaned) - 1)
+    return cut_step_2 + cut_step_3 + 2
 
-for csv_file in csv_files:
-    print(f"Processing: {csv_file.name}")
-    
-    # Read CSV without headers
-    df = pd.read_csv(csv_file, header=None)
-    
-    print(f"  Original shape: {df.shape}")
-    
+
+def add_source_columns(df, page_num, first_row, source=source):
+    """Insert 'source', 'page' and 'source_row' columns at positions 0, 1 and 2"""
     # Create source column
     # First row gets 'source', all other rows get 'mcs1996'
-    source_column = ['source'] + ['mcs1996'] * (len(df) - 1)
-    
+    source_column = ['source'] + [source] * (len(df) - 1)
+
     # Insert at position 0 (very beginning)
     df.insert(0, 'source_col', source_column)
-    
-    print(f"  New shape: {df.shape}")
-    
+
+    # Create page column the same way: header 'page', all other rows the page number
+    page_column = ['page'] + [page_num] * (len(df) - 1)
+    df.insert(1, 'page_col', page_column)
+
+    # Extracted-table row of every data row
+    row_column = ['source_row'] + list(range(first_row, first_row + len(df) - 1))
+    df.insert(2, 'row_col', row_column)
+
+    return df
+
+
+def process_file(csv_file, output_folder=output_folder):
+    """Add 'source', 'page' and 'source_row' to one page CSV; returns (status, detail) for the summary"""
+    # Extract page number from filename (e.g., page_35_world_production.csv -> 35)
+    match = re.search(r'page_(\d+)', Path(csv_file).name)
+
+    if not match:
+        return 'skipped', "Could not extract page number from filename"
+
+    page_num = int(match.group(1))
+
+    # Read CSV without headers
+    df = read_csv(csv_file, header=None)
+    original_shape = df.shape
+
+    df = add_source_columns(df, page_num, first_data_row(Path(csv_file).name))
+
     # Save
-    output_file = Path(output_folder) / csv_file.name
-    df.to_csv(output_file, index=False, header=False)
-    
-    print(f"  ✓ Saved\n")
-
-print(f"{'='*60}")
-print(f"Done! Processed {len(csv_files)} files")
-print(f"Output: {output_folder}/")
-print(f"{'='*60}")
-
-# Show preview of first file
-if csv_files:
-    first_file = Path(output_folder) / csv_files[0].name
-    df_preview = pd.read_csv(first_file, header=None)
-    print("\nPreview of first file:")
-    print(df_preview.head())
-    
\ No newline at end of file
+    output_file = Path(output_folder) / Path(csv_file).name
+    to_csv(df, output_file, header=False)
+
+    return 'ok', f"{original_shape} → {df.shape}"
+
+
+def main():
+    # Create output folder
+    Path(output_folder).mkdir(exist_ok=True)
+
+    print(f"Adding 'source', 'page' and 'source_row' columns to files in {input_folder}/...\n")
+
+    # Process each CSV file
+    csv_files = list(Path(input_folder).glob("*.csv"))
+
+    results = run_per_file(process_file, csv_files, output_folder=output_folder)
+    counts = print_summary(results)
+    exit_on_errors(counts)
+
+    print(f"Done! Processed {len(csv_files)} files")
+    print(f"Output: {output_folder}/")
+    print(f"{'='*60}")
+
+    # Show preview of first file
+    if csv_files:
+        first_file = Path(output_folder) / csv_files[0].name
+        df_preview = read_csv(first_file, header=None)
+        print("\nPreview of first file:")
+        print(df_preview.head())
+
+
+if __name__ == "__main__":
+    main()
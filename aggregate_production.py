@@ -0,0 +1,146 @@
+"""
+Materialized Production Aggregates
+Precomputes the figures dashboards ask for from combined_world_production_cleaned.csv:
+    world_share  value / the table's 'World total' for the same year
+    yoy_growth   change from the previous year of the same table row
+    rank         position among the table's countries for the year (1 = largest)
+one row per production value (long format, like the query store), with
+vectorized groupby/rank operations over all refreshed commodities at once
+
+Results are stored per commodity in aggregates/<commodity>.csv, and
+aggregates/manifest.csv records a hash of each commodity's input rows: a
+rerun only recomputes commodities whose rows changed (and drops the files of
+commodities that are gone)
+
+Usage:
+    python aggregate_production.py          (refresh changed commodities)
+    python aggregate_production.py --all    (recompute everything)
+"""
+
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from csv_io import read_csv, to_csv
+from production_store import to_long
+from validation import TABLE_KEYS, world_total
+
+# Configuration
+input_file = "combined_world_production_cleaned.csv"
+output_folder = "aggregates"
+manifest_file = "manifest.csv"
+
+NOT_RANKED = [world_total, "Other countries"]
+ROW_KEYS = ['source', 'page', 'source_row']
+AGGREGATE_COLUMNS = ['source', 'commodity', 'country', 'type', 'units', 'year', 'flags', 'value',
+                     'world_total', 'world_share', 'yoy_growth', 'rank', 'page', 'source_row']
+
+
+def partition_file(commodity):
+    """File name for a commodity's aggregates (letters and digits only)"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(commodity)).strip('_') + ".csv"
+
+
+def partition_hashes(df):
+    """sha1 of each commodity's input rows (column order and row order included)"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    return {commodity: hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+            for commodity, hashes in row_hashes.groupby(df['commodity'].astype(str), sort=True)}
+
+
+def compute_aggregates(df):
+    """World share, year-over-year growth and rank for every value of the cleaned wide rows in df"""
+    long_df = to_long(df)
+    is_world = long_df['country'] == world_total
+
+    # World share: join each value to its table's World total for the year
+    totals = (long_df[is_world].groupby(TABLE_KEYS + ['year'])['value'].sum(min_count=1)
+              .rename('world_total'))
+    long_df = long_df.join(totals, on=TABLE_KEYS + ['year'])
+    long_df['world_share'] = long_df['value'] / long_df['world_total']
+
+    # Year-over-year growth along each table row and production type (a row pivots
+    # into one wide row per type, each holding one country's years)
+    long_df = long_df.sort_values(ROW_KEYS + ['type', 'year'], kind='stable')
+    long_df['yoy_growth'] = (long_df.groupby(ROW_KEYS + ['type'], dropna=False)['value']
+                             .pct_change(fill_method=None))
+
+    # Rank countries (not totals) within each table and year
+    ranked = ~long_df['country'].isin(NOT_RANKED)
+    long_df['rank'] = (long_df['value'].where(ranked)
+                       .groupby([long_df[key] for key in TABLE_KEYS + ['year']])
+                       .rank(method='min', ascending=False)
+                       .astype('Int64'))
+
+    return long_df.sort_values(['source', 'commodity', 'type', 'year', 'page', 'source_row'],
+                               kind='stable')[AGGREGATE_COLUMNS]
+
+
+def refresh(df, folder=output_folder, force=False):
+    """Recompute the commodities whose rows changed since the last run; returns (refreshed, removed)"""
+    folder = Path(folder)
+    folder.mkdir(exist_ok=True)
+    manifest_path = folder / manifest_file
+
+    hashes = partition_hashes(df)
+    previous = {}
+    if manifest_path.exists() and not force:
+        manifest = read_csv(manifest_path, dtype=str, keep_default_na=False)
+        previous = dict(zip(manifest['commodity'], manifest['input_hash']))
+
+    changed = [c for c, h in hashes.items()
+               if previous.get(c) != h or not (folder / partition_file(c)).exists()]
+    removed = [c for c in previous if c not in hashes]
+
+    if changed:
+        aggregates = compute_aggregates(df[df['commodity'].astype(str).isin(changed)])
+        for commodity, rows in aggregates.groupby(aggregates['commodity'].astype(str), sort=False):
+            to_csv(rows, folder / partition_file(commodity))
+        # Commodities with no production values still get a (header-only) file
+        for commodity in set(changed) - set(aggregates['commodity'].astype(str)):
+            to_csv(pd.DataFrame(columns=AGGREGATE_COLUMNS), folder / partition_file(commodity))
+
+    for commodity in removed:
+        (folder / partition_file(commodity)).unlink(missing_ok=True)
+
+    to_csv(pd.DataFrame({'commodity': list(hashes), 'file': [partition_file(c) for c in hashes],
+                         'input_hash': list(hashes.values())}), manifest_path)
+    return changed, removed
+
+
+def load_aggregates(commodity=None, folder=output_folder):
+    """Precomputed aggregates for one commodity (or all of them) as a DataFrame"""
+    folder = Path(folder)
+    manifest = read_csv(folder / manifest_file, dtype=str, keep_default_na=False)
+    if commodity is not None:
+        manifest = manifest[manifest['commodity'] == commodity]
+    frames = [read_csv(folder / name) for name in manifest['file']]
+    if not frames:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    force = "--all" in sys.argv[1:]
+    print(f"Materializing aggregates from {input_file}...\n")
+
+    df = read_csv(input_file)
+    changed, removed = refresh(df, output_folder, force=force)
+
+    commodities = df['commodity'].nunique()
+    print(f"{'='*60}")
+    print(f"✓ Refreshed {len(changed)} of {commodities} commodities in: {output_folder}/")
+    for commodity in changed[:10]:
+        print(f"  - {commodity}")
+    if len(changed) > 10:
+        print(f"  ... and {len(changed) - 10} more")
+    if removed:
+        print(f"Removed {len(removed)} commodities no longer in the input")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
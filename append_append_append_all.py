@@ -1,60 +1,92 @@
 """
 Combine All CSV Files
 Appends all individual CSV files into one master file
+Then joins commodity names and units onto it by page number
+The files are read across a process pool (PIPELINE_WORKERS, largest first)
+and come back through shared memory as Arrow tables (shared_tables.py)
 """
 
 import pandas as pd
 from pathlib import Path
 
+from add_commodities import add_commodities
+from csv_io import to_csv
+from parallel_executor import run_largest_first
+from shared_tables import discard, read_csv_shared, receive
+from validation import combined_issues, write_report
+
 # Configuration
-input_folder = "world_production_with_commodities"
+input_folder = "world_production_long_format"
 output_file = "mcs1996_all_world_production_usgs.csv"
 
-print(f"Combining all CSV files from {input_folder}/...\n")
 
-# Get all CSV files
-csv_files = sorted(Path(input_folder).glob("*.csv"))
+def main():
+    print(f"Combining all CSV files from {input_folder}/...\n")
+
+    # Get all CSV files
+    csv_files = sorted(Path(input_folder).glob("*.csv"))
+
+    print(f"Found {len(csv_files)} files to combine\n")
+
+    # Read every file in the pool; each table comes back as a shared-memory handle
+    handles = run_largest_first(read_csv_shared, csv_files, [f.stat().st_size for f in csv_files])
+
+    # List to hold all dataframes
+    all_dfs = []
+
+    try:
+        for csv_file, handle in zip(csv_files, handles):
+            print(f"Reading: {csv_file.name}")
+
+            # Table written by the worker, read in place
+            df = receive(handle)
+
+            print(f"  Rows: {len(df)}, Columns: {list(df.columns)}")
+
+            # Add to list
+            all_dfs.append(df)
+    finally:
+        # A failed read stops the loop: the segments not received yet are removed
+        for handle in handles:
+            discard(handle)
+
+    # Combine all dataframes
+    print(f"\n{'='*60}")
+    print("Combining all files...")
+    combined_df = pd.concat(all_dfs, ignore_index=True)
+
+    print(f"Combined shape: {combined_df.shape}")
 
-print(f"Found {len(csv_files)} files to combine\n")
+    # Attach commodity and units by page number
+    print(f"\n{'='*60}")
+    print("Adding commodity and units columns...")
+    combined_df = add_commodities(combined_df)
 
-# List to hold all dataframes
-all_dfs = []
+    print(f"Columns: {list(combined_df.columns)}")
 
-for csv_file in csv_files:
-    print(f"Reading: {csv_file.name}")
-    
-    # Read CSV
-    df = pd.read_csv(csv_file)
-    
-    print(f"  Rows: {len(df)}, Columns: {list(df.columns)}")
-    
-    # Add to list
-    all_dfs.append(df)
+    # Save combined file
+    to_csv(combined_df, output_file)
 
-# Combine all dataframes
-print(f"\n{'='*60}")
-print("Combining all files...")
-combined_df = pd.concat(all_dfs, ignore_index=True)
+    print(f"\n✓ Saved combined file: {output_file}")
 
-print(f"Combined shape: {combined_df.shape}")
-print(f"Columns: {list(combined_df.columns)}")
+    # Header years and units, checked on the frame just written
+    write_report('combined', combined_issues(combined_df))
+    print(f"{'='*60}")
 
-# Save combined file
-combined_df.to_csv(output_file, index=False)
+    # Show summary
+    print("\nSummary:")
+    print(f"Total rows: {len(combined_df):,}")
+    print(f"Total files combined: {len(csv_files)}")
+    print(f"\nUnique commodities: {combined_df['commodity'].nunique()}")
+    print(f"Unique countries: {combined_df['country'].nunique()}")
 
-print(f"\n✓ Saved combined file: {output_file}")
-print(f"{'='*60}")
+    # Show preview
+    print("\nPreview of combined data:")
+    print(combined_df.head(10))
 
-# Show summary
-print("\nSummary:")
-print(f"Total rows: {len(combined_df):,}")
-print(f"Total files combined: {len(csv_files)}")
-print(f"\nUnique commodities: {combined_df['commodity'].nunique()}")
-print(f"Unique countries: {combined_df['country'].nunique()}")
+    print("\nTail of combined data:")
+    print(combined_df.tail(10))
 
-# Show preview
-print("\nPreview of combined data:")
-print(combined_df.head(10))
 
-print("\nTail of combined data:")
-print(combined_df.tail(10))
+if __name__ == "__main__":
+    main()
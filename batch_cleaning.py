@@ -0,0 +1,372 @@
+"""
+Batch Cleaning (All Pages at Once)
+Alternative to steps 2-8 (cleaning_script.py through unpivot_tables.py)
+Stacks every raw page table into one long frame of cells keyed by
+(edition, page, row, col), each remembering its row in the raw table
+(source_row), and runs year-row detection, trimming, header
+fill/merge and the unpivot as grouped vectorized operations across all pages
+Writes the same world_production_long_format/ files as the per-file path
+
+The per-file path re-reads every page CSV between steps, and pandas type
+inference can change cells on the way (e.g. 1995 -> 1995.0 in a column that
+is all numbers or blanks). retype() reproduces that write/read round trip at
+each step boundary so both paths produce identical files.
+"""
+
+import csv
+from pathlib import Path
+
+import pandas as pd
+
+from add_source_column import source
+from cleaning_odd_pages import YEAR_CELL_PATTERNS, page_number
+from cleaning_script import YEAR_PATTERNS
+from csv_io import to_csv
+from parallel_executor import print_summary
+from validation import empty_header_cells, write_report
+
+# Configuration
+input_folder = "world_production"
+output_folder = "world_production_long_format"
+
+PAGE = ['edition', 'page']
+KEYS = ['edition', 'page', 'row', 'col']
+LONG_COLUMNS = ['source', 'page', 'source_row', 'country', 'type', 'value']
+
+# Strings read_csv turns into NaN by default
+NA_STRINGS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+              '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+              'n/a', 'nan', 'null'}
+TRUE_STRINGS = {'True', 'TRUE', 'true'}
+FALSE_STRINGS = {'False', 'FALSE', 'false'}
+INT_PATTERN = r'^\s*[+-]?\d+\s*$'
+FLOAT_PATTERN = r'(?i)^\s*[+-]?(?:\d+\.?\d*(?:e[+-]?\d+)?|\.\d+(?:e[+-]?\d+)?|inf|infinity)\s*$'
+
+
+def read_raw_pages(folder=input_folder, edition=source, only_pages=None):
+    """Read every page CSV in folder (or only_pages of them) into one cell frame; returns (cells, filenames by page)"""
+    pages, rows, cols, texts = [], [], [], []
+    filenames = {}
+
+    for csv_file in sorted(Path(folder).glob("*.csv")):
+        page = page_number(csv_file)
+        if page is None or (only_pages is not None and page not in only_pages):
+            continue
+
+        with open(csv_file, newline='') as f:
+            table = [record for record in csv.reader(f) if record]  # read_csv skips blank lines
+        if not table:
+            continue
+
+        filenames[page] = csv_file.name
+        width = max(len(record) for record in table)
+        for i, record in enumerate(table):
+            record = record + [''] * (width - len(record))
+            pages.extend([page] * width)
+            rows.extend([i] * width)
+            cols.extend(range(width))
+            texts.extend(record)
+
+    cells = pd.DataFrame({'edition': edition, 'page': pages, 'row': rows, 'col': cols,
+                          'text': pd.Series(texts, dtype=object), 'source_row': rows})
+    return cells, filenames
+
+
+def renumber(cells):
+    """Dense 0-based row and col numbers per page, as after a write and re-read"""
+    cells = cells.sort_values(KEYS).reset_index(drop=True)
+    for axis in ['row', 'col']:
+        cells[axis] = cells.groupby(PAGE)[axis].rank(method='dense').astype(int) - 1
+    return cells
+
+
+def retype(cells, header=False):
+    """Text of every cell after a to_csv/read_csv round trip
+
+    read_csv picks one dtype per column: int if every value is an integer
+    and none are missing, float if every value is numeric, bool for
+    True/False, otherwise text. to_csv then writes the parsed values back.
+    With header=True row 0 holds column names and is left out of the typing.
+    Adds a 'kind' column with the inferred column type of each cell.
+    """
+    text = cells['text']
+    na = text.isna() | text.isin(NA_STRINGS)
+    stripped = text.where(~na).str.strip()
+    is_int = stripped.str.match(INT_PATTERN).fillna(False).astype(bool)
+    is_float = stripped.str.match(FLOAT_PATTERN).fillna(False).astype(bool)
+    is_bool = text.isin(TRUE_STRINGS | FALSE_STRINGS)
+
+    is_name = (cells['row'] == 0) if header else pd.Series(False, index=cells.index)
+    groups = [cells['edition'], cells['page'], cells['col'], is_name]
+
+    def column_all(mask):
+        return mask.groupby(groups).transform('all')
+
+    all_na = column_all(na)
+    all_int = column_all(is_int)
+    all_float = column_all(is_float | na)
+    all_bool = column_all(is_bool | na)
+
+    kind = pd.Series('object', index=cells.index)
+    kind[all_bool] = 'bool'
+    kind[all_float] = 'float'
+    kind[all_int] = 'int'
+    kind[all_na] = 'empty'
+    kind[is_name] = 'name'
+
+    out = text.where(~na).astype(object)
+
+    int_cells = kind == 'int'
+    out[int_cells] = stripped[int_cells].map(lambda s: str(int(s)))
+
+    float_cells = (kind == 'float') & ~na
+    out[float_cells] = pd.to_numeric(stripped[float_cells]).astype(float).map(float.__repr__)
+
+    bool_cells = (kind == 'bool') & ~na
+    out[bool_cells] = text[bool_cells].isin(TRUE_STRINGS).map({True: 'True', False: 'False'})
+
+    # Column names are taken from the file as-is
+    out[is_name] = text[is_name]
+
+    return cells.assign(text=out, kind=kind)
+
+
+def drop_empty_columns(cells):
+    """dropna(axis=1, how='all') for every page"""
+    keep = cells['text'].notna().groupby([cells['edition'], cells['page'], cells['col']]).transform('any')
+    return cells[keep]
+
+
+def first_row_where(cells, mask):
+    """Per page, the smallest row number where mask holds"""
+    return cells.loc[mask, PAGE + ['row']].groupby(PAGE)['row'].min()
+
+
+def page_value(cells, per_page):
+    """Broadcast a per-page Series onto cells (NaN where the page has no value)"""
+    return pd.Series(pd.MultiIndex.from_frame(cells[PAGE]).map(per_page), index=cells.index)
+
+
+def trim_to_year_row(cells):
+    """cleaning_script.py: keep one row before the first row with 2+ year-like values"""
+    present = cells[cells['text'].notna()]
+    row_str = present.groupby(PAGE + ['row'])['text'].agg(' '.join)
+    total_matches = sum(row_str.str.count(pattern) for pattern in YEAR_PATTERNS)
+    year_row = total_matches[total_matches >= 2].reset_index().groupby(PAGE)['row'].min()
+
+    start = page_value(cells, (year_row - 1).clip(lower=0))
+    cells = cells[cells['row'] >= start]
+    return renumber(drop_empty_columns(cells)), year_row
+
+
+def trim_odd_pages(cells):
+    """cleaning_odd_pages.py: odd pages only, years row - 1 through 'World total'"""
+    cells = cells[cells['page'] % 2 == 1]
+    grid = cells.set_index(PAGE + ['row', 'col'])['text']
+
+    first = grid.xs(0, level='col')
+    second = grid.xs(1, level='col') if (cells['col'] == 1).any() else first.iloc[:0]
+    first = first.reindex(second.index)
+    second_str = second.str.strip()
+
+    first_empty = first.isna() | (first.str.strip() == '')
+    looks_like_year = pd.Series(False, index=second.index)
+    for pattern in YEAR_CELL_PATTERNS:
+        looks_like_year |= second_str.str.match(pattern).fillna(False).astype(bool)
+    is_years_row = first_empty & second.notna() & looks_like_year
+    years_row = is_years_row[is_years_row].reset_index().groupby(PAGE)['row'].min()
+
+    after_years = cells['row'] >= page_value(cells, years_row)
+    has_world_total = cells['text'].str.lower().str.contains('world total', regex=False)
+    world_total_row = first_row_where(cells, after_years & has_world_total.fillna(False).astype(bool))
+
+    start = page_value(cells, (years_row - 1).clip(lower=0))
+    end = page_value(cells, world_total_row)
+    cells = cells[(cells['row'] >= start) & (cells['row'] <= end)]
+    return renumber(drop_empty_columns(cells)), years_row, world_total_row
+
+
+def fill_header_rows(cells):
+    """forward_filling_script.py: fill empty header cells, never backward from 'reserve'"""
+    header = (cells['row'] == 0) & (cells['col'] >= 1)
+    values = cells.loc[header, PAGE + ['col']].copy()
+    stripped = cells.loc[header, 'text'].str.strip()
+    values['value'] = stripped.where(stripped != '')
+
+    by_page = values.groupby(PAGE)['value']
+    next_value = by_page.bfill()
+    last_value = by_page.ffill()
+
+    # Non-empty cells are their own bfill/ffill value, so only empty cells change below
+    empty = values['value'].isna()
+    next_is_reserve = next_value.str.lower().str.contains('reserve', regex=False).fillna(False).astype(bool)
+    fill = next_value.where(~next_is_reserve & next_value.notna(), last_value).fillna('')
+    filled = values['value'].where(~empty, fill)
+
+    cells = cells.copy()
+    cells.loc[header, 'text'] = filled
+    return cells
+
+
+def merge_header_rows(cells):
+    """merge_headers.py: join header rows 1 and 2 with '_' and drop row 2"""
+    rows_per_page = cells.groupby(PAGE)['row'].transform('max') + 1
+    cells = cells[rows_per_page >= 2]
+
+    row1 = cells[cells['row'] == 0].set_index(PAGE + ['col'])['text']
+    row2 = cells[cells['row'] == 1].set_index(PAGE + ['col'])['text'].reindex(row1.index)
+    val1 = row1.str.strip().fillna('')
+    val2 = row2.str.strip().fillna('')
+
+    merged = (val1 + '_' + val2).where((val1 != '') & (val2 != ''), val1.where(val1 != '', val2))
+    first_position = row1.index.get_level_values('col') == 0
+    merged[first_position] = row1[first_position]
+
+    cells = cells[cells['row'] != 1].copy()
+    header = cells['row'] == 0
+    cells.loc[header, 'text'] = merged.reindex(pd.MultiIndex.from_frame(cells.loc[header, PAGE + ['col']])).values
+    return renumber(cells)
+
+
+def add_country_header(cells):
+    """add_country_header.py: position 0 of the header row becomes 'country'"""
+    cells = cells.copy()
+    cells.loc[(cells['row'] == 0) & (cells['col'] == 0), 'text'] = 'country'
+    return cells
+
+
+def add_source_columns(cells):
+    """add_source_column.py: 'source', 'page' and 'source_row' columns at positions 0, 1 and 2"""
+    rows = cells[cells['col'] == 0][PAGE + ['row', 'source_row']]
+    is_header = rows['row'] == 0
+
+    source_cells = rows.assign(col=0, text=rows['edition'].astype(str).where(~is_header, 'source'))
+    page_cells = rows.assign(col=1, text=rows['page'].astype(str).where(~is_header, 'page'))
+    row_cells = rows.assign(col=2, text=rows['source_row'].astype(str).where(~is_header, 'source_row'))
+    cells = cells.assign(col=cells['col'] + 3)
+
+    return pd.concat([source_cells, page_cells, row_cells, cells[KEYS + ['text']]],
+                     ignore_index=True).sort_values(KEYS).reset_index(drop=True)
+
+
+def column_names(cells):
+    """Header names as read_csv(header=0) builds them (blank -> 'Unnamed: i', duplicates -> 'x.1')"""
+    names = cells[cells['row'] == 0][PAGE + ['col', 'text']].copy()
+    names['name'] = names['text'].where(names['text'].notna(), 'Unnamed: ' + names['col'].astype(str))
+    duplicate = names.groupby(PAGE + ['name']).cumcount()
+    names['name'] = names['name'].where(duplicate == 0, names['name'] + '.' + duplicate.astype(str))
+    return names.set_index(PAGE + ['col'])['name']
+
+
+def unpivot(cells):
+    """unpivot_tables.py: melt all but 'source', 'page', 'source_row' and 'country' into type/value rows"""
+    id_columns = ['source', 'page', 'source_row', 'country']
+    columns = ['edition', 'page', 'row', 'source', 'source_row', 'country', 'type', 'value']
+    if cells.empty:  # no page made it through the trimming steps
+        return pd.DataFrame(columns=columns)
+    names = column_names(cells)
+
+    data = cells[cells['row'] >= 1].copy()
+    data['name'] = names.reindex(pd.MultiIndex.from_frame(data[PAGE + ['col']])).values
+
+    ids = data[data['name'].isin(['source', 'source_row', 'country'])].pivot(
+        index=PAGE + ['row'], columns='name', values='text'
+    ).reindex(columns=['source', 'source_row', 'country'])
+
+    values = data[~data['name'].isin(id_columns)].copy()
+
+    # melt stacks the value columns into one: all-numeric columns with any float become float
+    value_kinds = values.groupby(PAGE)['kind']
+    numeric_only = value_kinds.transform(lambda k: k.isin(['int', 'float', 'empty']).all())
+    has_float = value_kinds.transform(lambda k: k.isin(['float', 'empty']).any())
+    to_float = numeric_only & has_float & (values['kind'] == 'int') & values['text'].notna()
+    values.loc[to_float, 'text'] = values.loc[to_float, 'text'].map(lambda s: repr(float(s)))
+
+    # melt order: column by column, rows in order within each column
+    # ('page' is the page number itself, so the key column doubles as the id column)
+    values = values.sort_values(PAGE + ['col', 'row'])
+    long_df = values[PAGE + ['row', 'name', 'text']].join(ids, on=PAGE + ['row'])
+    long_df = long_df.rename(columns={'name': 'type', 'text': 'value'})
+    return long_df[columns].reset_index(drop=True)
+
+
+def run_batch(cells):
+    """Run steps 2-8 on the stacked cells; returns (long_df, results for print_summary, issues)"""
+    pages = cells[PAGE].drop_duplicates()
+    outcome = {}
+
+    cells = renumber(cells)
+    cells = retype(cells)
+    cells, year_row = trim_to_year_row(cells)
+    cells = retype(cells)
+
+    cells, years_row, world_total_row = trim_odd_pages(cells)
+    cells = retype(cells)
+
+    cells = retype(fill_header_rows(cells))
+    header = cells[cells['row'] == 0].rename(columns={'edition': 'source'})
+    issues = empty_header_cells(header[['source', 'page', 'col', 'text']])
+    pages_before_merge = set(cells['page'])
+    cells = retype(merge_header_rows(cells))
+    pages_after_merge = set(cells['page'])
+    cells = retype(add_country_header(cells))
+    cells = retype(add_source_columns(cells), header=True)
+    long_df = unpivot(cells)
+
+    # Per-page outcome, in the same terms as the per-file scripts
+    for edition, page in pages.itertuples(index=False):
+        key = (edition, page)
+        if key not in year_row.index:
+            outcome[page] = ('warning', "Could not find years row")
+        elif page % 2 == 0:
+            outcome[page] = ('skipped', f"page {page} is even")
+        elif key not in years_row.index:
+            outcome[page] = ('warning', "Could not find years row with comma pattern")
+        elif key not in world_total_row.index:
+            outcome[page] = ('warning', "Could not find 'World total' row")
+        elif page not in pages_before_merge or page not in pages_after_merge:
+            outcome[page] = ('skipped', "File has less than 2 rows")
+        else:
+            rows = (long_df['page'] == page).sum()
+            outcome[page] = ('ok', f"{rows} long-format rows")
+
+    return long_df, outcome, issues
+
+
+def write_long_format(long_df, filenames, folder=output_folder):
+    """One long-format CSV per page, named like the raw page file"""
+    columns = LONG_COLUMNS
+    written = set()
+    for (edition, page), page_df in long_df.groupby(PAGE, sort=False):
+        to_csv(page_df[columns], Path(folder) / filenames[page])
+        written.add(page)
+    return written
+
+
+def main():
+    # Create output folder
+    Path(output_folder).mkdir(exist_ok=True)
+
+    print(f"Batch cleaning all pages from {input_folder}/...\n")
+
+    cells, filenames = read_raw_pages(input_folder)
+    print(f"Stacked {len(filenames)} pages into {len(cells):,} cells\n")
+
+    long_df, outcome, issues = run_batch(cells)
+    write_long_format(long_df, filenames, output_folder)
+
+    # Pages that made it through every step but have no data rows still get a header-only file
+    for page, (status, _) in outcome.items():
+        if status == 'ok' and not (long_df['page'] == page).any():
+            to_csv(pd.DataFrame(columns=LONG_COLUMNS), Path(output_folder) / filenames[page])
+
+    print_summary([(filenames[page], status, detail) for page, (status, detail) in outcome.items()])
+    write_report('header_fill', issues)
+
+    print(f"Done! Processed {len(filenames)} pages")
+    print(f"Output: {output_folder}/")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Canonicalize Country Names
+Maps cleaned 'country' values onto the names in country_gazetteer.csv
+1. Exact match on a normalized key (lowercase letters only) of the
+   canonical name or any of its aliases
+2. Otherwise fuzzy match through a BK-tree of alias keys (edit distance),
+   accepted only when the closest canonical name is unambiguous
+Each distinct raw string is matched once (LRU memo), so repeated names
+across pages and editions cost a dictionary lookup
+Names that can't be resolved are kept as-is and written to a review file
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from csv_io import read_csv, to_csv
+
+# Configuration
+gazetteer_file = Path(__file__).with_name("country_gazetteer.csv")  # Bundled with the scripts
+review_file = "country_review.csv"
+memo_size = 65536
+
+
+def normalize_key(name):
+    """'U.S.S.R.' -> 'ussr', 'Unitcd  States' -> 'unitcdstates'"""
+    return re.sub(r'[^a-z]', '', str(name).lower())
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over strings for edit-distance range queries"""
+
+    def __init__(self, words=()):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """All (distance, word) pairs within max_distance of word"""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_word, children = stack.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                results.append((distance, node_word))
+            # Triangle inequality: only subtrees in [d - max, d + max] can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(results)
+
+
+def max_distance_for(key):
+    """Edit budget scaled to name length so short names don't collide"""
+    if len(key) <= 4:
+        return 0
+    if len(key) <= 8:
+        return 1
+    return 2
+
+
+class CountryMatcher:
+    """Resolve raw country strings against the gazetteer"""
+
+    def __init__(self, path=gazetteer_file):
+        gazetteer = read_csv(path, keep_default_na=False)
+
+        self.canonical_by_key = {}
+        for canonical, aliases in zip(gazetteer['canonical_name'], gazetteer['aliases']):
+            for name in [canonical] + [a for a in aliases.split('|') if a]:
+                self.canonical_by_key.setdefault(normalize_key(name), canonical)
+
+        self.index = BKTree(self.canonical_by_key)
+        self.match = lru_cache(maxsize=memo_size)(self._match)
+
+    def _match(self, raw):
+        """Return (canonical name or None, method, best candidate, distance)"""
+        key = normalize_key(raw)
+        if not key:
+            return None, 'empty', '', None
+
+        canonical = self.canonical_by_key.get(key)
+        if canonical is not None:
+            return canonical, 'exact', canonical, 0
+
+        candidates = self.index.search(key, max_distance_for(key))
+        if not candidates:
+            return None, 'unresolved', '', None
+
+        best_distance = candidates[0][0]
+        best = {self.canonical_by_key[word] for distance, word in candidates
+                if distance == best_distance}
+        if len(best) == 1:
+            canonical = best.pop()
+            return canonical, 'fuzzy', canonical, best_distance
+
+        # Tie between different countries - leave it for a human
+        return None, 'ambiguous', ' | '.join(sorted(best)), best_distance
+
+
+_matcher = None
+
+
+def get_matcher(path=gazetteer_file):
+    """Shared matcher so the LRU memo survives across calls in one process"""
+    global _matcher
+    if _matcher is None:
+        _matcher = CountryMatcher(path)
+    return _matcher
+
+
+def review_table(counts, results):
+    """Unresolved names with their best candidate, most frequent first (ties by name)"""
+    review = pd.DataFrame(
+        [(raw, method, candidate, distance, counts[raw])
+         for raw, (canonical, method, candidate, distance) in results.items()
+         if canonical is None],
+        columns=['raw_name', 'method', 'best_candidate', 'distance', 'rows']
+    )
+    return review.sort_values(['rows', 'raw_name'], ascending=[False, True])
+
+
+def write_country_review(counts, review_path=review_file, matcher=None):
+    """Write the review file from raw-name row counts gathered elsewhere (e.g. chunk by chunk)"""
+    matcher = matcher or get_matcher()
+    results = {raw: matcher.match(raw) for raw in counts.index}
+    review = review_table(counts, results)
+    to_csv(review, review_path)
+    return review
+
+
+def canonicalize_countries(df, column='country', review_path=review_file, matcher=None):
+    """Replace df[column] with canonical names and write unresolved ones to review_path (None: print only)"""
+    matcher = matcher or get_matcher()
+
+    counts = df[column].value_counts(dropna=False)
+    results = {raw: matcher.match(raw) for raw in counts.index}
+
+    mapping = {raw: (canonical if canonical is not None else raw)
+               for raw, (canonical, _, _, _) in results.items()}
+    df[column] = df[column].map(mapping)
+
+    methods = pd.Series({raw: result[1] for raw, result in results.items()})
+    print(f"  Distinct names: {len(results)}")
+    for method in ['exact', 'fuzzy', 'ambiguous', 'unresolved', 'empty']:
+        print(f"  {method}: {(methods == method).sum()}")
+
+    fuzzy = [(raw, result[0], result[3]) for raw, result in results.items()
+             if result[1] == 'fuzzy']
+    for raw, canonical, distance in fuzzy[:10]:
+        print(f"    '{raw}' → '{canonical}' (distance {distance})")
+
+    review = review_table(counts, results)
+    if review_path is not None:
+        to_csv(review, review_path)
+
+    if len(review):
+        where = f"written to: {review_path}" if review_path is not None else f"{review['raw_name'].tolist()}"
+        print(f"  ⚠ {len(review)} unresolved name(s) {where}")
+    else:
+        print(f"  ✓ All names resolved")
+
+    return df
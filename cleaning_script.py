@@ -7,68 +7,93 @@ import pandas as pd
 import re
 from pathlib import Path
 
+from csv_io import read_csv, to_csv
+from parallel_executor import exit_on_errors, run_per_file, print_summary
+
 # Configuration
 input_folder = "world_production"      # Folder with your CSV files
 output_folder = "world_production_cleaned"  # Where to save cleaned files
 
-# Create output folder
-Path(output_folder).mkdir(exist_ok=True)
 
-print(f"Cleaning CSV files from {input_folder}/...\n")
+# Year patterns counted in each row (shared with batch_cleaning.py)
+# Look for multiple years (at least 2 years in format 19XX or 20XX)
+# Look for any pattern that looks like a year (very flexible)
+# Matches anything starting with 1, 19, 20, or t followed by mixed characters
+# This catches: 1.995, 19.96~, 199.5, 1.9.968, 19.9.5, 19i5, 19~, 199_6, 19.&r, t995, etc.
+# Also look for standalone ~ or 1~ which represent years
+YEAR_PATTERNS = [
+    r'\b(?:19|20)[0-9]{2}e?\b',
+    r'\b(?:1|19|20|t)[0-9.~_&\-!\'ia-zA-Z]{1,5}e?\b',
+    r'\b[1~]+\b',
+]
 
-# Process each CSV file
-csv_files = list(Path(input_folder).glob("*.csv"))
 
-for csv_file in csv_files:
-    print(f"Processing: {csv_file.name}")
-    
-    # Read CSV
-    df = pd.read_csv(csv_file, header=None)
-    
-    # Find the row with years (e.g., 2019, 2020, 2021, 2022, 2023)
-    year_row = None
+def find_year_row(df):
+    """Index of the first row with at least 2 year-like values, or None"""
     for idx, row in df.iterrows():
         # Convert row to string to search for year patterns
         row_str = ' '.join([str(cell) for cell in row if pd.notna(cell)])
-        
-        # Look for multiple years (at least 2 years in format 19XX or 20XX)
-        years = re.findall(r'\b(?:19|20)[0-9]{2}e?\b', row_str)
-        
-        # Look for any pattern that looks like a year (very flexible)
-        # Matches anything starting with 1, 19, 20, or t followed by mixed characters
-        # This catches: 1.995, 19.96~, 199.5, 1.9.968, 19.9.5, 19i5, 19~, 199_6, 19.&r, t995, etc.
-        flexible_years = re.findall(r'\b(?:1|19|20|t)[0-9.~_&\-!\'ia-zA-Z]{1,5}e?\b', row_str)
-        
-        # Also look for standalone ~ or 1~ which represent years
-        tilde_years = re.findall(r'\b[1~]+\b', row_str)
-        
+
         # If we find either standard years or flexible years, this is likely the year row
         # Need at least 2 matches
-        total_matches = len(years) + len(flexible_years) + len(tilde_years)
+        total_matches = sum(len(re.findall(pattern, row_str)) for pattern in YEAR_PATTERNS)
         if total_matches >= 2:
-            year_row = idx
-            break
-    
-    if year_row is not None:
-        # Keep from (year_row - 1) to end
-        # If year_row is 0, just start from year_row
-        start_row = max(0, year_row - 1)
-        
-        cleaned_df = df.iloc[start_row:].reset_index(drop=True)
-        
-        # Remove empty columns
-        cleaned_df = cleaned_df.dropna(axis=1, how='all')
-        
-        # Save
-        output_file = Path(output_folder) / csv_file.name
-        cleaned_df.to_csv(output_file, index=False, header=False)
-        
-        print(f"  ✓ Found years at row {year_row}, keeping from row {start_row}")
-        print(f"  ✓ {df.shape} → {cleaned_df.shape}")
-    else:
-        print(f"  ⚠ Could not find years row")
-    
-print(f"\n{'='*60}")
-print(f"Done! Cleaned {len(csv_files)} files")
-print(f"Output: {output_folder}/")
-print(f"{'='*60}")
+            return idx
+    return None
+
+
+def clean_table(df):
+    """Trim df to one row before the years row onwards; returns (cleaned_df, year_row)"""
+    year_row = find_year_row(df)
+    if year_row is None:
+        return None, None
+
+    # Keep from (year_row - 1) to end
+    # If year_row is 0, just start from year_row
+    start_row = max(0, year_row - 1)
+
+    cleaned_df = df.iloc[start_row:].reset_index(drop=True)
+
+    # Remove empty columns
+    cleaned_df = cleaned_df.dropna(axis=1, how='all')
+
+    return cleaned_df, year_row
+
+
+def process_file(csv_file, output_folder=output_folder):
+    """Clean one page CSV; returns (status, detail) for the summary"""
+    # Read CSV
+    df = read_csv(csv_file, header=None)
+
+    cleaned_df, year_row = clean_table(df)
+
+    if cleaned_df is None:
+        return 'warning', "Could not find years row"
+
+    # Save
+    output_file = Path(output_folder) / Path(csv_file).name
+    to_csv(cleaned_df, output_file, header=False)
+
+    return 'ok', f"Found years at row {year_row}, keeping from row {max(0, year_row - 1)}, {df.shape} → {cleaned_df.shape}"
+
+
+def main():
+    # Create output folder
+    Path(output_folder).mkdir(exist_ok=True)
+
+    print(f"Cleaning CSV files from {input_folder}/...\n")
+
+    # Process each CSV file
+    csv_files = list(Path(input_folder).glob("*.csv"))
+
+    results = run_per_file(process_file, csv_files, output_folder=output_folder)
+    counts = print_summary(results)
+    exit_on_errors(counts)
+
+    print(f"Done! Cleaned {len(csv_files)} files")
+    print(f"Output: {output_folder}/")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
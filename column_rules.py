@@ -0,0 +1,220 @@
+"""
+Column Cleaning Rules
+The text columns' cleaning (post_merge_cleaning_script.py steps 1-3.5) as
+declared rules: COLUMN_RULES lists each column's rules in the order they
+apply, compile_rules() turns a list into passes and clean_column() runs the
+passes on the column's distinct values only, so the rows themselves are
+read once (factorize) and written once (take) however many rules there are
+
+Rules (each one strips the value afterwards):
+    ('strip_after', text)          text and everything after it
+    ('trailing_digits',)           digits at the end
+    ('trailing', text)             text at the end (once)
+    ('whitespace',)                runs of whitespace -> one space
+    ('parentheses',)               '(...)' groups, then an orphaned '(' or ')' and the rest
+    ('alias', {value: new})        whole values replaced
+    ('alias_pattern', regex, new)  whole values matching regex replaced
+    ('remove', chars)              every one of chars (no whitespace)
+    ('keep', char class)           every character outside the class (which keeps \\s)
+
+Neighbouring rules that can share a pass are fused: character removals
+(remove/keep) into one regex alternation, aliases into one lookup chain. A
+new rule of either kind next to its own kind adds no pass at all
+
+Per-rule hits (rows whose value the rule changed) and per-pass seconds are
+added up in `stats` across calls; rules_report() returns them
+"""
+
+import re
+import time
+
+import pandas as pd
+
+COLUMN_RULES = {
+    # Step 1: "United States5, gross" -> "United States", "W\n  World total (rounded" -> "World total"
+    'country': [
+        ('strip_after', ','),
+        ('trailing_digits',),
+        ('whitespace',),
+        ('parentheses',),
+        ('alias', {'w': 'World total', 'W': 'World total'}),
+        ('alias_pattern', r'^W\s+World total$', 'World total'),
+        ('keep', r'a-zA-Z\s'),
+        ('whitespace',),
+    ],
+    # Step 2: "metric tons5 of copper" -> "metric tons"
+    'units': [
+        ('strip_after', ' of '),
+        ('trailing_digits',),
+    ],
+    # Step 3: "Mine productione6" -> "Mine production", "gross weight)" -> "gross weight"
+    'type': [
+        ('whitespace',),
+        ('strip_after', ','),
+        ('trailing_digits',),
+        ('trailing', 'e'),
+        ('trailing', ')'),
+        ('remove', '('),
+        ('keep', r'a-zA-Z\s'),
+        ('whitespace',),
+    ],
+    # Step 3.5: letters, spaces and parentheses only
+    'commodity': [
+        ('keep', r'a-zA-Z\s()'),
+        ('whitespace',),
+    ],
+}
+
+WHITESPACE = re.compile(r'\s+')
+PARENTHESES = [re.compile(r'\s*\([^)]*\)'), re.compile(r'\s*\(.*$'), re.compile(r'\s*\).*$')]
+TRAILING_DIGITS = re.compile(r'\d+$')
+
+FUSED_KINDS = {'remove': 'chars', 'keep': 'chars', 'alias': 'alias', 'alias_pattern': 'alias'}
+
+REPORT_COLUMNS = ['column', 'rule', 'pass', 'hits', 'seconds']
+
+stats = {}  # (column, rule index) -> {'rule', 'pass', 'hits', 'seconds'}
+
+
+def describe(rule):
+    kind, *args = rule
+    return f"{kind}({', '.join(repr(arg) for arg in args)})" if args else kind
+
+
+def rule_function(rule):
+    """value -> value for one non-fused rule"""
+    kind, *args = rule
+    if kind == 'strip_after':
+        return lambda value: value.split(args[0])[0].strip()
+    if kind == 'trailing_digits':
+        return lambda value: TRAILING_DIGITS.sub('', value).strip()
+    if kind == 'trailing':
+        pattern = re.compile(re.escape(args[0]) + '$')
+        return lambda value: pattern.sub('', value).strip()
+    if kind == 'whitespace':
+        return lambda value: WHITESPACE.sub(' ', value).strip()
+    if kind == 'parentheses':
+        def parentheses(value):
+            for pattern in PARENTHESES:
+                value = pattern.sub('', value).strip()
+            return value
+        return parentheses
+    raise ValueError(f"Unknown cleaning rule: {describe(rule)}")
+
+
+def char_pattern(rule):
+    kind, chars = rule
+    if kind == 'remove':
+        if any(c.isspace() for c in chars):
+            raise ValueError(f"{describe(rule)}: removed characters can't be whitespace")
+        return f"[{re.escape(chars)}]"
+    if '\\s' not in chars:
+        raise ValueError(f"{describe(rule)}: the kept class must keep whitespace (\\s)")
+    return f"[^{chars}]"
+
+
+def fused_chars(rules):
+    """One regex pass for neighbouring remove/keep rules; value -> (value, [hit per rule])
+
+    Deleting non-whitespace characters commutes with stripping, so one
+    alternation gives what the rules give one after another; a character
+    matched by several rules counts for the first, which removed it
+    """
+    pattern = re.compile('|'.join(f"(?P<r{i}>{char_pattern(rule)})" for i, rule in enumerate(rules)))
+
+    def apply(value):
+        hit = [False] * len(rules)
+
+        def drop(match):
+            hit[int(match.lastgroup[1:])] = True
+            return ''
+        return pattern.sub(drop, value).strip(), hit
+    return apply
+
+
+def fused_aliases(rules):
+    """One lookup pass for neighbouring alias/alias_pattern rules; value -> (value, [hit per rule])"""
+    steps = [(rule[1], None) if rule[0] == 'alias' else (re.compile(rule[1]), rule[2]) for rule in rules]
+
+    def apply(value):
+        hit = []
+        for mapping, new in steps:
+            if new is None:
+                replaced = mapping.get(value, value)
+            else:
+                replaced = mapping.sub(new, value)
+            replaced = replaced.strip()
+            hit.append(replaced != value)
+            value = replaced
+        return value, hit
+    return apply
+
+
+def compile_rules(rules):
+    """[(rule indexes, value -> (value, [hit per rule]))], one entry per pass"""
+    groups = []
+    for i, rule in enumerate(rules):
+        kind = FUSED_KINDS.get(rule[0])
+        if kind and groups and groups[-1][0] == kind:
+            groups[-1][1].append(i)
+        else:
+            groups.append((kind, [i]))
+
+    passes = []
+    for kind, indexes in groups:
+        if kind == 'chars':
+            passes.append((indexes, fused_chars([rules[i] for i in indexes])))
+        elif kind == 'alias':
+            passes.append((indexes, fused_aliases([rules[i] for i in indexes])))
+        else:
+            function = rule_function(rules[indexes[0]])
+
+            def apply(value, function=function):
+                cleaned = function(value)
+                return cleaned, [cleaned != value]
+            passes.append((indexes, apply))
+    return passes
+
+
+_compiled = {}
+
+
+def clean_column(series, column, record=True):
+    """series cleaned by COLUMN_RULES[column] (as strings, missing values stay missing)
+
+    record=False leaves `stats` alone (for a pass that only looks at the values)
+    """
+    if column not in _compiled:
+        _compiled[column] = compile_rules(COLUMN_RULES[column])
+
+    values = series.astype(str)
+    codes, uniques = pd.factorize(values)
+    counts = pd.Series(codes[codes >= 0]).value_counts().reindex(range(len(uniques)), fill_value=0).tolist()
+
+    cleaned = list(uniques)
+    for number, (indexes, apply) in enumerate(_compiled[column], start=1):
+        start = time.perf_counter()
+        hits = [0] * len(indexes)
+        for u, value in enumerate(cleaned):
+            cleaned[u], hit = apply(value)
+            for k, changed in enumerate(hit):
+                if changed:
+                    hits[k] += counts[u]
+        seconds = time.perf_counter() - start
+
+        if record:
+            for k, i in enumerate(indexes):
+                entry = stats.setdefault((column, i), {'rule': describe(COLUMN_RULES[column][i]),
+                                                       'pass': number, 'hits': 0, 'seconds': 0.0})
+                entry['hits'] += hits[k]
+                entry['seconds'] += seconds / len(indexes)  # a fused pass's time is split evenly
+
+    # Missing values have code -1, which take() reads as the appended None
+    return pd.Series(pd.array(cleaned + [None], dtype=values.dtype).take(codes), index=series.index,
+                     name=series.name)
+
+
+def rules_report():
+    """DataFrame of column, rule, pass, hits, seconds for every rule run so far"""
+    rows = [{'column': column, **entry} for (column, _), entry in stats.items()]
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
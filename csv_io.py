@@ -0,0 +1,206 @@
+"""
+CSV I/O
+read_csv() and to_csv() for every script's files: the same frames and the
+same bytes as pandas, through pyarrow's multithreaded CSV reader and writer
+when the call allows it, pandas otherwise
+
+read_csv(path, **kwargs) takes pd.read_csv keywords. Text reads (dtype=str,
+optionally keep_default_na, usecols, chunksize) go through pyarrow with an
+explicit all-string schema built from the header line (source, country,
+type, value, commodity, units, PROD_<year>, ...: no type guessing) and
+pandas' own NA strings. Reads that let pandas infer types (the page tables,
+whose cleaning depends on that inference, see batch_cleaning.py), buffers
+and files pyarrow rejects (ragged rows, bad UTF-8, duplicate names) go to
+pd.read_csv; a chunked read pyarrow rejects partway through continues with
+pd.read_csv from the first chunk it has not yet returned
+
+to_csv(df, path, header=True, mode='w') writes like df.to_csv(path,
+index=False): each column is turned into its cell text with Arrow compute
+kernels (floats and booleans formatted as pandas formats them, values
+quoted as csv.QUOTE_MINIMAL quotes them) and the rows are joined into lines
+whose character data is written out as it is. Frames with a column of
+mixed or other types, or a single column, are written by pandas
+
+Falls back to pandas for everything when pyarrow is not installed
+
+Usage:
+    df = read_csv("mcs1996_all_world_production_usgs.csv", dtype=str)
+    to_csv(df, "combined_world_production_cleaned.csv")
+"""
+
+import csv
+import io
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+# Configuration
+block_size = 1 << 24  # bytes pyarrow parses per block (and per thread)
+write_rows = 1_000_000  # rows turned into CSV text at a time
+
+# pd.read_csv's default na_values
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+ARROW_READ_KWARGS = {'dtype', 'keep_default_na', 'usecols', 'chunksize'}
+
+
+def _quoted_characters():
+    """Regex class of the characters to_csv quotes a value for (csv.QUOTE_MINIMAL, its os.linesep lines)"""
+    quoted = []
+    for c in ',"\r\n':
+        line = io.StringIO()
+        csv.writer(line, lineterminator=os.linesep).writerow([f"a{c}b", "x"])
+        if line.getvalue().startswith('"'):
+            quoted.append(c)
+    return '[' + ''.join(quoted).replace('\r', '\\r').replace('\n', '\\n') + ']'
+
+
+QUOTED = _quoted_characters()
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute
+        import pyarrow.csv
+    except ImportError:
+        return None
+    return pa
+
+
+def _header(path):
+    """Column names from the first line, or None when pandas would rename them (blank, duplicate)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        names = next(csv.reader(f), None)
+    if not names or '' in names or len(set(names)) < len(names):
+        return None
+    return names
+
+
+def _text_frame(table, names, start=0):
+    df = table.to_pandas()
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df[names].astype(str) if len(df) == 0 else df[names]
+
+
+def _read_text(pa, path, names, usecols, keep_default_na, chunksize):
+    """dtype=str read through pyarrow: one frame, or a generator of chunksize-row frames"""
+    columns = [name for name in names if name in usecols] if usecols is not None else names
+    read_options = pa.csv.ReadOptions(column_names=names, skip_rows=1, block_size=block_size)
+    # Quoted cells hold line breaks ("Reserve base\nReserves"), and blocks must not split them
+    parse_options = pa.csv.ParseOptions(newlines_in_values=True)
+    convert_options = pa.csv.ConvertOptions(
+        column_types={name: pa.string() for name in names}, include_columns=columns,
+        null_values=PANDAS_NA_VALUES if keep_default_na else [], strings_can_be_null=keep_default_na)
+
+    if chunksize is None:
+        return _text_frame(pa.csv.read_csv(path, read_options, parse_options, convert_options), columns)
+
+    # Parse the first block up front, so files pyarrow rejects there still fall back
+    reader = pa.csv.open_csv(path, read_options, parse_options, convert_options)
+    first = reader.read_next_batch()
+
+    def chunks(batch):
+        pending, rows, start = [], 0, 0
+        while batch is not None:
+            pending.append(batch)
+            rows += batch.num_rows
+            while rows >= chunksize:
+                table = pa.Table.from_batches(pending)
+                yield _text_frame(table.slice(0, chunksize), columns, start)
+                pending, rows, start = table.slice(chunksize).to_batches(), rows - chunksize, start + chunksize
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                batch = None
+        if rows:
+            yield _text_frame(pa.Table.from_batches(pending), columns, start)
+    return chunks(first)
+
+
+def _pandas_from(pa, chunks, path, kwargs):
+    """The chunks, continued by pd.read_csv (same chunk boundaries) if pyarrow rejects a later block"""
+    returned = 0
+    try:
+        for chunk in chunks:
+            yield chunk
+            returned += 1
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        with pd.read_csv(path, **kwargs) as reader:
+            yield from itertools.islice(reader, returned, None)
+
+
+def read_csv(path, **kwargs):
+    """pd.read_csv(path, **kwargs), read by pyarrow for text reads (dtype=str)"""
+    pa = _arrow()
+    if (pa is None or not isinstance(path, (str, os.PathLike)) or kwargs.get('dtype') is not str
+            or not set(kwargs) <= ARROW_READ_KWARGS):
+        return pd.read_csv(path, **kwargs)
+
+    try:
+        names = _header(path)
+        if names is not None:
+            result = _read_text(pa, path, names, kwargs.get('usecols'), kwargs.get('keep_default_na', True),
+                                kwargs.get('chunksize'))
+            return result if kwargs.get('chunksize') is None else _pandas_from(pa, result, path, kwargs)
+    except (pa.ArrowInvalid, UnicodeDecodeError, StopIteration):
+        pass
+    return pd.read_csv(path, **kwargs)
+
+
+def _formattable(values):
+    """Whether _cells() can give to_csv's text for a column's type"""
+    return (values.dtype.kind in 'iub' or values.dtype == np.float64 or
+            pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'))
+
+
+def _cells(pa, values):
+    """A _formattable() column as an Arrow string array of to_csv's cell text"""
+    pc = pa.compute
+    kind = values.dtype.kind
+    # Missing values of the nullable types (Int64, boolean) are written as empty cells
+    if kind in 'iu':
+        return pc.cast(pa.array(values, from_pandas=True), pa.string()).fill_null('')
+    if kind == 'b':
+        return pc.if_else(pa.array(values, from_pandas=True), 'True', 'False').fill_null('')
+    if kind == 'f':
+        # Formatting is the slow part: each distinct bit pattern once (0.0 and -0.0 differ), then gathered
+        codes, uniques = pd.factorize(values.to_numpy().view(np.int64))
+        uniques = uniques.view(np.float64)
+        text = pa.array(np.where(np.isnan(uniques), '', uniques.astype(str)), type=pa.string())
+        return text.take(pa.array(codes))
+
+    cells = pa.array(values, from_pandas=True, type=pa.string()).fill_null('')
+    # csv.QUOTE_MINIMAL: quote values with a QUOTED character, doubling their quotes
+    needs_quotes = pc.match_substring_regex(cells, QUOTED)
+    if pc.any(needs_quotes).as_py():
+        quoted = pc.binary_join_element_wise('"', pc.replace_substring(cells, '"', '""'), '"', '')
+        cells = pc.if_else(needs_quotes, quoted, cells)
+    return cells
+
+
+def to_csv(df, path, header=True, mode='w'):
+    """df.to_csv(path, index=False, header=header, mode=mode), written through pyarrow when it can"""
+    pa = _arrow()
+    columns = range(len(df.columns))
+    # One column: pandas quotes empty values (a blank line would be skipped on read)
+    if pa is None or len(columns) < 2 or not all(_formattable(df.iloc[:, i]) for i in columns):
+        df.to_csv(path, index=False, header=header, mode=mode)
+        return
+
+    with open(path, mode + 'b') as f:
+        if header:
+            line = io.StringIO()
+            csv.writer(line, lineterminator=os.linesep).writerow(df.columns)
+            f.write(line.getvalue().encode('utf-8'))
+        for start in range(0, len(df), write_rows):
+            rows = df.iloc[start:start + write_rows]
+            cells = [_cells(pa, rows.iloc[:, i]) for i in columns]
+            lines = pa.compute.binary_join_element_wise(*cells, ',')
+            lines = pa.compute.binary_join_element_wise(lines, os.linesep, '')
+            for chunk in lines.chunks if isinstance(lines, pa.ChunkedArray) else [lines]:
+                # Every line ends in a line break, so the chunk's character data is the file text
+                offsets = np.frombuffer(chunk.buffers()[1], dtype=np.int32)
+                f.write(memoryview(chunk.buffers()[2])[offsets[chunk.offset]:offsets[chunk.offset + len(chunk)]])
@@ -1,86 +1,275 @@
 """
 Simple World Production Extractor
 Quick script to extract ONLY world production tables (no text) from USGS PDF
+
+The pages come from the page index (page_index.py): those with a
+'World total' row, or every odd commodity page when the PDF text shows none
+
+Each page goes through the backends in table_backends.py: pdfplumber on the
+layout cache first, camelot stream/lattice only when that table looks wrong.
+The backend used for each page is written to table_backends_report.csv
+
+Pages run across a process pool (PIPELINE_WORKERS), longest first: each
+page's cost is its last recorded time when its layout (char and ruling edge
+counts) is unchanged, else its char count times the seconds per char seen so
+far. Every run's page times are added to extraction_timings.csv, so the
+estimates follow the real costs
+
+pdfminer/camelot workers grow over hundreds of pages, so each worker is
+replaced after pages_per_worker pages or once its RSS passes
+worker_rss_limit_mb (a worker killed mid-page has the page retried on a
+fresh one). Each worker's pages and peak RSS go to extraction_workers.csv
+
+A page whose table the cleaning steps would drop (no years row, no 'World
+total' row) is retried with the alternative settings in page_retry.py,
+tried in parallel; the first that passes is kept, and stored per page in
+page_retry_params.csv so later runs start with it
 """
 
-import camelot
+import contextlib
+import io
+import time
+from functools import partial
+
 import pandas as pd
 from pathlib import Path
 
+from csv_io import read_csv, to_csv
+from layout_cache import LayoutCache
+from page_index import PageIndex
+from page_retry import RETRY_SETTINGS, check_table, params_file, retry_pages, store_settings, stored_settings
+from parallel_executor import default_workers, run_largest_first
+from table_backends import choose_table, settings_label, tidy_table
+
 # Configuration
 pdf_path = "raw_data/mcs1996.pdf"
-start_page = 18  # First commodity page (ABRASIVES)
-end_page = 193  # Last commodity page
 output_dir = "world_production"
+report_file = "table_backends_report.csv"  # kept out of output_dir, which holds only page tables
+timings_file = "extraction_timings.csv"  # seconds per page from previous runs (cost model)
+workers_file = "extraction_workers.csv"  # pages, peak RSS and end of each worker process
+pages_per_worker = 200  # recycle a worker after this many pages
+worker_rss_limit_mb = 1000  # ... or once its resident memory passes this
 
-# Create output directory
-Path(output_dir).mkdir(exist_ok=True)
+TIMING_COLUMNS = ['pdf', 'page', 'chars', 'edges', 'backend', 'seconds']
 
-print(f"Extracting world production tables from pages {start_page} to {end_page}...\n")
+_cache = None  # layout cache of the current process (opened once per worker)
 
-# Extract tables
-all_results = []
 
-for page_num in range(start_page, end_page + 1):
-    print(f"Processing page {page_num}...")
+def extract_page(pdf_path, page_num, cache, settings=None):
+    """World production table of one page; returns (DataFrame or None, backend report row)
+
+    settings: the page's stored retry settings (page_retry.py), tried before the backends
+    """
+    # Largest table on the page from the first backend that gives a sane one
+    chosen, tried = choose_table(pdf_path, page_num, cache, settings=settings)
+    
+    report = {
+        'page': page_num,
+        'backend': chosen['backend'] if chosen else '',
+        'accuracy': chosen['accuracy'] if chosen else None,
+        'whitespace': chosen['whitespace'] if chosen else None,
+        'tried': ' | '.join(tried)
+    }
+    
+    if not chosen:
+        print(f"  ✗ No tables found ({'; '.join(tried)})")
+        return None, report
     
-    try:
-        # Extract all tables from page using stream mode (best for USGS)
-        # Camelot only extracts tables, not paragraphs!
-        tables = camelot.read_pdf(pdf_path, pages=str(page_num), flavor='stream')
+    # Clean the dataframe - remove empty and whitespace-only rows
+    df = tidy_table(chosen['df'])
+    
+    accuracy = f", accuracy: {chosen['accuracy']:.1f}%" if chosen['accuracy'] is not None else ''
+    print(f"  ✓ Found table: {df.shape} (backend: {chosen['backend']}{accuracy})")
+    return df, report
+
+
+def page_file(page_num, folder=output_dir):
+    return f"{folder}/page_{page_num}_world_production.csv"
+
+
+def page_features(cache, pages):
+    """Chars and ruling edges of each page, read from the layout cache index (no parsing)"""
+    rows = [cache.pages[cache.index[page]] if page in cache else None for page in pages]
+    return pd.DataFrame({
+        'page': pages,
+        'chars': [int(row['char_end'] - row['char_start']) if row is not None else 0 for row in rows],
+        'edges': [int(row['edge_end'] - row['edge_start']) if row is not None else 0 for row in rows],
+    })
+
+
+def read_timings(path=timings_file):
+    if not Path(path).exists():
+        return pd.DataFrame(columns=TIMING_COLUMNS)
+    return read_csv(path, keep_default_na=False, dtype={'pdf': str, 'backend': str})
+
+
+def estimate_costs(features, timings):
+    """Predicted seconds per page: the recorded time of an unchanged page, else chars x seconds per char"""
+    recorded = timings.drop_duplicates(['page', 'chars', 'edges'], keep='last')
+    costs = features.merge(recorded[['page', 'chars', 'edges', 'seconds']],
+                           on=['page', 'chars', 'edges'], how='left')
+    # Without any timings only the order matters, and chars alone give it
+    rate = timings['seconds'].sum() / timings['chars'].sum() if timings['chars'].sum() > 0 else 1.0
+    return costs['seconds'].fillna(costs['chars'] * rate).astype(float).tolist()
+
+
+def extract_and_save(page_num, stored=None):
+    """extract_page() and the page CSV, in a worker; returns (page, df, report, seconds, printed output)
+
+    stored: page -> retry settings that fixed the page on an earlier run
+    """
+    global _cache
+    if _cache is None:
+        import pdfplumber.table  # imported before the clock starts, not billed to the first page
+        _cache = LayoutCache.open_existing(pdf_path, [page_num])
+
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        print(f"Processing page {page_num}...")
+        try:
+            df, report = extract_page(pdf_path, page_num, _cache, (stored or {}).get(page_num))
+            if df is not None:
+                to_csv(df, page_file(page_num), header=False)
+        except Exception as e:
+            print(f"  ✗ Error: {e}")
+            df, report = None, None
+    return page_num, df, report, time.perf_counter() - start, output.getvalue()
+
+
+def crashed_page(page_num):
+    """extract_and_save()'s result for a page that kept crashing its worker process"""
+    return page_num, None, None, 0.0, f"Processing page {page_num}...\n  ✗ Worker crashed on this page\n"
+
+
+def retry_failed_pages(pdf_path, outcomes, features, folder=output_dir, workers=None):
+    """Retry the pages whose table the cleaning steps would drop (page_retry.py), in place
+
+    outcomes: [(page, df, report, seconds, printed output)] as extract_and_save()
+    returns them; a fixed page gets its new table, report and page file in folder,
+    and the retried pages' winning settings are stored. Returns ({page: reason}
+    for the failed pages, {page: (candidate, settings)} for the fixed ones)
+    """
+    failed = {page_num: check_table(df, page_num) for page_num, df, _, _, _ in outcomes}
+    failed = {page_num: reason for page_num, reason in failed.items() if reason}
+    if not failed:
+        return failed, {}
+
+    fixed, tried = retry_pages(pdf_path, list(failed), workers, max_tasks=pages_per_worker,
+                               max_rss_mb=worker_rss_limit_mb)
+    for n, (page_num, df, report, seconds, output) in enumerate(outcomes):
+        if page_num not in failed:
+            continue
+        output += f"  ⚠ {failed[page_num]}, retried with {len(RETRY_SETTINGS)} settings\n"
+        if page_num in fixed:
+            candidate, settings = fixed[page_num]
+            df = candidate['df']
+            to_csv(df, page_file(page_num, folder), header=False)
+            report = {'page': page_num, 'backend': candidate['backend'], 'accuracy': candidate['accuracy'],
+                      'whitespace': candidate['whitespace'],
+                      'tried': ' | '.join(([report['tried']] if report else []) + tried[page_num])}
+            output += f"  ✓ Fixed with {settings_label(settings)}: {df.shape}\n"
+        else:
+            output += f"  ✗ Still failing ({'; '.join(tried[page_num])})\n"
+        outcomes[n] = (page_num, df, report, seconds, output)
+    store_settings(pdf_path, features, list(failed), fixed)
+    return failed, fixed
+
+
+def main():
+    global _cache
+    
+    # Create output directory
+    Path(output_dir).mkdir(exist_ok=True)
+    
+    index = PageIndex.open_or_build(pdf_path)
+    pages = index.table_pages()
+    
+    print(f"Extracting world production tables from {len(pages)} pages in {index.page_range()}...\n")
+    
+    _cache = LayoutCache.open_or_build(pdf_path, pages)
+    
+    # Extract tables, longest pages first across the pool
+    features = page_features(_cache, pages)
+    timings = read_timings()
+    costs = estimate_costs(features, timings[timings['pdf'] == Path(pdf_path).name])
+    stored = stored_settings(pdf_path, features)
+    workers = min(default_workers, max(len(pages), 1))
+    start = time.perf_counter()
+    worker_report = []
+    outcomes = run_largest_first(partial(extract_and_save, stored=stored), pages, costs, workers,
+                                 max_tasks=pages_per_worker, max_rss_mb=worker_rss_limit_mb,
+                                 worker_report=worker_report, on_crash=crashed_page)
+    wall = time.perf_counter() - start
+    workers_df = pd.DataFrame(worker_report, columns=['worker', 'pid', 'tasks', 'peak_rss_mb', 'ended'])
+    to_csv(workers_df, workers_file)
+    
+    all_results = []
+    backend_report = []
+    
+    # Pages the cleaning steps would drop get a second chance with other settings
+    failed, fixed = retry_failed_pages(pdf_path, outcomes, features, workers=workers)
+    
+    for page_num, df, report, seconds, output in outcomes:
+        print(output, end='')
+        if report is not None:
+            backend_report.append(report)
         
-        if tables:
-            # Get the largest table (typically the world production table)
-            largest_table = max(tables, key=lambda t: t.df.shape[0] * t.df.shape[1])
-            df = largest_table.df
-            
-            # Clean the dataframe - remove completely empty rows
-            df = df.replace('', pd.NA)  # Replace empty strings with NA
-            df = df.dropna(how='all')   # Drop rows that are all NA
-            df = df.reset_index(drop=True)
-            
-            # Also remove rows where all cells are just whitespace
-            df = df[~df.apply(lambda row: all(str(cell).strip() == '' for cell in row), axis=1)]
-            df = df.reset_index(drop=True)
-            
-            print(f"  ✓ Found table: {df.shape} (accuracy: {largest_table.accuracy:.1f}%)")
-            
-            # Save to CSV
-            filename = f"{output_dir}/page_{page_num}_world_production.csv"
-            df.to_csv(filename, index=False, header=False)
-            
+        if df is not None:
             all_results.append({
                 'page': page_num,
-                'filename': filename,
+                'filename': page_file(page_num),
                 'shape': df.shape,
                 'dataframe': df
             })
-        else:
-            print(f"  ✗ No tables found")
     
-    except Exception as e:
-        print(f"  ✗ Error: {e}")
-
-print(f"\n{'='*80}")
-print(f"Extracted {len(all_results)} world production tables")
-print(f"Saved to: {output_dir}/")
-print(f"{'='*80}")
-
-# Also save all to one Excel file
-if all_results:
-    print(f"\nCreating combined Excel file...")
+    # Record this run's page times (replacing earlier ones of the same pages)
+    measured = features.assign(
+        pdf=Path(pdf_path).name,
+        backend=[report['backend'] if report else '' for _, _, report, _, _ in outcomes],
+        seconds=[round(seconds, 4) for _, _, _, seconds, _ in outcomes],
+    )[TIMING_COLUMNS]
+    kept = timings[~(timings['pdf'].eq(Path(pdf_path).name) & timings['page'].isin(pages))]
+    to_csv(pd.concat([kept, measured], ignore_index=True), timings_file)
     
-    with pd.ExcelWriter(f"{output_dir}/all_world_production.xlsx", engine='openpyxl') as writer:
-        for i, result in enumerate(all_results):
-            sheet_name = f"Page_{result['page']}"
-            result['dataframe'].to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+    # Record which backend each page used
+    report_df = pd.DataFrame(backend_report, columns=['page', 'backend', 'accuracy', 'whitespace', 'tried'])
+    to_csv(report_df, report_file)
     
-    print(f"✓ Saved combined file: {output_dir}/all_world_production.xlsx")
-
-# Show preview of first table
-if all_results:
     print(f"\n{'='*80}")
-    print(f"Preview of first table (Page {all_results[0]['page']}):")
+    print(f"Extracted {len(all_results)} world production tables")
+    print(f"Saved to: {output_dir}/")
+    print(f"Backends used: {report_df['backend'].replace('', 'none').value_counts().to_dict()}")
+    print(f"Backend report: {report_file}")
+    print(f"Extraction: {wall:.1f}s on {workers} worker(s) for {measured['seconds'].sum():.1f}s of page time, "
+          f"slowest pages: {measured.nlargest(3, 'seconds')['page'].tolist()} (timings: {timings_file})")
+    if failed:
+        print(f"Retried {len(failed)} failed page(s): {len(fixed)} fixed (settings: {params_file}), "
+              f"still failing: {sorted(set(failed) - set(fixed))}")
+    if len(workers_df):
+        peak = workers_df.loc[workers_df['peak_rss_mb'].idxmax()]
+        print(f"Worker processes: {len(workers_df)} ({workers_df['ended'].value_counts().to_dict()}), "
+              f"peak RSS {peak['peak_rss_mb']:.0f} MB (worker {peak['worker']}) (report: {workers_file})")
     print(f"{'='*80}")
-    print(all_results[0]['dataframe'].head(10))
+    
+    # Also save all to one Excel file
+    if all_results:
+        print(f"\nCreating combined Excel file...")
+        
+        with pd.ExcelWriter(f"{output_dir}/all_world_production.xlsx", engine='openpyxl') as writer:
+            for i, result in enumerate(all_results):
+                sheet_name = f"Page_{result['page']}"
+                result['dataframe'].to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+        
+        print(f"✓ Saved combined file: {output_dir}/all_world_production.xlsx")
+    
+    # Show preview of first table
+    if all_results:
+        print(f"\n{'='*80}")
+        print(f"Preview of first table (Page {all_results[0]['page']}):")
+        print(f"{'='*80}")
+        print(all_results[0]['dataframe'].head(10))
+
 
+if __name__ == "__main__":
+    main()
@@ -8,38 +8,28 @@ First cell (position 0) always stays empty
 import pandas as pd
 from pathlib import Path
 
+from add_source_column import source
+from cleaning_odd_pages import page_number
+from csv_io import read_csv, to_csv
+from parallel_executor import exit_on_errors, run_per_file, print_summary
+from validation import empty_header_cells, header_row_cells, write_report
+
 # Configuration
 input_folder = "world_production_final"
 output_folder = "world_production_forward_filled"
 
-# Create output folder
-Path(output_folder).mkdir(exist_ok=True)
-
-print(f"Filling first rows in {input_folder}/...\n")
-
-# Process each CSV file
-csv_files = list(Path(input_folder).glob("*.csv"))
 
-for csv_file in csv_files:
-    print(f"Processing: {csv_file.name}")
-    
-    # Read CSV without headers
-    df = pd.read_csv(csv_file, header=None)
-    
-    # Get first row
-    first_row = df.iloc[0].copy()
-    
-    print(f"  Before: {first_row.tolist()}")
-    
+def fill_header_row(first_row):
+    """Return the filled first row as a list"""
     # Build new row
     new_row = [first_row.iloc[0]]  # Keep position 0 as-is (empty)
-    
+
     # Track last value for reserves case
     last_value = None
-    
+
     for i in range(1, len(first_row)):
         cell = first_row.iloc[i]
-        
+
         # If this position has a value, use it
         if pd.notna(cell) and str(cell).strip():
             current_value = str(cell).strip()
@@ -52,7 +42,7 @@ for csv_file in csv_files:
                 if pd.notna(first_row.iloc[j]) and str(first_row.iloc[j]).strip():
                     next_value = str(first_row.iloc[j]).strip()
                     break
-            
+
             # Check if next value contains "reserve"
             if next_value and 'reserve' in next_value.lower():
                 # Use previous value instead
@@ -63,21 +53,64 @@ for csv_file in csv_files:
             else:
                 # No next value, use last value
                 fill_value = last_value if last_value else ''
-            
+
             new_row.append(fill_value)
-    
+
+    return new_row
+
+
+def fill_table(df):
+    """Fill the first row of df; returns (df, before, after)"""
+    # Object columns so text can go into columns pandas read as numbers
+    df = df.astype(object)
+
+    # Get first row
+    first_row = df.iloc[0].copy()
+
+    new_row = fill_header_row(first_row)
+
     # Update first row
     df.iloc[0] = new_row
-    
-    print(f"  After:  {new_row}")
-    
+
+    return df, first_row.tolist(), new_row
+
+
+def process_file(csv_file, output_folder=output_folder):
+    """Fill the header row of one page CSV; returns (status, detail, issues) for the summary"""
+    # Read CSV without headers
+    df = read_csv(csv_file, header=None)
+
+    df, before, after = fill_table(df)
+
     # Save
-    output_file = Path(output_folder) / csv_file.name
-    df.to_csv(output_file, index=False, header=False)
-    
-    print(f"  ✓ Saved\n")
-
-print(f"{'='*60}")
-print(f"Done! Processed {len(csv_files)} files")
-print(f"Output: {output_folder}/")
-print(f"{'='*60}")
+    output_file = Path(output_folder) / Path(csv_file).name
+    to_csv(df, output_file, header=False)
+
+    # Header cells the fill could not give a value
+    issues = empty_header_cells(header_row_cells(df.iloc[0], source, page_number(csv_file)))
+
+    return 'ok', f"{before} → {after}", issues
+
+
+def main():
+    # Create output folder
+    Path(output_folder).mkdir(exist_ok=True)
+
+    print(f"Filling first rows in {input_folder}/...\n")
+
+    # Process each CSV file
+    csv_files = list(Path(input_folder).glob("*.csv"))
+
+    issues = []
+    results = run_per_file(process_file, csv_files, issues=issues, output_folder=output_folder)
+    counts = print_summary(results)
+    write_report('header_fill', issues)
+    exit_on_errors(counts)
+
+    print(f"Done! Processed {len(csv_files)} files")
+    print(f"Output: {output_folder}/")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
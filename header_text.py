@@ -0,0 +1,138 @@
+"""
+Header-Zone Text
+Reads only the top band of each page with pdfium's text engine (no layout
+analysis) for the commodity title and the "(Data in ...)" units line.
+text_lines() is the whole page through the same engine, outline() the PDF
+bookmarks (page_index.py builds its index from these).
+
+full_lines() is the fallback: full pdfplumber page text, taken from the layout
+cache when extract_world_prod.py has already built it, otherwise from
+pdfplumber directly for just that page.
+
+Usage:
+    with HeaderText("raw_data/mcs1996.pdf", range(18, 194)) as header:
+        lines = header.band_lines(19)
+"""
+
+# Configuration
+header_band = 200  # points from the top of the page
+
+
+class HeaderText:
+    def __init__(self, pdf_path, pages=None, band=header_band):
+        self.pdf_path = pdf_path
+        self.pages = range(min(pages), max(pages) + 1) if pages is not None else None
+        self.band = band
+        self._pdfium = None
+        self._plumber = None
+        self._cache = None
+
+        try:
+            import pypdfium2
+            self._pdfium = pypdfium2.PdfDocument(pdf_path)
+        except ImportError:
+            print("⚠ pypdfium2 not installed, using full pdfplumber text for page headers")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pdfium is not None:
+            self._pdfium.close()
+        if self._plumber is not None:
+            self._plumber.close()
+
+    def page_count(self):
+        if self._pdfium is not None:
+            return len(self._pdfium)
+        self._open_plumber()
+        return len(self._plumber.pages)
+
+    def _open_plumber(self):
+        if self._plumber is None:
+            import pdfplumber
+            self._plumber = pdfplumber.open(self.pdf_path)
+
+    def outline(self):
+        """PDF bookmarks as (title, 1-based page) in outline order ([] without pdfium or an outline)"""
+        if self._pdfium is None:
+            return []
+        bookmarks = []
+        for bookmark in self._pdfium.get_toc():
+            dest = bookmark.get_dest()
+            page_index = dest.get_index() if dest is not None else None
+            if page_index is not None:
+                bookmarks.append((bookmark.get_title().strip(), page_index + 1))
+        return bookmarks
+
+    def text_lines(self, page_num):
+        """Lines of the whole page's pdfium text (full_lines() without pdfium)"""
+        if self._pdfium is None:
+            return self.full_lines(page_num)
+        if page_num > len(self._pdfium):
+            return []
+        page = self._pdfium[page_num - 1]
+        textpage = page.get_textpage()
+        try:
+            text = textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+        return [line.strip() for line in text.splitlines() if line.strip()]
+
+    def band_lines(self, page_num):
+        """Text lines in the top band of the page, top to bottom ([] if unavailable)
+
+        pdfium gives text in content-stream order, which need not be top to
+        bottom, so the band's text segments (pdfium rects, each on one line)
+        are grouped into lines by height and the lines sorted by position
+        """
+        if self._pdfium is None or page_num > len(self._pdfium):
+            return []
+        page = self._pdfium[page_num - 1]
+        height = page.get_size()[1]
+        textpage = page.get_textpage()
+        try:
+            segments = []
+            for i in range(textpage.count_rects()):
+                left, bottom, right, top = textpage.get_rect(i)
+                if (bottom + top) / 2 >= height - self.band:
+                    segments.append((top, bottom, left, textpage.get_text_bounded(left, bottom, right, top)))
+        finally:
+            textpage.close()
+            page.close()
+
+        # Highest first; a segment whose middle is within the current line's height joins it
+        lines = []  # [top, bottom, [(left, text)]]
+        for top, bottom, left, text in sorted(segments, key=lambda segment: -segment[0]):
+            if lines and lines[-1][1] <= (bottom + top) / 2 <= lines[-1][0]:
+                lines[-1][2].append((left, text))
+            else:
+                lines.append([top, bottom, [(left, text)]])
+
+        text = '\n'.join(''.join(text for _, text in sorted(parts)) for _, _, parts in lines)
+        return [line.strip() for line in text.splitlines() if line.strip()]
+
+    def full_lines(self, page_num):
+        """Lines of the full pdfplumber page text ([] if the page has none)"""
+        if self._cache is None:
+            from layout_cache import LayoutCache
+            pages = self.pages if self.pages is not None else range(1, self.page_count() + 1)
+            self._cache = LayoutCache.open_existing(self.pdf_path, pages) or False
+
+        if self._cache:
+            if page_num not in self._cache:
+                return []
+            text = self._cache.page(page_num).extract_text()
+        else:
+            self._open_plumber()
+            if page_num > len(self._plumber.pages):
+                return []
+            page = self._plumber.pages[page_num - 1]
+            text = page.extract_text()
+            page.close()
+
+        return text.split('\n') if text else []
@@ -0,0 +1,287 @@
+"""
+PDF Layout Cache
+Parses each PDF page once with pdfplumber (pdfminer) and saves the layout
+objects - chars, words and text lines with their coordinates, plus ruling
+edges - as flat numpy arrays that are memory-mapped on load
+
+layout_cache/<pdf name>/
+    meta.json    source PDF size/mtime (stale caches are rebuilt), page list
+    pages.npy    per page: number, size, and slices into the arrays below
+    chars.npy    x0, x1, top, bottom, size, upright, text slice
+    words.npy    x0, x1, top, bottom, text slice
+    lines.npy    x0, x1, top, bottom, text slice
+    edges.npy    x0, x1, top, bottom, orientation
+    text.bin     UTF-8 text of every char/word/line, addressed by the slices
+
+CachedPage exposes the parts of a pdfplumber Page that table and text
+extraction use (chars, edges, bbox, extract_words, extract_text,
+extract_tables, within_bbox), so table settings and header searches can be
+re-tuned without parsing the PDF again.
+
+Usage:
+    cache = LayoutCache.open_or_build("raw_data/mcs1996.pdf", range(18, 194))
+    page = cache.page(19)
+    page.extract_tables({"vertical_strategy": "text", "horizontal_strategy": "text"})
+"""
+
+import copy
+import json
+from pathlib import Path
+
+import numpy as np
+
+# Configuration
+cache_root = "layout_cache"
+CACHE_VERSION = 2
+
+# float64 so table and word clustering see exactly the coordinates pdfplumber does
+BOX = [('x0', 'f8'), ('x1', 'f8'), ('top', 'f8'), ('bottom', 'f8')]
+TEXT_SLICE = [('text_start', 'u8'), ('text_len', 'u4')]
+CHAR_DTYPE = np.dtype(BOX + [('size', 'f8'), ('upright', '?')] + TEXT_SLICE)
+WORD_DTYPE = np.dtype(BOX + TEXT_SLICE)
+EDGE_DTYPE = np.dtype(BOX + [('orientation', 'u1')])  # 0 = horizontal, 1 = vertical
+PAGE_DTYPE = np.dtype([('page', 'u4'), ('width', 'f8'), ('height', 'f8')] +
+                      [(f'{kind}_{end}', 'u8')
+                       for kind in ['char', 'word', 'line', 'edge']
+                       for end in ['start', 'end']])
+
+
+def cache_dir_for(pdf_path, root=cache_root):
+    return Path(root) / Path(pdf_path).stem
+
+
+def pdf_fingerprint(pdf_path):
+    stat = Path(pdf_path).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class _TextWriter:
+    """Accumulates UTF-8 text and hands back (start, length) slices"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def add(self, text):
+        data = text.encode('utf-8')
+        start = self.offset
+        self.chunks.append(data)
+        self.offset += len(data)
+        return start, len(data)
+
+
+def _boxes(objects, dtype, text, extra=None):
+    array = np.zeros(len(objects), dtype=dtype)
+    for i, obj in enumerate(objects):
+        row = [obj['x0'], obj['x1'], obj['top'], obj['bottom']]
+        if extra:
+            row += extra(obj)
+        if text is not None:
+            row += list(text.add(obj['text']))
+        array[i] = tuple(row)
+    return array
+
+
+def build_cache(pdf_path, pages, root=cache_root):
+    """Parse the given 1-based pages once and write the cache; returns the cache directory"""
+    import pdfplumber
+
+    pages = sorted(set(pages))
+    cache_dir = cache_dir_for(pdf_path, root)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # meta.json is written last: without it readers (open_existing) never see a half-built cache
+    (cache_dir / 'meta.json').unlink(missing_ok=True)
+
+    text = _TextWriter()
+    page_rows, chars, words, lines, edges = [], [], [], [], []
+    counts = dict.fromkeys(['char', 'word', 'line', 'edge'], 0)
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in pages:
+            if page_num > len(pdf.pages):
+                continue
+            page = pdf.pages[page_num - 1]
+
+            page_chars = _boxes(page.chars, CHAR_DTYPE, text,
+                                extra=lambda c: [c.get('size', 0), c.get('upright', True)])
+            page_words = _boxes(page.extract_words(), WORD_DTYPE, text)
+            page_lines = _boxes(page.extract_text_lines(strip=True, return_chars=False), WORD_DTYPE, text)
+            page_edges = _boxes(page.edges, EDGE_DTYPE, None,
+                                extra=lambda e: [1 if e['orientation'] == 'v' else 0])
+
+            row = [page_num, float(page.width), float(page.height)]
+            for kind, array, bucket in [('char', page_chars, chars), ('word', page_words, words),
+                                        ('line', page_lines, lines), ('edge', page_edges, edges)]:
+                row += [counts[kind], counts[kind] + len(array)]
+                counts[kind] += len(array)
+                bucket.append(array)
+            page_rows.append(tuple(row))
+
+            # pdfminer keeps parsed pages alive otherwise
+            page.close()
+
+    np.save(cache_dir / 'pages.npy', np.array(page_rows, dtype=PAGE_DTYPE))
+    for name, bucket, dtype in [('chars', chars, CHAR_DTYPE), ('words', words, WORD_DTYPE),
+                                ('lines', lines, WORD_DTYPE), ('edges', edges, EDGE_DTYPE)]:
+        np.save(cache_dir / f'{name}.npy', np.concatenate(bucket) if bucket else np.zeros(0, dtype))
+    (cache_dir / 'text.bin').write_bytes(b''.join(text.chunks))
+
+    meta = {'version': CACHE_VERSION, 'pdf': str(pdf_path), **pdf_fingerprint(pdf_path),
+            'requested': pages, 'pages': [row[0] for row in page_rows]}
+    (cache_dir / 'meta.json').write_text(json.dumps(meta))
+    return cache_dir
+
+
+class CachedPage:
+    """A page rebuilt from the cache with the pdfplumber Page API used for extraction"""
+
+    def __init__(self, cache, index):
+        self.cache = cache
+        self.info = cache.pages[index]
+        self.page_number = int(self.info['page'])
+        self.width = float(self.info['width'])
+        self.height = float(self.info['height'])
+        self.bbox = (0, 0, self.width, self.height)
+        self._chars = None
+        self._edges = None
+
+    def _slice(self, kind, array):
+        return array[int(self.info[f'{kind}_start']):int(self.info[f'{kind}_end'])]
+
+    def _objects(self, kind, array):
+        """Boxes of one kind as pdfplumber-style dicts"""
+        objects = []
+        for obj in self._slice(kind, array):
+            top, bottom = float(obj['top']), float(obj['bottom'])
+            objects.append({
+                'text': self.cache.text(obj), 'x0': float(obj['x0']), 'x1': float(obj['x1']),
+                'top': top, 'bottom': bottom, 'doctop': top,
+                'y0': self.height - bottom, 'y1': self.height - top,
+                'width': float(obj['x1'] - obj['x0']), 'height': bottom - top,
+            })
+        return objects
+
+    @property
+    def chars(self):
+        if self._chars is None:
+            self._chars = self._objects('char', self.cache.chars)
+            for char, raw in zip(self._chars, self._slice('char', self.cache.chars)):
+                char.update(object_type='char', size=float(raw['size']), upright=bool(raw['upright']))
+        return self._chars
+
+    @property
+    def words(self):
+        return self._objects('word', self.cache.words)
+
+    @property
+    def lines(self):
+        return self._objects('line', self.cache.lines)
+
+    @property
+    def edges(self):
+        if self._edges is None:
+            self._edges = []
+            for edge in self._slice('edge', self.cache.edges):
+                x0, x1, top, bottom = (float(edge[k]) for k in ['x0', 'x1', 'top', 'bottom'])
+                self._edges.append({
+                    'object_type': 'line', 'x0': x0, 'x1': x1, 'top': top, 'bottom': bottom,
+                    'doctop': top, 'width': x1 - x0, 'height': bottom - top,
+                    'orientation': 'v' if edge['orientation'] else 'h',
+                })
+        return self._edges
+
+    def header_lines(self, band=None, count=None):
+        """Text lines from the top of the page (top < band points, at most count lines)"""
+        lines = self.lines
+        if band is not None:
+            lines = [line for line in lines if line['top'] < band]
+        return [line['text'] for line in lines[:count]]
+
+    def within_bbox(self, bbox):
+        """The page with only the chars and edges entirely inside bbox (x0, top, x1, bottom), as pdfplumber's"""
+        x0, top, x1, bottom = bbox
+
+        def inside(obj):
+            return obj['x0'] >= x0 and obj['x1'] <= x1 and obj['top'] >= top and obj['bottom'] <= bottom
+        page = copy.copy(self)
+        page.bbox = tuple(bbox)
+        page._chars = [char for char in self.chars if inside(char)]
+        page._edges = [edge for edge in self.edges if inside(edge)]
+        return page
+
+    def extract_words(self, **kwargs):
+        from pdfplumber.utils import extract_words
+        return extract_words(self.chars, **kwargs)
+
+    def extract_text(self, **kwargs):
+        from pdfplumber.utils import extract_text
+        return extract_text(self.chars, **kwargs)
+
+    def find_tables(self, table_settings=None):
+        from pdfplumber.table import TableFinder
+        return TableFinder(self, table_settings).tables
+
+    def extract_tables(self, table_settings=None):
+        from pdfplumber.table import TableSettings
+        settings = TableSettings.resolve(table_settings)
+        return [table.extract(**(settings.text_settings or {}))
+                for table in self.find_tables(settings)]
+
+
+class LayoutCache:
+    """Memory-mapped view of a built cache"""
+
+    def __init__(self, cache_dir):
+        cache_dir = Path(cache_dir)
+        self.meta = json.loads((cache_dir / 'meta.json').read_text())
+        self.pages = np.load(cache_dir / 'pages.npy', mmap_mode='r')
+        self.chars = np.load(cache_dir / 'chars.npy', mmap_mode='r')
+        self.words = np.load(cache_dir / 'words.npy', mmap_mode='r')
+        self.lines = np.load(cache_dir / 'lines.npy', mmap_mode='r')
+        self.edges = np.load(cache_dir / 'edges.npy', mmap_mode='r')
+        text_file = cache_dir / 'text.bin'
+        self.blob = (np.memmap(text_file, dtype=np.uint8, mode='r')
+                     if text_file.stat().st_size else np.zeros(0, np.uint8))
+        self.index = {int(p): i for i, p in enumerate(self.pages['page'])}
+
+    @staticmethod
+    def _cached_pages(pdf_path, root=cache_root):
+        """Pages requested when the cache was built, or None if it is missing or stale"""
+        meta_file = cache_dir_for(pdf_path, root) / 'meta.json'
+        if not meta_file.exists():
+            return None
+        meta = json.loads(meta_file.read_text())
+        fresh = (meta.get('version') == CACHE_VERSION and
+                 {k: meta.get(k) for k in ['size', 'mtime_ns']} == pdf_fingerprint(pdf_path))
+        return set(meta['requested']) if fresh else None
+
+    @classmethod
+    def open_existing(cls, pdf_path, pages, root=cache_root):
+        """Open the cache if it is fresh and covers pages, else None (never parses the PDF)"""
+        cached = cls._cached_pages(pdf_path, root)
+        if cached is not None and set(pages) <= cached:
+            return cls(cache_dir_for(pdf_path, root))
+        return None
+
+    @classmethod
+    def open_or_build(cls, pdf_path, pages, root=cache_root):
+        """Open the cache for pdf_path, (re)building it if missing, stale or short of pages"""
+        cache = cls.open_existing(pdf_path, pages, root)
+        if cache is not None:
+            return cache
+
+        pages = set(pages) | (cls._cached_pages(pdf_path, root) or set())
+        print(f"Building layout cache for {len(pages)} page(s) of {pdf_path}...")
+        return cls(build_cache(pdf_path, pages, root))
+
+    def text(self, obj):
+        start = int(obj['text_start'])
+        return bytes(self.blob[start:start + int(obj['text_len'])]).decode('utf-8')
+
+    def __contains__(self, page_num):
+        return page_num in self.index
+
+    def page(self, page_num):
+        """1-based page number -> CachedPage"""
+        return CachedPage(self, self.index[page_num])
@@ -0,0 +1,206 @@
+"""
+Lazy Dataset API
+Answers one question without a full pipeline run: load() looks the requested
+commodities up in the edition's page index (page_index.py, built once per
+PDF), extracts and cleans just their table pages and returns the rows in
+the schema of combined_world_production_cleaned.csv
+
+Every stage is memoized per edition and page under lazy_cache/<edition>/:
+    commodity_names_with_units.csv   page -> commodity mapping (from the index)
+    world_production/                extracted page tables (extract_world_prod.py)
+    world_production_long_format/    long rows of those pages (batch_cleaning.py)
+so each page is extracted and cleaned once; repeated load() calls in one
+process also reuse the pivoted and cleaned frame
+
+The PROD_ columns are the years of the selected pages only
+
+Usage:
+    from lazy_dataset import load
+    df = load("mcs1996", commodity="COPPER")
+    df = load("mcs1996", commodity=["GOLD", "SILVER"], country="Peru")
+
+    python lazy_dataset.py mcs1996 COPPER [Chile ...]
+"""
+
+import contextlib
+import io
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+import batch_cleaning
+from csv_io import read_csv, to_csv
+import extract_world_prod
+from add_commodities import add_commodities
+from layout_cache import LayoutCache
+from page_index import PageIndex
+from page_retry import stored_settings
+from parsing_yearly_prod_data import add_year_columns, pivot_years, read_combined
+from post_merge_cleaning_script import clean_combined, read_pivoted
+
+# Configuration
+pdf_folder = "raw_data"
+cache_folder = "lazy_cache"
+mapping_file = "commodity_names_with_units.csv"
+
+
+def edition_folder(edition):
+    return Path(cache_folder) / edition
+
+
+def edition_pdf(edition):
+    return str(Path(pdf_folder) / f"{edition}.pdf")
+
+
+def page_path(folder, page):
+    return Path(extract_world_prod.page_file(page, folder))
+
+
+def _names(value):
+    """One name or a list of names as a list"""
+    return [value] if isinstance(value, str) else list(value)
+
+
+def mapping_path(edition):
+    """The edition's page -> commodity mapping file, written from the page index on first use"""
+    path = edition_folder(edition) / mapping_file
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        to_csv(PageIndex.open_or_build(edition_pdf(edition)).commodity_mapping(), path)
+    return path
+
+
+def commodity_pages(edition, commodity=None):
+    """Sorted table pages of the given commodities (of every commodity for None)"""
+    index = PageIndex.open_or_build(edition_pdf(edition))
+    if commodity is None:
+        return index.table_pages()
+
+    unknown = [name for name in _names(commodity) if not index.pages_for(name)]
+    if unknown:
+        raise ValueError(f"Not in the {edition} page index: {sorted(unknown)}")
+    return sorted({page for name in _names(commodity) for page in index.table_pages(name)})
+
+
+def extract_pages(edition, pages):
+    """Extract the tables of the pages not extracted yet; returns the pages extracted now
+
+    Raises RuntimeError when a page's extraction failed (and no retry fixed
+    it): the page gets no file, so the next call extracts it again
+    """
+    folder = edition_folder(edition) / extract_world_prod.output_dir
+    missing = [page for page in pages if not page_path(folder, page).exists()]
+    if not missing:
+        return []
+
+    folder.mkdir(parents=True, exist_ok=True)
+    pdf_path = edition_pdf(edition)
+    cache = LayoutCache.open_or_build(pdf_path, missing)
+    features = extract_world_prod.page_features(cache, missing)
+    stored = stored_settings(pdf_path, features)
+    outcomes, errors = [], {}
+    for page in missing:
+        print(f"Processing page {page}...")
+        try:
+            df, report = extract_world_prod.extract_page(pdf_path, page, cache, stored.get(page))
+        except Exception as e:
+            print(f"  ✗ Error: {e}")
+            errors[page] = e
+            outcomes.append((page, None, None, 0.0, ''))
+            continue
+        if df is None:
+            page_path(folder, page).write_text('')  # remembered as "no table"
+        else:
+            to_csv(df, page_path(folder, page), header=False)
+        outcomes.append((page, df, report, 0.0, ''))
+
+    # Pages the cleaning steps would drop are retried as extract_world_prod.py retries them
+    extract_world_prod.retry_failed_pages(pdf_path, outcomes, features, folder)
+    for _, _, _, _, output in outcomes:
+        print(output, end='')
+
+    errors = {page: e for page, e in errors.items() if not page_path(folder, page).exists()}
+    if errors:
+        page, error = next(iter(errors.items()))
+        raise RuntimeError(f"Extracting {edition} page(s) {sorted(errors)} failed "
+                           f"(page {page}: {type(error).__name__}: {error})") from error
+    return missing
+
+
+def clean_pages(edition, pages):
+    """Long-format rows for the pages not cleaned yet (steps 2-8); returns the pages cleaned now"""
+    raw_folder = edition_folder(edition) / extract_world_prod.output_dir
+    long_folder = edition_folder(edition) / batch_cleaning.output_folder
+    missing = [page for page in pages if not page_path(long_folder, page).exists()]
+    if not missing:
+        return []
+
+    long_folder.mkdir(parents=True, exist_ok=True)
+    cells, filenames = batch_cleaning.read_raw_pages(raw_folder, edition, only_pages=set(missing))
+    if filenames:
+        long_df, _, _ = batch_cleaning.run_batch(cells)
+        batch_cleaning.write_long_format(long_df, filenames, long_folder)
+
+    # Extracted pages without long rows (no table, no years row, ...) get a header-only
+    # file; a page with no raw file yet is left to be cleaned once it has one
+    missing = [page for page in missing if page_path(raw_folder, page).exists()]
+    for page in missing:
+        if not page_path(long_folder, page).exists():
+            to_csv(pd.DataFrame(columns=batch_cleaning.LONG_COLUMNS), page_path(long_folder, page))
+    return missing
+
+
+@lru_cache(maxsize=32)
+def cleaned_pages(edition, pages):
+    """Steps 9-11 (combine, pivot, clean) on the pages' memoized long rows
+
+    Goes through the same CSV text the pipeline's files hold between steps,
+    so values come out as they do in combined_world_production_cleaned.csv
+    """
+    long_folder = edition_folder(edition) / batch_cleaning.output_folder
+    combined = pd.concat([read_csv(page_path(long_folder, page)) for page in pages], ignore_index=True)
+    combined = add_commodities(combined, mapping_path(edition))
+
+    df = pivot_years(add_year_columns(read_combined(io.StringIO(combined.to_csv(index=False)))))
+    df = read_pivoted(io.StringIO(df.to_csv(index=False)))
+    return clean_combined(df, review_path=None, mapping_path=None)
+
+
+def load(edition="mcs1996", commodity=None, country=None, verbose=False):
+    """Cleaned rows of one edition, in the combined_world_production_cleaned.csv schema
+
+    commodity and country each take one name or a list (None = all); only
+    the pages of the requested commodities are extracted and cleaned.
+    verbose=True shows the pipeline steps' output
+    """
+    report = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with report:
+        pages = commodity_pages(edition, commodity)
+        extract_pages(edition, pages)
+        clean_pages(edition, pages)
+        df = cleaned_pages(edition, tuple(pages))
+
+    # A copy either way: callers never modify the memoized frame
+    if country is not None:
+        df = df[df['country'].isin(_names(country))]
+    return df.reset_index(drop=True)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    edition, commodity, countries = sys.argv[1], sys.argv[2], sys.argv[3:] or None
+    df = load(edition, commodity=commodity, country=countries)
+
+    print(f"{'='*60}")
+    print(f"✓ {commodity} in {edition}: {len(df):,} rows, pages {sorted(df['page'].unique().tolist())}")
+    print(f"{'='*60}")
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
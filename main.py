@@ -1,118 +1,329 @@
 """
 Main Pipeline - USGS World Production Data Extraction and Cleaning
-Runs all scripts in the correct order to process PDF to final cleaned CSV
+Runs all scripts to process PDF to final cleaned CSV
+Steps are a dependency graph: each declares the files/folders it reads and
+writes, and a step starts as soon as the steps producing its inputs are done,
+so independent branches (e.g. commodity-name extraction next to table
+extraction and cleaning) run at the same time
+Concurrency is limited by a CPU and memory budget:
+    PIPELINE_CPUS       CPUs to share between running steps (default: all)
+    PIPELINE_MEMORY_MB  memory to share, against each step's estimate (default: 75% of RAM)
+Per-page steps run across a process pool sized to the CPUs free when they
+start; set PIPELINE_WORKERS to cap their workers
+The critical path (the chain of steps that set the total time) is reported at the end
+Set PIPELINE_MODE=batch to run steps 2-8 as one batch_cleaning.py step
+Set PIPELINE_CHUNKSIZE=<rows> to pivot and clean the combined file out of core
+Set PIPELINE_PARQUET=1 to also export the partitioned Parquet dataset (parquet_dataset.py)
+After fixing one page, python update_page.py <page> patches the outputs in place
+merge_editions.py combines the final outputs of several editions into one time series
 """
 
+import os
 import subprocess
 import sys
-from pathlib import Path
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Configuration
+pdf_file = "raw_data/mcs1996.pdf"
+cpu_budget = int(os.environ.get("PIPELINE_CPUS", 0)) or os.cpu_count() or 1
+worker_cap = int(os.environ.get("PIPELINE_WORKERS", 0)) or None
+
+POOL = None  # cpus for steps with a process pool: every CPU free when the step starts
+
+
+def total_memory_mb():
+    """Physical memory in MB (4096 if the platform doesn't say)"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2**20
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+
+memory_budget_mb = int(os.environ.get("PIPELINE_MEMORY_MB", 0)) or int(total_memory_mb() * 0.75)
+
+
+def step(script, description, inputs, outputs, cpus=1, memory_mb=500):
+    """One pipeline step: the files/folders it reads and writes, and what it needs to run"""
+    return {'script': script, 'description': description, 'inputs': inputs, 'outputs': outputs,
+            'cpus': cpus, 'memory_mb': memory_mb}
+
+
+def run_script(script_name, description, env=None):
+    """Run a Python script; returns (success, report text printed when the step ends)"""
+    lines = ["\n" + "="*80, f"STEP: {description}", "="*80]
 
-def run_script(script_name, description):
-    """Run a Python script and handle errors"""
-    print("\n" + "="*80)
-    print(f"STEP: {description}")
-    print("="*80)
-    
     try:
         result = subprocess.run(
             [sys.executable, script_name],
             check=True,
             capture_output=True,
-            text=True
+            text=True,
+            env=env
         )
-        print(result.stdout)
+        lines.append(result.stdout)
         if result.stderr:
-            print("WARNINGS:", result.stderr)
-        print(f"✓ Completed: {description}")
-        return True
+            lines.append(f"WARNINGS: {result.stderr}")
+        lines.append(f"✓ Completed: {description}")
+        return True, "\n".join(lines)
     except subprocess.CalledProcessError as e:
-        print(f"✗ ERROR in {script_name}:")
-        print(e.stdout)
-        print(e.stderr)
-        return False
+        lines += [f"✗ ERROR in {script_name}:", e.stdout, e.stderr]
+        return False, "\n".join(lines)
+
+
+def dependencies(steps):
+    """For each script, the earlier steps that write one of its inputs or outputs
+
+    Steps writing the same file (validation_report.csv, where each stage
+    replaces its own rows) run one after another, in declaration order
+    """
+    deps = {}
+    for i, current in enumerate(steps):
+        deps[current['script']] = [earlier['script'] for earlier in steps[:i]
+                                   if set(earlier['outputs']) & set(current['inputs'] + current['outputs'])]
+    return deps
+
+
+def run_graph(steps, cpus=cpu_budget, memory_mb=memory_budget_mb):
+    """Run steps as soon as their dependencies are done and the budget allows
+
+    Ready steps start in declaration order; one that doesn't fit waits while
+    later, smaller ones may go ahead. A step always starts when nothing else
+    is running, whatever its estimate. Steps depending on a failed step are
+    skipped. Returns (timings {script: (start, end)}, failed, skipped).
+    """
+    deps = dependencies(steps)
+    pending = list(steps)
+    running = {}
+    timings, done, failed, skipped = {}, set(), [], []
+    free_cpus, free_memory = cpus, memory_mb
+    t0 = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+        while pending or running:
+            for current in list(pending):
+                blocked = [d for d in deps[current['script']] if d in failed or d in skipped]
+                if blocked:
+                    pending.remove(current)
+                    skipped.append(current['script'])
+                    print(f"\n- Skipping {current['script']}: depends on {', '.join(blocked)}")
+
+            for current in list(pending):
+                if not all(d in done for d in deps[current['script']]):
+                    continue
+
+                claim = current['cpus']
+                if claim is POOL:
+                    claim = max(1, min(free_cpus, worker_cap or free_cpus))
+                claim = min(claim, cpus)
+                memory = min(current['memory_mb'], memory_mb)
+                if running and (claim > free_cpus or memory > free_memory):
+                    continue
+
+                env = dict(os.environ)
+                if current['cpus'] is POOL:
+                    env['PIPELINE_WORKERS'] = str(claim)
+                print(f"▶ Starting: {current['description']} ({current['script']}, "
+                      f"{claim} CPU{'s' if claim > 1 else ''}, ~{memory} MB)")
+
+                future = pool.submit(run_script, current['script'], current['description'], env)
+                running[future] = (current, claim, memory)
+                timings[current['script']] = (time.monotonic() - t0, None)
+                free_cpus -= claim
+                free_memory -= memory
+                pending.remove(current)
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                current, claim, memory = running.pop(future)
+                script = current['script']
+                success, report = future.result()
+                timings[script] = (timings[script][0], time.monotonic() - t0)
+                free_cpus += claim
+                free_memory += memory
+
+                print(report)
+                if success:
+                    done.add(script)
+                else:
+                    failed.append(script)
+                    print(f"\n⚠ WARNING: {script} failed. Continuing with the steps that don't depend on it...")
+
+    return timings, failed, skipped
+
+
+def critical_path(steps, timings):
+    """Longest chain of dependent steps by run time; returns [(script, seconds)]"""
+    deps = dependencies(steps)
+    duration = {script: end - start for script, (start, end) in timings.items() if end is not None}
+
+    # Steps are declared after their dependencies, so one pass in order is enough
+    finish, previous = {}, {}
+    for current in steps:
+        script = current['script']
+        if script not in duration:
+            continue
+        before = [d for d in deps[script] if d in finish]
+        longest = max(before, key=lambda d: finish[d], default=None)
+        finish[script] = duration[script] + (finish[longest] if longest else 0.0)
+        previous[script] = longest
+
+    if not finish:
+        return []
+    path, script = [], max(finish, key=finish.get)
+    while script is not None:
+        path.append((script, duration[script]))
+        script = previous[script]
+    return path[::-1]
+
+
+def print_timing_report(steps, timings):
+    """Start/end of every step and the critical path"""
+    path = critical_path(steps, timings)
+    on_path = {script for script, _ in path}
+    wall = max((end for _, end in timings.values() if end is not None), default=0.0)
+    busy = sum(end - start for start, end in timings.values() if end is not None)
+
+    print("\nStep timings (seconds from pipeline start, * = critical path):")
+    for script, (start, end) in sorted(timings.items(), key=lambda item: item[1][0]):
+        if end is None:
+            continue
+        marker = '*' if script in on_path else ' '
+        print(f"  {marker} {script:<32} {start:8.1f} → {end:8.1f}  ({end - start:.1f}s)")
+
+    print(f"\nCritical path: {' → '.join(script for script, _ in path)}")
+    print(f"  {sum(seconds for _, seconds in path):.1f}s of {wall:.1f}s wall time "
+          f"({busy:.1f}s of step time in total)")
+
 
 def main():
     """Run the complete pipeline"""
-    
+
     print("="*80)
     print("USGS WORLD PRODUCTION DATA PIPELINE")
     print("="*80)
     print("\nThis pipeline will:")
+    print("0. Index the PDF's pages by commodity")
     print("1. Extract tables from PDF")
     print("2. Clean and standardize the data")
-    print("3. Extract commodity names")
-    print("4. Combine all files")
+    print("3. Extract commodity names (alongside 1 and 2)")
+    print("4. Combine all files and attach commodity names")
     print("5. Pivot into final format")
     print("6. Clean country, type, and PROD columns")
+    print("7. Precompute world shares, year-over-year growth and rankings")
+    print(f"\nBudget: {cpu_budget} CPUs, {memory_budget_mb:,} MB")
     print("\nStarting pipeline...\n")
-    
-    # Define pipeline steps
+
+    # Define pipeline steps (in dependency order)
     steps = [
+        # Step 0: Index the PDF's pages (commodity, units, world table) once
+        step("page_index.py", "Index PDF pages by commodity",
+             inputs=[pdf_file], outputs=["page_index"]),
+
         # Step 1: Extract world production tables from PDF
-        ("extract_world_prod.py", "Extract world production tables from PDF"),
-        
+        step("extract_world_prod.py", "Extract world production tables from PDF",
+             inputs=[pdf_file, "page_index"],
+             outputs=["world_production", "layout_cache", "table_backends_report.csv", "extraction_timings.csv",
+                      "extraction_workers.csv", "page_retry_params.csv"],
+             cpus=POOL, memory_mb=1500),
+
         # Step 2: Clean tables - remove text before data
-        ("cleaning_script.py", "Clean tables - remove paragraphs before data"),
-        
+        step("cleaning_script.py", "Clean tables - remove paragraphs before data",
+             inputs=["world_production"], outputs=["world_production_cleaned"], cpus=POOL),
+
         # Step 3: Further clean odd-numbered pages
-        ("cleaning_odd_pages.py", "Clean odd-numbered pages - remove extra rows"),
-        
+        step("cleaning_odd_pages.py", "Clean odd-numbered pages - remove extra rows",
+             inputs=["world_production_cleaned"], outputs=["world_production_final"], cpus=POOL),
+
         # Step 4: Forward-fill/backward-fill headers
-        ("forward_filling_script.py", "Fill empty cells in headers"),
-        
+        step("forward_filling_script.py", "Fill empty cells in headers",
+             inputs=["world_production_final"], outputs=["world_production_forward_filled", "validation_report.csv"],
+             cpus=POOL),
+
         # Step 5: Merge header rows
-        ("merge_headers.py", "Merge header rows 1 and 2"),
-        
+        step("merge_headers.py", "Merge header rows 1 and 2",
+             inputs=["world_production_forward_filled"], outputs=["world_production_merged_headers"],
+             cpus=POOL),
+
         # Step 6: Add 'country' to position 0
-        ("add_country_header.py", "Add 'country' header"),
-        
-        # Step 7: Add source column with mcs1996
-        ("add_source_column.py", "Add 'source' column with mcs1996"),
-        
-        # Step 8: Unpivot to long format
-        ("unpivot_tables.py", "Unpivot tables to long format"),
-        
-        # Step 9: Rename metric to type and add commodity column
-        ("final_rename_headers.py", "Rename 'metric' to 'type' and add 'commodity' column"),
-        
-        # Step 10: Extract commodity names from PDF
-        ("extract_commodity_names.py", "Extract commodity names from PDF pages"),
-        
-        # Step 11: Populate commodity column
-        ("add_commodities.py", "Populate commodity column using lookup"),
-        
-        # Step 12: Combine all files
-        ("append_append_append_all.py", "Combine all CSV files into one"),
-        
-        # Step 13: Pivot years into columns
-        ("parsing_yearly_prod_data.py", "Pivot year data into separate columns"),
-        
-        # Step 14: Clean the data
-        ("post_merge_cleaning_script.py", "Clean country, type, and PROD columns"),
+        step("add_country_header.py", "Add 'country' header",
+             inputs=["world_production_merged_headers"], outputs=["world_production_final_headers"],
+             cpus=POOL),
+
+        # Step 7: Add source column with mcs1996, page column and source_row column
+        # (re-reads the extracted and first-cleaned pages for the source_row offsets)
+        step("add_source_column.py", "Add 'source' column with mcs1996, 'page' and 'source_row' columns",
+             inputs=["world_production_final_headers", "world_production", "world_production_cleaned"],
+             outputs=["world_production_with_source"], cpus=POOL),
+
+        # Step 8: Unpivot to long format ('metric' becomes 'type')
+        step("unpivot_tables.py", "Unpivot tables to long format",
+             inputs=["world_production_with_source"], outputs=["world_production_long_format"], cpus=POOL),
+
+        # Step 9: Commodity names and units of the table pages (from the page index)
+        step("extract_commodity_names.py", "Extract commodity names from PDF pages",
+             inputs=["page_index"], outputs=["commodity_names_with_units.csv"]),
+
+        # Step 10: Combine all files and join commodity/units by page
+        step("append_append_append_all.py", "Combine all CSV files and add commodity and units",
+             inputs=["world_production_long_format", "commodity_names_with_units.csv"],
+             outputs=["mcs1996_all_world_production_usgs.csv", "validation_report.csv"], cpus=POOL,
+             memory_mb=1000),
+
+        # Step 11: Pivot years into columns
+        step("parsing_yearly_prod_data.py", "Pivot year data into separate columns",
+             inputs=["mcs1996_all_world_production_usgs.csv"],
+             outputs=["mcs1996_all_world_production_usgs_cleaned.csv"], memory_mb=1500),
+
+        # Step 12: Clean the data
+        step("post_merge_cleaning_script.py", "Clean country, type, and PROD columns",
+             inputs=["mcs1996_all_world_production_usgs_cleaned.csv", "country_gazetteer.csv"],
+             outputs=["combined_world_production_cleaned.csv", "world_production.db", "country_review.csv",
+                      "units_mapping.csv", "cleaning_rules_report.csv", "world_production_parquet",
+                      "validation_report.csv"], memory_mb=1500),
+
+        # Step 13: World shares, growth and ranks (only commodities whose rows changed)
+        step("aggregate_production.py", "Materialize world share, growth and rank aggregates",
+             inputs=["combined_world_production_cleaned.csv"], outputs=["aggregates"], memory_mb=1000),
     ]
-    
-    # Run each step
-    failed_steps = []
-    
-    for script, description in steps:
-        success = run_script(script, description)
-        if not success:
-            failed_steps.append((script, description))
-            print(f"\n⚠ WARNING: {script} failed. Continuing with remaining steps...")
-    
+
+    # Batch mode: all pages cleaned together in one frame (same output files)
+    if os.environ.get("PIPELINE_MODE") == "batch":
+        per_page_scripts = {current['script'] for current in steps[2:9]}
+        batch = step("batch_cleaning.py", "Clean, fill, merge headers and unpivot all pages in one batch",
+                     inputs=["world_production"], outputs=["world_production_long_format", "validation_report.csv"],
+                     memory_mb=2000)
+        steps = steps[:2] + [batch] + [current for current in steps[2:] if current['script'] not in per_page_scripts]
+
+    # Run the graph
+    timings, failed_steps, skipped_steps = run_graph(steps)
+    descriptions = {current['script']: current['description'] for current in steps}
+
     # Final summary
     print("\n" + "="*80)
     print("PIPELINE COMPLETE")
     print("="*80)
-    
+
+    print_timing_report(steps, timings)
+
     if not failed_steps:
         print("\n✓ All steps completed successfully!")
         print("\nFinal output file: combined_world_production_cleaned.csv")
+        print("Query store: world_production.db")
+        print("Data-quality issues: validation_report.csv")
+        print("Aggregates: aggregates/")
     else:
         print(f"\n⚠ {len(failed_steps)} step(s) failed:")
-        for script, description in failed_steps:
-            print(f"  - {description} ({script})")
-    
+        for script in failed_steps:
+            print(f"  - {descriptions[script]} ({script})")
+        if skipped_steps:
+            print(f"\n{len(skipped_steps)} step(s) skipped because a step they depend on failed:")
+            for script in skipped_steps:
+                print(f"  - {descriptions[script]} ({script})")
+
     print("\n" + "="*80)
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Merge Editions Into One Time Series
+Combines the cleaned outputs of several Mineral Commodity Summaries editions
+(each a combined_world_production_cleaned.csv, copied into editions/) into
+one long time series keyed by (commodity, country, type, year)
+
+Consecutive editions overlap and revise each other, so each key keeps one
+value by precedence:
+    final_first: a final value beats an estimate ('e' flag), then newest edition
+    newest:      newest edition wins, estimate or not
+All values are sorted once by key and precedence and the winner is the last
+row of its key (duplicated(keep='last'), a hash on the key) - no per-key scans
+
+Editions may report a commodity in different units (thousand metric tons,
+then metric tons): a revision is the chosen value converted to the row's
+units (units_normalization.py) minus the row's value, and is left empty
+when the two units don't convert into each other
+
+Writes:
+    world_production_timeseries.csv    one row per key, with the winning edition
+    world_production_revisions.csv     every value of keys reported more than once,
+                                       with chosen, chosen_units and revision
+    world_production_unit_changes.csv  the revisions rows whose units differ from
+                                       the chosen value's units
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+from csv_io import read_csv, to_csv
+from production_store import to_long
+from units_normalization import units_mapping
+
+# Configuration
+editions_folder = "editions"
+output_file = "world_production_timeseries.csv"
+revisions_file = "world_production_revisions.csv"
+unit_changes_file = "world_production_unit_changes.csv"
+precedence = "final_first"  # or "newest"
+
+KEY = ['commodity', 'country', 'type', 'year']
+SERIES_COLUMNS = KEY + ['units', 'value', 'flags', 'source', 'page', 'source_row']
+
+
+def edition_year(source):
+    """Publication year of an edition name like 'mcs1996' (Series in, Series out)"""
+    return pd.to_numeric(source.str.extract(r'(\d{4})', expand=False), errors='coerce')
+
+
+def read_editions(paths):
+    """Long rows (production_store.to_long) of every cleaned edition file"""
+    frames = []
+    for path in paths:
+        df = read_csv(path)
+        frames.append(to_long(df))
+        print(f"  {Path(path).name}: {len(df):,} rows, editions {sorted(df['source'].astype(str).unique())}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def merge_editions(long_df, rule=precedence):
+    """One value per KEY by the precedence rule; returns (series, revisions)"""
+    if rule not in ("final_first", "newest"):
+        raise ValueError(f"Unknown precedence rule: {rule}")
+
+    rows = long_df.assign(
+        edition_year=edition_year(long_df['source']),
+        is_final=~long_df['flags'].str.contains('e', regex=False),
+    )
+
+    # Ascending precedence, so the winner of each key is its last row. Within
+    # one edition the first table row wins (page/source_row descending)
+    order = (['is_final'] if rule == "final_first" else []) + ['edition_year', 'source']
+    rows = rows.sort_values(KEY + order + ['page', 'source_row'],
+                            ascending=[True] * (len(KEY) + len(order)) + [False, False],
+                            kind='stable', ignore_index=True)
+    chosen = ~rows.duplicated(KEY, keep='last')
+    series = rows.loc[chosen, SERIES_COLUMNS].reset_index(drop=True)
+
+    # Side table: every value of a key that more than one row reported
+    revised = rows.duplicated(KEY, keep=False)
+    revisions = rows.loc[revised, SERIES_COLUMNS].assign(chosen=chosen[revised])
+    mapping = units_mapping(revisions['units']).set_index('units')
+    revisions['canonical_units'] = revisions['units'].map(mapping['canonical_units'])
+    revisions['units_multiplier'] = revisions['units'].map(mapping['units_multiplier'])
+    winner = (revisions.loc[revisions['chosen'], KEY + ['value', 'units', 'canonical_units', 'units_multiplier']]
+              .rename(columns=lambda col: col if col in KEY else 'chosen_' + col))
+    revisions = revisions.merge(winner, on=KEY, how='left', validate='many_to_one')
+
+    # Same units: plain difference. Other units: the chosen value in this row's
+    # units, when both parse to the same canonical unit (else no revision)
+    same_units = revisions['units'] == revisions['chosen_units']
+    converted = revisions['chosen_value'] * revisions['chosen_units_multiplier'] / revisions['units_multiplier']
+    convertible = revisions['canonical_units'] == revisions['chosen_canonical_units']
+    revisions['revision'] = (revisions['chosen_value'] - revisions['value']).where(
+        same_units, (converted - revisions['value']).where(convertible))
+    revisions = revisions[SERIES_COLUMNS + ['chosen', 'chosen_units', 'revision']]
+
+    return series, revisions
+
+
+def main():
+    paths = sorted(Path(editions_folder).glob("*.csv"))
+    if not paths:
+        print(f"✗ No cleaned edition files in {editions_folder}/")
+        print(f"  Copy each edition's combined_world_production_cleaned.csv there (one file per edition)")
+        return
+
+    print(f"Merging {len(paths)} edition file(s) from {editions_folder}/ (precedence: {precedence})...\n")
+    long_df = read_editions(paths)
+
+    series, revisions = merge_editions(long_df)
+
+    to_csv(series, output_file)
+    to_csv(revisions, revisions_file)
+    unit_changes = revisions[revisions['units'] != revisions['chosen_units']]
+    to_csv(unit_changes, unit_changes_file)
+
+    revised_keys = revisions[KEY].drop_duplicates()
+    changed = revisions[~revisions['chosen'] & (revisions['revision'] != 0) & revisions['revision'].notna()]
+
+    print(f"\n{'='*60}")
+    print(f"✓ Saved time series: {output_file} ({len(series):,} values from {len(long_df):,})")
+    print(f"✓ Saved revisions: {revisions_file}")
+    print(f"Keys reported more than once: {len(revised_keys):,}")
+    print(f"Superseded values that differ from the chosen one: {len(changed):,}")
+    print(f"Values in other units than the chosen one: {len(unit_changes):,} "
+          f"({unit_changes['revision'].isna().sum():,} not convertible, see {unit_changes_file})")
+    print(f"Values per edition: " +
+          ", ".join(f"{source} {count:,}" for source, count in series['source'].value_counts().sort_index().items()))
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
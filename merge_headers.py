@@ -8,38 +8,18 @@ First position stays empty
 import pandas as pd
 from pathlib import Path
 
+from csv_io import read_csv, to_csv
+from parallel_executor import exit_on_errors, run_per_file, print_summary
+
 # Configuration
 input_folder = "world_production_forward_filled"
 output_folder = "world_production_merged_headers"
 
-# Create output folder
-Path(output_folder).mkdir(exist_ok=True)
-
-print(f"Merging header rows in {input_folder}/...\n")
-
-# Process each CSV file
-csv_files = list(Path(input_folder).glob("*.csv"))
 
-for csv_file in csv_files:
-    print(f"Processing: {csv_file.name}")
-    
-    # Read CSV without headers
-    df = pd.read_csv(csv_file, header=None)
-    
-    if len(df) < 2:
-        print(f"  ⚠ File has less than 2 rows, skipping")
-        continue
-    
-    # Get first two rows
-    row1 = df.iloc[0]
-    row2 = df.iloc[1]
-    
-    print(f"  Row 1: {row1.tolist()}")
-    print(f"  Row 2: {row2.tolist()}")
-    
-    # Merge rows
+def merge_header_rows(row1, row2):
+    """Return row1 and row2 merged cell by cell with an underscore"""
     merged_row = []
-    
+
     for i in range(len(row1)):
         # Keep first position empty
         if i == 0:
@@ -48,11 +28,11 @@ for csv_file in csv_files:
             # Get values from both rows
             val1 = row1.iloc[i] if pd.notna(row1.iloc[i]) else ''
             val2 = row2.iloc[i] if i < len(row2) and pd.notna(row2.iloc[i]) else ''
-            
+
             # Convert to strings and strip whitespace
             val1 = str(val1).strip()
             val2 = str(val2).strip()
-            
+
             # Combine with underscore
             if val1 and val2:
                 merged_row.append(f"{val1}_{val2}")
@@ -62,22 +42,62 @@ for csv_file in csv_files:
                 merged_row.append(val2)
             else:
                 merged_row.append('')
-    
-    print(f"  Merged: {merged_row}")
-    
+
+    return merged_row
+
+
+def merge_table(df):
+    """Replace row 1 with the merged header and drop row 2; returns (df, merged_row)"""
+    # Object columns so text can go into columns pandas read as numbers
+    df = df.astype(object)
+
+    # Get first two rows
+    row1 = df.iloc[0]
+    row2 = df.iloc[1]
+
+    merged_row = merge_header_rows(row1, row2)
+
     # Replace row 1 with merged row and drop row 2
     df.iloc[0] = merged_row
     df = df.drop(1).reset_index(drop=True)
-    
-    print(f"  New shape: {df.shape}")
-    
+
+    return df, merged_row
+
+
+def process_file(csv_file, output_folder=output_folder):
+    """Merge the header rows of one page CSV; returns (status, detail) for the summary"""
+    # Read CSV without headers
+    df = read_csv(csv_file, header=None)
+
+    if len(df) < 2:
+        return 'skipped', "File has less than 2 rows"
+
+    df, merged_row = merge_table(df)
+
     # Save
-    output_file = Path(output_folder) / csv_file.name
-    df.to_csv(output_file, index=False, header=False)
-    
-    print(f"  ✓ Saved\n")
-
-print(f"{'='*60}")
-print(f"Done! Processed {len(csv_files)} files")
-print(f"Output: {output_folder}/")
-print(f"{'='*60}")
+    output_file = Path(output_folder) / Path(csv_file).name
+    to_csv(df, output_file, header=False)
+
+    return 'ok', f"Merged: {merged_row}, new shape: {df.shape}"
+
+
+def main():
+    # Create output folder
+    Path(output_folder).mkdir(exist_ok=True)
+
+    print(f"Merging header rows in {input_folder}/...\n")
+
+    # Process each CSV file
+    csv_files = list(Path(input_folder).glob("*.csv"))
+
+    results = run_per_file(process_file, csv_files, output_folder=output_folder)
+    counts = print_summary(results)
+    exit_on_errors(counts)
+
+    print(f"Done! Processed {len(csv_files)} files")
+    print(f"Output: {output_folder}/")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
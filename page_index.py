@@ -0,0 +1,291 @@
+"""
+Page Index
+Reads an edition's PDF once and indexes its pages, so page ranges and
+commodity lookups are index reads instead of text heuristics over every page:
+    page      -> commodity, units, has_world_table
+    commodity -> pages
+
+Commodities come from the PDF outline where there is one: a bookmark covers
+its page up to the next bookmark's, and is a commodity when one of those
+pages has a "(Data in ...)" units line. Without an outline, each odd page's
+header band is searched for a mostly-uppercase title (the even page before
+it, which holds the units line, shares its commodity). has_world_table marks
+pages whose text has a 'World total' row.
+
+page_index/<pdf name>/
+    meta.json    source PDF size/mtime (stale indexes are rebuilt), where commodities came from
+    pages.csv    page, commodity, units, has_world_table
+    terms.csv    inverted index of the header band text: term, pages
+
+Usage:
+    index = PageIndex.open_or_build("raw_data/mcs1996.pdf")
+    index.pages_for("COPPER")    -> [54, 55]
+    index.page(55)               -> {'commodity': 'COPPER', 'units': ..., 'has_world_table': True}
+    index.table_pages()          -> pages to extract tables from
+    index.search("data in")      -> pages whose header band has every word
+"""
+
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from csv_io import read_csv, to_csv
+from header_text import HeaderText
+from layout_cache import cache_dir_for, pdf_fingerprint
+
+# Configuration
+pdf_path = "raw_data/mcs1996.pdf"
+index_root = "page_index"
+INDEX_VERSION = 1
+
+# Look for pattern: "(Data in ... )" - Pattern 1: (Data in ...)
+# Pattern 2: sometimes it's split across lines or has extra text, "Data in" without parentheses
+UNITS_PATTERNS = [
+    re.compile(r'\(Data in ([^)]+)\)', re.IGNORECASE),
+    re.compile(r'Data in (.+?)(?:\.|$)', re.IGNORECASE),
+]
+UNLESS_PATTERN = re.compile(r'\bunless\b', re.IGNORECASE)
+SKIP_HEADERS = ['U.S. Geological Survey', 'MINERAL COMMODITY', 'SUMMARIES']
+WORLD_TABLE_PATTERN = re.compile(r'\bworld\s+total\b', re.IGNORECASE)
+TERM_PATTERN = re.compile(r'[a-z0-9]+')
+
+PAGE_COLUMNS = ['page', 'commodity', 'units', 'has_world_table']
+
+
+def find_units(lines):
+    """Units phrase from the first 15 lines, or None"""
+    for line in lines[:15]:
+        units = None
+        for pattern in UNITS_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                units = match.group(1).strip()
+                break
+
+        if units:
+            # Clean up: remove anything after "unless" or comma
+            units = UNLESS_PATTERN.split(units)[0].strip()
+            units = units.split(',')[0].strip()
+            units = units.rstrip('.')
+            return units
+    return None
+
+
+def find_commodity_name(lines):
+    """First mostly-uppercase line in the first 10 lines, or None"""
+    for line in lines[:10]:
+        line = line.strip()
+        if not line or len(line) < 3:
+            continue
+
+        # Check if line is mostly uppercase
+        upper_count = sum(1 for c in line if c.isupper())
+        letter_count = sum(1 for c in line if c.isalpha())
+
+        if letter_count > 0 and upper_count / letter_count > 0.7:
+            # Skip common headers
+            if not any(skip in line for skip in SKIP_HEADERS):
+                return line
+    return None
+
+
+def search_page(header, page_num, find):
+    """Run find on the page's header band, then on its full text; returns (result, lines)"""
+    lines = header.band_lines(page_num)
+    result = find(lines) if lines else None
+    if result is None:
+        lines = header.full_lines(page_num)
+        result = find(lines) if lines else None
+    return result, lines
+
+
+def commodity_key(name):
+    """A commodity name as lookups compare it: letters, spaces and parentheses, upper case"""
+    name = re.sub(r'[^a-zA-Z\s()]', '', str(name))
+    return re.sub(r'\s+', ' ', name).strip().upper()
+
+
+def terms(lines):
+    return set(TERM_PATTERN.findall(' '.join(lines).lower()))
+
+
+def outline_commodities(outline, units, world_tables, page_count):
+    """page -> commodity from bookmarks: each covers its page up to the next bookmark's,
+    trimmed after its last page with a units line or world table (so the last
+    bookmark doesn't take in the appendixes)"""
+    # One bookmark per page (the last, i.e. the most specific, when sections nest)
+    starts = dict((page, title) for title, page in outline)
+    pages = sorted(starts)
+    commodities = {}
+    for start, end in zip(pages, pages[1:] + [page_count + 1]):
+        marked = [page for page in range(start, end) if page in units or page in world_tables]
+        if any(page in units for page in marked):
+            commodities.update(dict.fromkeys(range(start, marked[-1] + 1), starts[start]))
+    return commodities
+
+
+def header_commodities(header, pages, units):
+    """page -> commodity from the odd pages' header titles (the even page before shares it)"""
+    commodities = {}
+    for page_num in pages:
+        if page_num % 2 == 1:
+            commodity_name, _ = search_page(header, page_num, find_commodity_name)
+            if commodity_name:
+                commodities[page_num] = commodity_name
+                if page_num - 1 in units:
+                    commodities[page_num - 1] = commodity_name
+    return commodities
+
+
+def build_index(pdf_path, root=index_root):
+    """Read every page of the PDF once and write the index; returns the index directory"""
+    index_dir = cache_dir_for(pdf_path, root)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    # meta.json is written last: without it open_existing never sees a half-built index
+    (index_dir / 'meta.json').unlink(missing_ok=True)
+
+    with HeaderText(pdf_path) as header:
+        pages = range(1, header.page_count() + 1)
+        units, world_tables, page_terms = {}, set(), {}
+        for page_num in pages:
+            lines = header.band_lines(page_num)
+            page_terms[page_num] = terms(lines)
+            found = find_units(lines) if lines else None
+            # The units line is on the even page of a spread: only there is the full text searched too
+            if found is None and page_num % 2 == 0:
+                found, _ = search_page(header, page_num, find_units)
+            if found:
+                units[page_num] = found
+            if WORLD_TABLE_PATTERN.search(' '.join(header.text_lines(page_num))):
+                world_tables.add(page_num)
+
+        outline = header.outline()
+        commodities = outline_commodities(outline, units, world_tables, len(pages)) if outline else {}
+        source = 'outline' if commodities else 'header'
+        if not commodities:
+            commodities = header_commodities(header, pages, units)
+
+    # A commodity page without its own units line takes the units of the page before (else after) it
+    rows = []
+    for page_num in pages:
+        commodity = commodities.get(page_num, '')
+        page_units = ''
+        if commodity:
+            page_units = units.get(page_num) or units.get(page_num - 1) or units.get(page_num + 1, '')
+        rows.append((page_num, commodity, page_units, page_num in world_tables))
+    to_csv(pd.DataFrame(rows, columns=PAGE_COLUMNS), index_dir / 'pages.csv')
+
+    inverted = {}
+    for page_num, words in page_terms.items():
+        for term in words:
+            inverted.setdefault(term, []).append(page_num)
+    to_csv(pd.DataFrame({'term': sorted(inverted),
+                         'pages': [' '.join(map(str, inverted[term])) for term in sorted(inverted)]}),
+           index_dir / 'terms.csv')
+
+    meta = {'version': INDEX_VERSION, 'pdf': str(pdf_path), **pdf_fingerprint(pdf_path),
+            'page_count': len(pages), 'commodities_from': source}
+    (index_dir / 'meta.json').write_text(json.dumps(meta))
+    return index_dir
+
+
+class PageIndex:
+    """Loaded index: dict lookups by page, commodity and header term"""
+
+    def __init__(self, index_dir):
+        index_dir = Path(index_dir)
+        self.meta = json.loads((index_dir / 'meta.json').read_text())
+        self.pages = read_csv(index_dir / 'pages.csv', keep_default_na=False,
+                                 dtype={'commodity': str, 'units': str})
+        self.by_page = {row.page: {'commodity': row.commodity, 'units': row.units,
+                                   'has_world_table': bool(row.has_world_table)}
+                        for row in self.pages.itertuples(index=False)}
+        self.by_commodity = {}
+        for row in self.pages[self.pages['commodity'] != ''].itertuples(index=False):
+            self.by_commodity.setdefault(commodity_key(row.commodity), []).append(row.page)
+        terms_df = read_csv(index_dir / 'terms.csv', keep_default_na=False, dtype=str)
+        self.terms = {term: [int(page) for page in pages.split()]
+                      for term, pages in zip(terms_df['term'], terms_df['pages'])}
+
+    @classmethod
+    def open_existing(cls, pdf_path, root=index_root):
+        """Open the index if it is there and fresh, else None (never reads the PDF)"""
+        index_dir = cache_dir_for(pdf_path, root)
+        meta_file = index_dir / 'meta.json'
+        if not meta_file.exists():
+            return None
+        meta = json.loads(meta_file.read_text())
+        fresh = (meta.get('version') == INDEX_VERSION and
+                 {k: meta.get(k) for k in ['size', 'mtime_ns']} == pdf_fingerprint(pdf_path))
+        return cls(index_dir) if fresh else None
+
+    @classmethod
+    def open_or_build(cls, pdf_path, root=index_root):
+        """Open the index for pdf_path, (re)building it if missing or stale"""
+        index = cls.open_existing(pdf_path, root)
+        if index is not None:
+            return index
+        print(f"Building page index of {pdf_path}...")
+        return cls(build_index(pdf_path, root))
+
+    def page(self, page_num):
+        """{'commodity', 'units', 'has_world_table'} of a page (None if not in the PDF)"""
+        return self.by_page.get(page_num)
+
+    def pages_for(self, commodity):
+        """Pages of a commodity ([] if the index doesn't know it)"""
+        return self.by_commodity.get(commodity_key(commodity), [])
+
+    def commodity_pages(self):
+        """Sorted pages that belong to a commodity"""
+        return sorted(page for pages in self.by_commodity.values() for page in pages)
+
+    def page_range(self):
+        """(first, last) commodity page, or None when no commodity was found"""
+        pages = self.commodity_pages()
+        return (pages[0], pages[-1]) if pages else None
+
+    def table_pages(self, commodity=None):
+        """Pages to extract world production tables from (all commodities for None)
+
+        The pages with a 'World total' row; when the PDF text shows none (no
+        text layer), the odd commodity pages
+        """
+        pages = self.pages_for(commodity) if commodity is not None else self.commodity_pages()
+        if any(info['has_world_table'] for info in self.by_page.values()):
+            return [page for page in pages if self.by_page[page]['has_world_table']]
+        return [page for page in pages if page % 2 == 1]
+
+    def search(self, text):
+        """Sorted pages whose header band has every word of text"""
+        found = None
+        for term in terms([text]):
+            pages = set(self.terms.get(term, []))
+            found = pages if found is None else found & pages
+        return sorted(found or [])
+
+    def commodity_mapping(self):
+        """page_number/commodity_name/units of the odd commodity pages
+        (commodity_names_with_units.csv, joined onto the tables by page)"""
+        rows = self.pages[(self.pages['commodity'] != '') & (self.pages['page'] % 2 == 1)]
+        return pd.DataFrame({'page_number': rows['page'], 'commodity_name': rows['commodity'],
+                             'units': rows['units']}).reset_index(drop=True)
+
+
+def main():
+    print(f"Indexing pages of {pdf_path}...\n")
+    index = PageIndex.open_or_build(pdf_path)
+
+    print(f"\n{'='*60}")
+    print(f"✓ Page index: {cache_dir_for(pdf_path, index_root)}/ "
+          f"({index.meta['page_count']} pages, commodities from the {index.meta['commodities_from']})")
+    print(f"Commodities: {len(index.by_commodity)}, commodity pages: {index.page_range()}")
+    print(f"Pages with a world production table: {len(index.table_pages())}")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Page Retry
+Second chance for pages whose extracted table the cleaning steps would drop:
+no years row (cleaning_script.py) or, on odd pages, no years row after an
+empty first cell or no 'World total' row after it (cleaning_odd_pages.py)
+
+Every setting in RETRY_SETTINGS - pdfplumber tolerances, camelot stream
+edge_tol/row_tol, camelot lattice, the lower part of the page only - is
+tried on every failed page across the process pool, and each page keeps the
+first setting (in RETRY_SETTINGS order) whose table passes those checks
+
+The winning settings are stored per page in page_retry_params.csv with the
+page's char and edge counts, and extract_world_prod.py tries a page's stored
+settings before the backends on later runs (while its layout is unchanged)
+
+Usage:
+    reason = check_table(df, page_num)                    -> None if the table passes
+    fixed, tried = retry_pages(pdf_path, failed_pages)    -> {page: (candidate, settings)}, {page: [outcomes]}
+"""
+
+import contextlib
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+
+import cleaning_odd_pages
+import cleaning_script
+from csv_io import read_csv, to_csv
+from layout_cache import LayoutCache
+from parallel_executor import run_largest_first
+from table_backends import settings_label, table_with_settings, tidy_table
+
+# Configuration
+params_file = "page_retry_params.csv"  # winning settings per page, reused by later runs
+
+# In the order they are preferred; area = (top, bottom) fractions of the page height
+RETRY_SETTINGS = [
+    {'backend': 'pdfplumber', 'text_x_tolerance': 1, 'text_y_tolerance': 1},
+    {'backend': 'pdfplumber', 'min_words_vertical': 2},
+    {'backend': 'pdfplumber', 'area': (0.33, 1.0)},
+    {'backend': 'camelot_stream', 'edge_tol': 500},
+    {'backend': 'camelot_stream', 'row_tol': 10},
+    {'backend': 'camelot_stream', 'edge_tol': 500, 'row_tol': 10},
+    {'backend': 'camelot_stream', 'area': (0.33, 1.0)},
+    {'backend': 'camelot_stream', 'area': (0.5, 1.0), 'row_tol': 10},
+    {'backend': 'camelot_lattice', 'line_scale': 40},
+    {'backend': 'camelot_lattice', 'process_background': True},
+]
+
+PARAMS_COLUMNS = ['pdf', 'page', 'chars', 'edges', 'settings']
+
+_cache = None  # layout cache of the current process (opened once per worker)
+
+
+def _as_pages(df):
+    """df through the CSV text a page file holds, read back as the cleaning steps read it"""
+    return pd.read_csv(io.StringIO(df.to_csv(index=False, header=False)), header=None)
+
+
+def check_table(df, page_num):
+    """Why the cleaning steps would drop this page's table, or None when they keep it"""
+    if df is None or df.empty:
+        return "no table"
+    cleaned, _ = cleaning_script.clean_table(_as_pages(df))
+    if cleaned is None:
+        return "no years row"
+    if page_num % 2 == 1:
+        _, years_row, world_total_row = cleaning_odd_pages.clean_table(_as_pages(cleaned))
+        if years_row is None:
+            return "no years row with comma pattern"
+        if world_total_row is None:
+            return "no 'World total' row"
+    return None
+
+
+def try_settings(task):
+    """One (pdf, page, RETRY_SETTINGS index) in a worker; returns (page, index, candidate or None, outcome)"""
+    global _cache
+    pdf_path, page_num, i = task
+    if _cache is None:
+        _cache = LayoutCache.open_existing(pdf_path, [page_num])
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            candidate = table_with_settings(pdf_path, page_num, _cache, RETRY_SETTINGS[i])
+    except Exception as e:
+        return page_num, i, None, f"error ({e})"
+    if candidate is None:
+        return page_num, i, None, "no tables"
+
+    candidate['df'] = tidy_table(candidate['df'])
+    reason = check_table(candidate['df'], page_num)
+    if reason:
+        return page_num, i, None, reason
+    return page_num, i, candidate, f"passed, {candidate['df'].shape}"
+
+
+def crashed_settings(task):
+    """try_settings()'s result for a (pdf, page, index) that kept crashing its worker process"""
+    _, page_num, i = task
+    return page_num, i, None, "worker crashed"
+
+
+def retry_pages(pdf_path, pages, workers=None, **recycling):
+    """Try RETRY_SETTINGS on the pages across the pool (recycling: run_largest_first limits)
+
+    Returns ({page: (candidate, settings)} for the pages a setting fixed,
+    {page: ["settings: outcome", ...]} for every page)
+    """
+    tasks = [(pdf_path, page_num, i) for page_num in pages for i in range(len(RETRY_SETTINGS))]
+    # Equal costs: the stable sort keeps page order, and each page's settings in preference order
+    outcomes = run_largest_first(try_settings, tasks, [1] * len(tasks), workers, on_crash=crashed_settings,
+                                 **recycling)
+
+    fixed, tried = {}, {}
+    for page_num, i, candidate, outcome in outcomes:
+        tried.setdefault(page_num, []).append(f"{settings_label(RETRY_SETTINGS[i])}: {outcome}")
+        if candidate is not None and page_num not in fixed:
+            fixed[page_num] = (candidate, RETRY_SETTINGS[i])
+    return fixed, tried
+
+
+def read_params(path=params_file):
+    if not Path(path).exists():
+        return pd.DataFrame(columns=PARAMS_COLUMNS)
+    return read_csv(path, keep_default_na=False, dtype={'pdf': str, 'settings': str})
+
+
+def stored_settings(pdf_path, features, path=params_file):
+    """page -> stored settings, for pages of features (page, chars, edges) whose layout is unchanged"""
+    params = read_params(path)
+    params = params[params['pdf'] == Path(pdf_path).name].merge(features, on=['page', 'chars', 'edges'])
+    return {int(page): json.loads(settings) for page, settings in zip(params['page'], params['settings'])}
+
+
+def store_settings(pdf_path, features, retried, fixed, path=params_file):
+    """Replace the stored settings of the retried pages with this run's winners (none if nothing passed)"""
+    params = read_params(path)
+    kept = params[~(params['pdf'].eq(Path(pdf_path).name) & params['page'].isin(retried))]
+    winners = features[features['page'].isin(fixed)].assign(
+        pdf=Path(pdf_path).name,
+        settings=lambda df: [json.dumps(fixed[page][1]) for page in df['page']],
+    )[PARAMS_COLUMNS]
+    to_csv(pd.concat([kept, winners], ignore_index=True).sort_values(['pdf', 'page']), path)
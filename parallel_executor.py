@@ -0,0 +1,258 @@
+"""
+Parallel Per-File Executor
+Fans a per-file transform out across a process pool and collects the outcomes
+Every page file is independent, so the cleaning steps hand their
+process_file function and file list to run_per_file() instead of looping
+
+The per-file function must be defined at module level (so it can be pickled)
+and return (status, detail) where status is 'ok', 'skipped' or 'warning'
+It may return a third item, a DataFrame of validation issues (validation.py);
+pass issues=[] to run_per_file() to collect them from the workers
+Exceptions are caught in the worker and reported as 'error'; the scripts
+pass print_summary()'s counts to exit_on_errors(), which exits with status 1
+when any file errored
+
+run_largest_first() is for tasks whose cost varies a lot (PDF pages): one
+task per item, dispatched most expensive first. For long runs of leaky
+tasks it can recycle workers: a worker is replaced after max_tasks items or
+once its resident memory passes max_rss_mb (checked after each item, and
+while an item runs: a worker past the ceiling is killed and its item retried
+on a fresh one). Items whose worker crashes are retried the same way, up to
+crash_retries times; after that the item's result is on_crash(item), so one
+item that always kills its worker doesn't end the run
+
+Worker count: PIPELINE_WORKERS environment variable (default: all CPUs)
+Set PIPELINE_WORKERS=1 to run in-process without a pool
+"""
+
+import itertools
+import math
+import os
+import signal
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+# Configuration
+default_workers = int(os.environ.get("PIPELINE_WORKERS", 0)) or os.cpu_count() or 1
+tasks_per_worker = 4  # Chunks per worker: big enough to amortize IPC, small enough to balance
+rss_poll_seconds = 1.0  # how often running workers' memory is checked against max_rss_mb
+crash_retries = 2  # fresh workers an item gets after the one running it died
+
+STATUS_ICONS = {'ok': '✓', 'skipped': '-', 'warning': '⚠', 'error': '✗'}
+
+
+def _run_one(process_file, csv_file, kwargs):
+    """Call process_file and turn any exception into an 'error' outcome"""
+    issues = None
+    try:
+        status, detail, *rest = process_file(csv_file, **kwargs)
+        if rest:
+            issues = rest[0]
+    except Exception as e:
+        status, detail = 'error', f"{type(e).__name__}: {e}"
+    return csv_file, status, detail, issues
+
+
+def run_per_file(process_file, csv_files, workers=None, chunksize=None, issues=None, **kwargs):
+    """Run process_file(csv_file, **kwargs) for every file, return [(file, status, detail)]
+
+    Validation issues returned by process_file are appended to the issues list
+    """
+    csv_files = list(csv_files)
+    workers = min(workers or default_workers, max(len(csv_files), 1))
+    task = partial(_run_one, process_file, kwargs=kwargs)
+
+    if workers == 1:
+        outcomes = [task(csv_file) for csv_file in csv_files]
+    else:
+        # Submit in chunks so each IPC round trip carries several files
+        if chunksize is None:
+            chunksize = max(1, math.ceil(len(csv_files) / (workers * tasks_per_worker)))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(task, csv_files, chunksize=chunksize))
+
+    if issues is not None:
+        issues.extend(outcome[3] for outcome in outcomes if outcome[3] is not None)
+    return [outcome[:3] for outcome in outcomes]
+
+
+def run_largest_first(func, items, costs, workers=None, max_tasks=None, max_rss_mb=None, worker_report=None,
+                      on_crash=None):
+    """Run func(item) for every item across a process pool, return [func(item)] in items order
+
+    Each item is its own task and tasks are queued by descending cost, so
+    free workers always take the most expensive item left: long items start
+    first and the end of the run is spent on short ones (no idle cores
+    waiting on one long straggler)
+
+    With max_tasks or max_rss_mb the workers are recycled (see above), even
+    for a single worker; pass worker_report=[] to collect one row per worker
+    (tasks run, peak RSS, why it ended). on_crash(item) gives the result of an
+    item that crashed a recycled worker crash_retries + 1 times (without it,
+    that raises RuntimeError)
+    """
+    items = list(items)
+    workers = min(workers or default_workers, max(len(items), 1))
+    order = sorted(range(len(items)), key=lambda i: costs[i], reverse=True)
+    if max_tasks or max_rss_mb:
+        return _run_recycled(func, items, order, workers, max_tasks, max_rss_mb,
+                             worker_report if worker_report is not None else [], on_crash)
+    if workers == 1:
+        return [func(item) for item in items]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {i: pool.submit(func, items[i]) for i in order}
+        return [futures[i].result() for i in range(len(items))]
+
+
+def rss_mb(pid='self'):
+    """Resident memory of a process in MB (None without /proc)"""
+    try:
+        resident = int(Path(f"/proc/{pid}/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (ru_maxrss: KB on Linux, bytes on macOS)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_measured(func, item):
+    """func(item) in a worker, with the worker's memory after it: (result, rss MB, peak MB)"""
+    result = func(item)
+    peak = peak_rss_mb()
+    return result, rss_mb() or peak, peak
+
+
+class _Worker:
+    """One recyclable worker process: a single-process pool fed one item at a time"""
+
+    def __init__(self, number):
+        self.number = number
+        self.pool = ProcessPoolExecutor(max_workers=1)
+        self.pid = self.pool.submit(os.getpid).result()
+        self.tasks = 0
+        self.peak_mb = 0.0
+        self.item = None  # index of the item in flight
+        self.future = None
+
+    def submit(self, func, items, i):
+        self.item = i
+        self.future = self.pool.submit(_run_measured, func, items[i])
+
+    def measured(self, *values):
+        self.peak_mb = max([self.peak_mb] + [value for value in values if value is not None])
+
+    def stop(self, ended, kill=False):
+        """Shut the process down (SIGKILL for kill); returns its worker report row"""
+        if kill:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        return {'worker': self.number, 'pid': self.pid, 'tasks': self.tasks,
+                'peak_rss_mb': round(self.peak_mb, 1), 'ended': ended}
+
+
+def _run_recycled(func, items, order, workers, max_tasks, max_rss_mb, worker_report, on_crash=None):
+    """run_largest_first() on workers that are replaced at max_tasks items or max_rss_mb"""
+    pending = deque(order)
+    results, crashes = {}, dict.fromkeys(range(len(items)), 0)
+    numbers = itertools.count(1)
+    slots = [_Worker(next(numbers)) for _ in range(workers)]
+
+    def crashed(i, error):
+        """Requeue item i after its worker died, or give up on it; returns the worker's 'ended'"""
+        crashes[i] += 1
+        if crashes[i] <= crash_retries:
+            pending.appendleft(i)
+            return 'crashed'
+        if on_crash is None:
+            raise RuntimeError(f"{items[i]} crashed {crashes[i]} worker processes") from error
+        results[i] = on_crash(items[i])
+        return f"crashed, gave up on {items[i]}"
+
+    try:
+        while pending or any(worker and worker.future for worker in slots):
+            for worker in slots:
+                if worker and worker.future is None and pending:
+                    worker.submit(func, items, pending.popleft())
+
+            running = [worker.future for worker in slots if worker and worker.future]
+            done, _ = wait(running, timeout=rss_poll_seconds if max_rss_mb else None,
+                           return_when=FIRST_COMPLETED)
+
+            for n, worker in enumerate(slots):
+                if worker is None or worker.future is None:
+                    continue
+                ended, kill = None, False
+                if worker.future in done:
+                    i, future = worker.item, worker.future
+                    worker.future = None
+                    try:
+                        results[i], rss, peak = future.result()
+                    except BrokenProcessPool as e:
+                        ended = crashed(i, e)
+                    else:
+                        worker.tasks += 1
+                        worker.measured(rss, peak)
+                        if max_tasks and worker.tasks >= max_tasks:
+                            ended = 'task limit'
+                        elif max_rss_mb and rss is not None and rss >= max_rss_mb:
+                            ended = 'rss limit'
+                elif max_rss_mb and worker.tasks > 0:
+                    # Mid-item: only a worker that grew over earlier items is killed,
+                    # so a retried item always starts on a fresh worker and finishes
+                    rss = rss_mb(worker.pid)
+                    worker.measured(rss)
+                    if rss is not None and rss >= max_rss_mb:
+                        ended, kill = 'killed at rss limit', True
+                        pending.appendleft(worker.item)
+                        worker.future = None
+
+                if ended:
+                    worker_report.append(worker.stop(ended, kill))
+                    slots[n] = _Worker(next(numbers)) if pending else None
+    finally:
+        for worker in slots:
+            if worker is not None:
+                worker_report.append(worker.stop('done', kill=worker.future is not None))
+
+    return [results[i] for i in range(len(items))]
+
+
+def print_summary(results):
+    """Print one line per file (in file order) followed by status counts"""
+    for csv_file, status, detail in sorted(results, key=lambda r: str(r[0])):
+        name = getattr(csv_file, 'name', csv_file)
+        print(f"{STATUS_ICONS.get(status, '?')} {name}: {detail}")
+
+    counts = {}
+    for _, status, _ in results:
+        counts[status] = counts.get(status, 0) + 1
+
+    print(f"\n{'='*60}")
+    print(f"Files: {len(results)} | " +
+          " | ".join(f"{status}: {counts.get(status, 0)}" for status in STATUS_ICONS))
+
+    return counts
+
+
+def exit_on_errors(counts):
+    """Stop the script (exit status 1) when print_summary() counted any failed file"""
+    if counts.get('error'):
+        print(f"✗ {counts['error']} file(s) failed, stopping")
+        sys.exit(1)
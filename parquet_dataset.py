@@ -0,0 +1,136 @@
+"""
+Partitioned Parquet Dataset
+Writes the cleaned world production data as a Hive-partitioned Parquet
+dataset, one directory per source edition and commodity:
+    world_production_parquet/source=mcs1996/commodity=COPPER/part-0.parquet
+Rows are in long format (one per year, like the query store) and sorted by
+year and country inside each file, so the row-group statistics on year and
+country let readers skip row groups as well as whole partitions
+
+read_dataset() pushes the commodity/country/year filters down to pyarrow:
+pulling one commodity only opens that commodity's files
+
+replace_partitions() rewrites only the partitions of the given rows'
+commodities (update_page.py, after splicing re-extracted pages)
+
+Needs pyarrow (optional: without it the export is skipped with a warning)
+
+Usage:
+    from parquet_dataset import read_dataset
+    df = read_dataset(commodity="COPPER", start_year=1995)
+    df = read_dataset(country=["Chile", "Peru"])
+"""
+
+import shutil
+from pathlib import Path
+from urllib.parse import unquote
+
+from production_store import to_long
+
+# Configuration
+dataset_folder = "world_production_parquet"
+row_group_rows = 10_000  # rows per row group (each has its own min/max statistics)
+
+PARTITION = ['source', 'commodity']
+SORT_KEYS = ['source', 'commodity', 'year', 'country']
+
+
+def _arrow():
+    """pyarrow modules, or None (with a warning) when pyarrow is not installed"""
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        print("⚠ pyarrow not installed, skipping the Parquet dataset")
+        return None
+    return pa, ds
+
+
+def write_partitions(df, root=dataset_folder, part=0):
+    """Add one cleaned wide DataFrame to the dataset as part-<part>-*.parquet files; returns rows written"""
+    pa, ds = _arrow()
+    partitioning = ds.partitioning(pa.schema([(col, pa.string()) for col in PARTITION]), flavor='hive')
+
+    long_df = to_long(df).sort_values(SORT_KEYS, kind='stable', ignore_index=True)
+    ds.write_dataset(
+        pa.Table.from_pandas(long_df, preserve_index=False), root, format='parquet',
+        partitioning=partitioning,
+        basename_template=f"part-{part}-{{i}}.parquet",
+        max_rows_per_group=row_group_rows,
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    return len(long_df)
+
+
+def start_dataset(root=dataset_folder):
+    """Remove the previous dataset before write_partitions(); False if pyarrow is missing"""
+    if _arrow() is None:
+        return False
+    shutil.rmtree(root, ignore_errors=True)
+    return True
+
+
+def write_dataset(chunks, root=dataset_folder):
+    """Rebuild the dataset from cleaned wide DataFrames (one or several chunks); returns rows written"""
+    if not start_dataset(root):
+        return None
+    return sum(write_partitions(df, root, part) for part, df in enumerate(chunks))
+
+
+def partition_dirs(root=dataset_folder):
+    """(source, commodity) -> directory, for every partition in the dataset (names are URI-encoded)"""
+    return {(unquote(folder.parent.name.split('=', 1)[1]), unquote(folder.name.split('=', 1)[1])): folder
+            for folder in Path(root).glob('source=*/commodity=*')}
+
+
+def replace_partitions(df, root=dataset_folder):
+    """Rewrite the partitions of df's (source, commodity) pairs with df's rows; returns rows written
+
+    df must hold every row of those partitions (their old files are removed first)
+    """
+    if _arrow() is None:
+        return None
+    existing = partition_dirs(root)
+    for key in df[PARTITION].astype(str).drop_duplicates().itertuples(index=False, name=None):
+        if key in existing:
+            shutil.rmtree(existing[key])
+    return write_partitions(df, root)
+
+
+def _any_of(field, values):
+    """field == value for one value, field in values for a list"""
+    if isinstance(values, (list, tuple, set)):
+        return field.isin(list(values))
+    return field == values
+
+
+def read_dataset(commodity=None, country=None, start_year=None, end_year=None, source=None,
+                 columns=None, root=dataset_folder):
+    """Rows matching the filters as a DataFrame (each filter takes one value or a list)
+
+    commodity and source select partitions (directories); country and year
+    are checked against row-group statistics before any row is decoded
+    """
+    arrow = _arrow()
+    if arrow is None:
+        raise ImportError("read_dataset() needs pyarrow")
+    pa, ds = arrow
+
+    conditions = []
+    if source is not None:
+        conditions.append(_any_of(ds.field('source'), source))
+    if commodity is not None:
+        conditions.append(_any_of(ds.field('commodity'), commodity))
+    if country is not None:
+        conditions.append(_any_of(ds.field('country'), country))
+    if start_year is not None:
+        conditions.append(ds.field('year') >= start_year)
+    if end_year is not None:
+        conditions.append(ds.field('year') <= end_year)
+
+    predicate = None
+    for condition in conditions:
+        predicate = condition if predicate is None else predicate & condition
+
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    return dataset.to_table(columns=columns, filter=predicate).to_pandas()
@@ -1,77 +1,242 @@
 """
 Pivot Year Columns
 Creates separate PROD_2022, PROD_2023, etc. columns based on year suffix in type
+One output row per source table row: source, page and source_row stay in the
+key so every pivoted row keeps its provenance
+An 'e' on the year (2023e) is data, not a separate column: 2023 and 2023e
+values share PROD_2023 and the 'estimated' column is a per-row bitmask of
+which PROD_ values are estimates (bit i = the i-th PROD_ column, in order)
+
+Set PIPELINE_CHUNKSIZE (rows) to pivot out of core: the input is streamed in
+chunks and split into one spill file per (source, commodity), each partition
+is pivoted on its own, and the sorted partitions are merged into the output
 """
 
+import heapq
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 import re
 
+from csv_io import read_csv, to_csv
+
 # Configuration
 input_file = "mcs1996_all_world_production_usgs.csv"
 output_file = "mcs1996_all_world_production_usgs_cleaned.csv"
-
-print(f"Pivoting year data from {input_file}...\n")
-
-# Read the combined file
-df = pd.read_csv(input_file)
-
-print(f"Original shape: {df.shape}")
-print(f"Columns: {list(df.columns)}\n")
-
-# Extract year from type column
-# Pattern: anything ending with _1990, _1995, _2022, _2023, _2022e, _2023e, etc.
-df['year'] = df['type'].str.extract(r'_((?:19|20)\d{2}e?)$')
-
-# Remove year suffix from type to get the base metric name
-df['type_base'] = df['type'].str.replace(r'_(?:19|20)\d{2}e?$', '', regex=True)
-
-print("Sample data with extracted year:")
-print(df[['source', 'country', 'type', 'type_base', 'year', 'value', 'commodity', 'units']].head(10))
-print()
-
-# Create column name from year (e.g., 2022 -> PROD_2022, 2023e -> PROD_2023e)
-df['year_column'] = 'PROD_' + df['year'].astype(str)
-
-# Remove rows where year extraction failed (no year in type)
-df = df[df['year'].notna()]
-
-print(f"Sample year_column values:")
-print(df[['type', 'year', 'units', 'year_column']].head(10))
-print()
-
-# Pivot the data
-# Group by: source, country, commodity, type_base, units
-# Pivot on: year_column
-# Values: value
-df_pivoted = df.pivot_table(
-    index=['source', 'country', 'commodity', 'type_base', 'units'],
-    columns='year_column',
-    values='value',
-    aggfunc='first'  # In case of duplicates, take first value
-).reset_index()
-
-# Rename type_base back to type
-df_pivoted = df_pivoted.rename(columns={'type_base': 'type'})
-
-# Flatten column names (remove multi-index from pivot)
-df_pivoted.columns.name = None
-
-print(f"Pivoted shape: {df_pivoted.shape}")
-print(f"Columns: {list(df_pivoted.columns)[:10]}...")
-print()
-
-# Save
-df_pivoted.to_csv(output_file, index=False)
-
-print(f"✓ Saved pivoted file: {output_file}")
-print(f"{'='*60}")
-
-# Show preview
-print("\nPreview of pivoted data:")
-print(df_pivoted.head(10))
-
-# Show column info
-print("\nAll columns:")
-for col in df_pivoted.columns:
-    print(f"  {col}")
-print(f"Pivoting year data from {input_file}...\n")
+chunksize = int(os.environ.get("PIPELINE_CHUNKSIZE", "0")) or None  # None = all in memory
+
+# Pivot keys, in sort order (the output is sorted by these like before, with
+# page and source_row last so they only separate rows that used to collapse)
+PIVOT_INDEX = ['source', 'country', 'commodity', 'type_base', 'units', 'page', 'source_row']
+ID_COLUMNS = ['source', 'page', 'source_row', 'country', 'commodity', 'type', 'units']
+PARTITION = ['source', 'commodity']
+ESTIMATE_COLUMN = 'estimated'
+MAX_YEAR_COLUMNS = 63  # bits in the int64 estimate mask
+
+
+def read_combined(path, **kwargs):
+    """Read the combined file with text kept as written (no per-chunk type guessing)"""
+    def typed(df):
+        return df.astype({col: int for col in ['page', 'source_row', ESTIMATE_COLUMN] if col in df.columns})
+
+    reader = read_csv(path, dtype=str, **kwargs)
+    if kwargs.get('chunksize'):
+        return (typed(chunk) for chunk in reader)
+    return typed(reader)
+
+
+def estimate_mask(flags):
+    """Per-row bitmask from a boolean frame with one column per PROD_ column (bit i = column i)"""
+    if flags.shape[1] > MAX_YEAR_COLUMNS:
+        raise ValueError(f"{flags.shape[1]} PROD_ columns, the estimate mask holds {MAX_YEAR_COLUMNS}")
+    weights = np.left_shift(1, np.arange(flags.shape[1], dtype=np.int64))
+    return pd.Series(flags.to_numpy(dtype=np.int64) @ weights, index=flags.index, dtype='int64')
+
+
+def estimate_flags(df, prod_columns=None):
+    """Boolean frame (rows x PROD_ columns): which values the 'estimated' mask marks as estimates"""
+    if prod_columns is None:
+        prod_columns = [col for col in df.columns if col.startswith('PROD_')]
+    if ESTIMATE_COLUMN not in df.columns:
+        return pd.DataFrame(False, index=df.index, columns=prod_columns)
+    mask = pd.to_numeric(df[ESTIMATE_COLUMN]).fillna(0).to_numpy(dtype=np.int64)
+    bits = np.right_shift(mask[:, np.newaxis], np.arange(len(prod_columns), dtype=np.int64)) & 1
+    return pd.DataFrame(bits.astype(bool), index=df.index, columns=prod_columns)
+
+
+def with_prod_columns(df, prod_columns):
+    """df with exactly these PROD_ columns (appended, missing ones empty) and its mask rebuilt for them"""
+    flags = estimate_flags(df).reindex(columns=prod_columns, fill_value=False)
+    df = df.reindex(columns=[col for col in df.columns if not col.startswith('PROD_')] + list(prod_columns))
+    df[ESTIMATE_COLUMN] = estimate_mask(flags)
+    return df
+
+
+def add_year_columns(df):
+    """Split type into type_base, year and estimate, and name the target column PROD_<year>"""
+    # Extract year from type column
+    # Pattern: anything ending with _1990, _1995, _2022, _2023, _2022e, _2023e, etc.
+    parts = df['type'].str.extract(r'_((?:19|20)\d{2})(e?)$')
+    df['year'] = parts[0]
+    df['estimate'] = parts[1] == 'e'
+
+    # Remove year suffix from type to get the base metric name
+    df['type_base'] = df['type'].str.replace(r'_(?:19|20)\d{2}e?$', '', regex=True)
+
+    # Create column name from year (e.g., 2022 -> PROD_2022, 2023e -> PROD_2023 with estimate set)
+    df['year_column'] = 'PROD_' + df['year'].astype(str)
+    return df
+
+
+def pivot_years(df):
+    """Pivot rows with a year (after add_year_columns) into one PROD_<year> column per year"""
+    # Remove rows where year extraction failed (no year in type)
+    df = df[df['year'].notna()]
+
+    # Pivot the data
+    # Group by: source, country, commodity, type_base, units, page, source_row
+    # Pivot on: year_column
+    # Values: value
+    df_pivoted = df.pivot_table(
+        index=PIVOT_INDEX,
+        columns='year_column',
+        values='value',
+        aggfunc='first'  # In case of duplicates, take first value
+    )
+
+    # Estimate flag of the value 'first' picked: the first non-empty one per cell
+    cells = df[df['value'].notna()].drop_duplicates(PIVOT_INDEX + ['year_column'])
+    flags = cells.pivot(index=PIVOT_INDEX, columns='year_column', values='estimate')
+    flags = flags.reindex(index=df_pivoted.index, columns=df_pivoted.columns).fillna(False).astype(bool)
+    df_pivoted[ESTIMATE_COLUMN] = estimate_mask(flags)
+    df_pivoted = df_pivoted.reset_index()
+
+    # unstack doesn't keep the rows sorted once there are this many keys; sort
+    # explicitly so a pivot of a few pages can be spliced into the full output
+    df_pivoted = df_pivoted.sort_values(PIVOT_INDEX, ignore_index=True)
+
+    # Rename type_base back to type
+    df_pivoted = df_pivoted.rename(columns={'type_base': 'type'})
+
+    # Flatten column names (remove multi-index from pivot)
+    df_pivoted.columns.name = None
+
+    # Provenance columns first, then the estimate mask
+    prod_columns = [col for col in df_pivoted.columns if col.startswith('PROD_')]
+    return df_pivoted[ID_COLUMNS + [ESTIMATE_COLUMN] + prod_columns]
+
+
+def partition_rows(input_file, spill_dir, chunksize):
+    """Stream the combined file into one CSV per (source, commodity); returns the spill files"""
+    files = {}
+    for chunk in read_combined(input_file, chunksize=chunksize):
+        for key, rows in chunk.groupby(PARTITION, dropna=False, sort=False):
+            if key not in files:
+                files[key] = Path(spill_dir) / f"partition_{len(files)}.csv"
+                to_csv(rows, files[key])
+            else:
+                to_csv(rows, files[key], header=False, mode='a')
+    return list(files.values())
+
+
+def _sorted_rows(pivot_file, columns, chunksize):
+    """Stream a pivoted partition as (sort key, values in output column order) pairs"""
+    sort_columns = [col if col != 'type_base' else 'type' for col in PIVOT_INDEX]
+    prod_columns = [col for col in columns if col.startswith('PROD_')]
+    for chunk in read_combined(pivot_file, chunksize=chunksize):
+        # The partition's estimate bits are for its own PROD_ columns
+        chunk = with_prod_columns(chunk, prod_columns)[columns]
+        keys = zip(*(chunk[col].tolist() for col in sort_columns))
+        yield from zip(keys, chunk.itertuples(index=False, name=None))
+
+
+def pivot_chunked(input_file, output_file, chunksize):
+    """pivot_years on the whole file with one (source, commodity) partition in memory at a time"""
+    with tempfile.TemporaryDirectory(prefix="pivot_spill_", dir=".") as spill_dir:
+        partitions = partition_rows(input_file, spill_dir, chunksize)
+        print(f"Split into {len(partitions)} (source, commodity) partitions")
+
+        # Pivot each partition; the output columns are the union of theirs
+        pivot_files, prod_columns = [], set()
+        for i, partition_file in enumerate(partitions):
+            rows = add_year_columns(read_combined(partition_file))
+            if rows['year'].isna().all():
+                continue
+            pivoted = pivot_years(rows)
+            pivot_file = Path(spill_dir) / f"pivoted_{i}.csv"
+            to_csv(pivoted, pivot_file)
+            pivot_files.append(pivot_file)
+            prod_columns.update(col for col in pivoted.columns if col.startswith('PROD_'))
+
+        # Each partition is sorted by PIVOT_INDEX, so a k-way merge gives the full sort
+        columns = ID_COLUMNS + [ESTIMATE_COLUMN] + sorted(prod_columns)
+        # (every partition holds a read buffer, so they share one chunk's worth of rows)
+        buffer_rows = max(1, chunksize // max(1, len(pivot_files)))
+        merged = heapq.merge(*(_sorted_rows(f, columns, buffer_rows) for f in pivot_files),
+                             key=lambda row: row[0])
+
+        # Write the merged rows chunksize at a time
+        rows_written = 0
+        to_csv(pd.DataFrame(columns=columns), output_file)
+        for batch in iter(lambda: [values for _, values in itertools.islice(merged, chunksize)], []):
+            to_csv(pd.DataFrame(batch, columns=columns), output_file, header=False, mode='a')
+            rows_written += len(batch)
+
+    return rows_written, columns
+
+
+def main():
+    if chunksize:
+        print(f"Pivoting year data from {input_file} in chunks of {chunksize:,} rows...\n")
+        rows, columns = pivot_chunked(input_file, output_file, chunksize)
+        print(f"Pivoted shape: ({rows}, {len(columns)})")
+        print(f"✓ Saved pivoted file: {output_file}")
+        print(f"{'='*60}")
+        return
+
+    print(f"Pivoting year data from {input_file}...\n")
+
+    # Read the combined file
+    df = read_combined(input_file)
+
+    print(f"Original shape: {df.shape}")
+    print(f"Columns: {list(df.columns)}\n")
+
+    df = add_year_columns(df)
+
+    print("Sample data with extracted year:")
+    print(df[['source', 'country', 'type', 'type_base', 'year', 'value', 'commodity', 'units']].head(10))
+    print()
+
+    print(f"Sample year_column values:")
+    print(df[df['year'].notna()][['type', 'year', 'estimate', 'units', 'year_column']].head(10))
+    print()
+
+    df_pivoted = pivot_years(df)
+
+    print(f"Pivoted shape: {df_pivoted.shape}")
+    print(f"Columns: {list(df_pivoted.columns)[:10]}...")
+    print()
+
+    # Save
+    to_csv(df_pivoted, output_file)
+
+    print(f"✓ Saved pivoted file: {output_file}")
+    print(f"{'='*60}")
+
+    # Show preview
+    print("\nPreview of pivoted data:")
+    print(df_pivoted.head(10))
+
+    # Show column info
+    print("\nAll columns:")
+    for col in df_pivoted.columns:
+        print(f"  {col}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ Clean Data - Country, Units, Type, and PROD Columns
    - Replacing 'w' or 'W' with 'World total'
    - Cleaning up 'W World total' to just 'World total'
    - Keeping only letters and spaces (removes malformed characters)
+1.5. Canonicalizes 'country' against country_gazetteer.csv (aliases + fuzzy
+   matching for OCR variants), unresolved names go to country_review.csv
 2. Cleans 'units' column by:
    - Removing ' of ' and everything after it
    - Removing trailing numbers
@@ -22,191 +24,332 @@ Clean Data - Country, Units, Type, and PROD Columns
 3.5. Cleans 'commodity' column by:
    - Keeping only letters, spaces, and parentheses (removes malformed characters)
    - Removing extra whitespace
+Steps 1-3.5 are the declared rules in column_rules.py, run on each column's
+distinct values; per-rule hits and timings go to cleaning_rules_report.csv
 4. Converts all PROD_ columns from strings to numeric (int/float)
 Handles common issues like commas, spaces, 'e' suffix, and non-numeric values
+4.5. Normalizes units: canonical_units, units_multiplier and NORM_<year>
+   (PROD_<year> in the canonical unit) columns next to the originals
+   (units_normalization.py, the parsed strings go to units_mapping.csv)
+5. Writes the cleaned data into the SQLite query store (production_store.py)
+   With PIPELINE_PARQUET=1, also the Hive-partitioned Parquet dataset
+   world_production_parquet/ (parquet_dataset.py)
+6. Checks every table's 'World total' row against the sum of its countries
+   (validation.py, issues go to validation_report.csv)
+
+Set PIPELINE_CHUNKSIZE (rows) to clean out of core, chunk by chunk, with the
+same output as the in-memory run:
+- the country review counts come from a first pass over the country column
+- PROD_ columns are int in the output only if every chunk's were
+- the store is loaded chunk by chunk
 """
 
+import contextlib
+import io
+import os
+import tempfile
+
 import pandas as pd
-import re
+
+from canonicalize_countries import canonicalize_countries, write_country_review
+from column_rules import clean_column, rules_report
+from csv_io import read_csv, to_csv
+from parquet_dataset import dataset_folder, start_dataset, write_dataset, write_partitions
+from production_store import write_store, write_store_chunks
+from units_normalization import normalize_units, units_mapping
+from validation import world_total_issues, world_total_sums, write_report
 
 # Configuration
 input_file = "mcs1996_all_world_production_usgs_cleaned.csv"
 output_file = "combined_world_production_cleaned.csv"
+store_file = "world_production.db"
+country_review_file = "country_review.csv"
+units_mapping_file = "units_mapping.csv"
+rules_report_file = "cleaning_rules_report.csv"
+chunksize = int(os.environ.get("PIPELINE_CHUNKSIZE", "0")) or None  # None = all in memory
+write_parquet = os.environ.get("PIPELINE_PARQUET") == "1"
 
-print(f"Cleaning PROD_ columns in {input_file}...\n")
-
-# Read the pivoted file
-df = pd.read_csv(input_file)
+INT_COLUMNS = ['page', 'source_row', 'estimated']  # provenance and the estimate mask
 
-print(f"Original shape: {df.shape}")
-print(f"Columns: {list(df.columns)}\n")
 
-# Step 1: Clean the 'country' column - remove comma and everything after it, remove trailing numbers, remove parentheses
-print("Step 1: Cleaning 'country' column...")
-print(f"  Original sample values:")
-print(f"  {df['country'].head(10).tolist()}\n")
+def typed(df):
+    """INT_COLUMNS (those present) as int"""
+    return df.astype({col: int for col in INT_COLUMNS if col in df.columns})
 
-# Remove comma and everything after it
-df['country'] = df['country'].astype(str).str.split(',').str[0].str.strip()
 
-# Remove trailing numbers (e.g., "United States5" -> "United States")
-df['country'] = df['country'].str.replace(r'\d+$', '', regex=True).str.strip()
+def read_pivoted(path, **kwargs):
+    """Read the pivoted file with text kept as written (no per-chunk type guessing)"""
+    reader = read_csv(path, dtype=str, **kwargs)
+    if kwargs.get('chunksize'):
+        return (typed(chunk) for chunk in reader)
+    return typed(reader)
 
-# Remove newlines and extra whitespace (e.g., "W\n  World total" -> "W World total")
-df['country'] = df['country'].str.replace(r'\s+', ' ', regex=True).str.strip()
 
-# Remove anything in parentheses including the parentheses (handles both complete and orphaned parentheses)
-# First remove complete parentheses: "World total (rounded)" -> "World total"
-df['country'] = df['country'].str.replace(r'\s*\([^)]*\)', '', regex=True).str.strip()
+def clean_country_names(country, record=True):
+    """Step 1 on a 'country' Series (row by row, so chunks can be cleaned separately)"""
+    return clean_column(country, 'country', record)
 
-# Remove orphaned opening parentheses and everything after: "World total (rounded" -> "World total"
-df['country'] = df['country'].str.replace(r'\s*\(.*$', '', regex=True).str.strip()
 
-# Remove orphaned closing parentheses: "World total)" -> "World total"
-df['country'] = df['country'].str.replace(r'\s*\).*$', '', regex=True).str.strip()
+def clean_units(units, record=True):
+    """Step 2 on a 'units' Series"""
+    return clean_column(units, 'units', record)
 
-# Replace 'w' or 'W' with 'World total' (e.g., "w" -> "World total")
-# Also handle cases like "W World total" -> "World total"
-df['country'] = df['country'].replace({'w': 'World total', 'W': 'World total'})
-df['country'] = df['country'].str.replace(r'^W\s+World total$', 'World total', regex=True)
 
-# Remove any non-letter characters except spaces (keeps only letters and spaces)
-df['country'] = df['country'].str.replace(r'[^a-zA-Z\s]', '', regex=True).str.strip()
+def write_rules_report(path=rules_report_file):
+    """Hits and seconds of every cleaning rule run so far (column_rules.stats)"""
+    report = rules_report()
+    to_csv(report.round({'seconds': 6}), path)
+    passes = report.groupby('column')['pass'].nunique().sum()
+    print(f"✓ Cleaning rules: {len(report)} rules in {passes} passes, "
+          f"{report['hits'].sum():,} values changed (report: {path})")
 
-# Clean up multiple spaces that might result from removing characters
-df['country'] = df['country'].str.replace(r'\s+', ' ', regex=True).str.strip()
 
-print(f"  Cleaned sample values:")
-print(f"  {df['country'].head(10).tolist()}\n")
+def clean_combined(df, review_path=country_review_file, mapping_path=units_mapping_file):
+    """Steps 1-4.5 on the pivoted data; returns the cleaned df
 
-# Step 2: Clean the 'units' column - remove 'of' and everything after it, remove trailing numbers
-print("Step 2: Cleaning 'units' column...")
-print(f"  Original sample values:")
-print(f"  {df['units'].head(10).tolist()}\n")
-
-# Remove 'of' and everything after it (e.g., "metric tons of copper" -> "metric tons")
-df['units'] = df['units'].astype(str).str.split(' of ').str[0].str.strip()
-
-# Remove trailing numbers (e.g., "metric tons5" -> "metric tons")
-df['units'] = df['units'].str.replace(r'\d+$', '', regex=True).str.strip()
-
-print(f"  Cleaned sample values:")
-print(f"  {df['units'].head(10).tolist()}\n")
-
-# Step 3: Clean the 'type' column - remove comma and everything after it, remove trailing numbers, 'e', and ')'
-print("Step 3: Cleaning 'type' column...")
-print(f"  Original sample values:")
-print(f"  {df['type'].head(10).tolist()}\n")
-
-# Remove newlines and extra whitespace (e.g., "Reserve base\nReserves" -> "Reserve base Reserves")
-df['type'] = df['type'].astype(str).str.replace(r'\s+', ' ', regex=True).str.strip()
-
-# Remove comma and everything after it
-df['type'] = df['type'].astype(str).str.split(',').str[0].str.strip()
-
-# Remove trailing numbers (e.g., "Mine production6" -> "Mine production")
-df['type'] = df['type'].str.replace(r'\d+$', '', regex=True).str.strip()
-
-# Remove trailing 'e' (e.g., "Mine productione" -> "Mine production")
-df['type'] = df['type'].str.replace(r'e$', '', regex=True).str.strip()
-
-# Remove trailing ')' (e.g., "gross weight)" -> "gross weight")
-df['type'] = df['type'].str.replace(r'\)$', '', regex=True).str.strip()
-
-# Remove any '(' character (e.g., "gross weight(" -> "gross weight")
-df['type'] = df['type'].str.replace('(', '', regex=False).str.strip()
-
-# Remove any non-letter characters except spaces (keeps only letters and spaces)
-df['type'] = df['type'].str.replace(r'[^a-zA-Z\s]', '', regex=True).str.strip()
-
-# Clean up multiple spaces that might result from removing characters
-df['type'] = df['type'].str.replace(r'\s+', ' ', regex=True).str.strip()
-
-print(f"  Cleaned sample values:")
-print(f"  {df['type'].head(10).tolist()}\n")
-
-# Step 3.5: Clean the 'commodity' column - remove malformed characters
-print("Step 3.5: Cleaning 'commodity' column...")
-print(f"  Original sample values:")
-print(f"  {df['commodity'].head(10).tolist()}\n")
-
-# Remove any non-letter characters except spaces and parentheses (keeps letters, spaces, and parentheses)
-df['commodity'] = df['commodity'].astype(str).str.replace(r'[^a-zA-Z\s()]', '', regex=True).str.strip()
-
-# Clean up multiple spaces
-df['commodity'] = df['commodity'].str.replace(r'\s+', ' ', regex=True).str.strip()
-
-print(f"  Cleaned sample values:")
-print(f"  {df['commodity'].head(10).tolist()}\n")
-
-# Step 4: Clean PROD_ columns
-print("Step 4: Cleaning PROD_ columns...")
-
-# Find all PROD_ columns
-prod_columns = [col for col in df.columns if col.startswith('PROD_')]
-
-print(f"Found {len(prod_columns)} PROD_ columns to clean")
-print(f"PROD columns: {prod_columns[:5]}...\n")
-
-# Clean and convert each PROD column
-for col in prod_columns:
-    print(f"Cleaning: {col}")
-    
-    # Show original data type
-    print(f"  Original dtype: {df[col].dtype}")
-    
-    # Convert to string first to handle any mixed types
-    df[col] = df[col].astype(str)
-    
-    # Clean the values:
-    # - Remove 'e' or 'E' anywhere (estimated values like "e1000", "1000e", "1e000" -> "1000")
-    # - Remove commas (e.g., "1,000" -> "1000")
-    # - Remove spaces
-    # - Replace common text values with NaN
-    df[col] = df[col].str.replace('e', '', regex=False, case=False)  # Remove all 'e' or 'E'
-    df[col] = df[col].str.replace('E', '', regex=False)  # Make sure capital E is also removed
-    df[col] = df[col].str.replace(',', '', regex=False)
-    df[col] = df[col].str.replace(' ', '', regex=False)
-    df[col] = df[col].str.strip()
-    
-    # Replace common non-numeric values with empty string
-    df[col] = df[col].replace({
-        'nan': '',
-        'NaN': '',
-        'NA': '',
-        'N/A': '',
-        '--': '',
-        'W': '',  # Withheld
-        'XX': '',
-        '': ''
-    })
-    
-    # Convert to numeric (coerce errors to NaN)
-    df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Show new data type and sample values
-    print(f"  New dtype: {df[col].dtype}")
-    print(f"  Non-null count: {df[col].notna().sum()} / {len(df)}")
-    print(f"  Sample values: {df[col].dropna().head(3).tolist()}")
-    print()
+    review_path=None / mapping_path=None leave the country review and units
+    mapping files alone (used when only some rows are re-cleaned, see
+    update_page.py)
+    """
+    # Step 1: Clean the 'country' column - remove comma and everything after it, remove trailing numbers, remove parentheses
+    print("Step 1: Cleaning 'country' column...")
+    print(f"  Original sample values:")
+    print(f"  {df['country'].head(10).tolist()}\n")
 
-# Save cleaned file
-df.to_csv(output_file, index=False)
+    df['country'] = clean_country_names(df['country'])
 
-print(f"{'='*60}")
-print(f"✓ Saved cleaned file: {output_file}")
-print(f"{'='*60}")
+    print(f"  Cleaned sample values:")
+    print(f"  {df['country'].head(10).tolist()}\n")
 
-# Show summary
-print("\nSummary:")
-print(f"Total rows: {len(df):,}")
-print(f"PROD columns cleaned: {len(prod_columns)}")
+    # Step 1.5: Canonicalize country names (e.g. "Unitcd States" -> "United States", "USSR" -> "Former Soviet Union")
+    print("Step 1.5: Canonicalizing 'country' names...")
+    df = canonicalize_countries(df, 'country', review_path)
+    print()
 
-# Show preview
-print("\nPreview of cleaned data:")
-print(df.head(10))
+    # Step 2: Clean the 'units' column - remove 'of' and everything after it, remove trailing numbers
+    print("Step 2: Cleaning 'units' column...")
+    print(f"  Original sample values:")
+    print(f"  {df['units'].head(10).tolist()}\n")
+
+    df['units'] = clean_units(df['units'])
+
+    print(f"  Cleaned sample values:")
+    print(f"  {df['units'].head(10).tolist()}\n")
+
+    # Step 3: Clean the 'type' column - remove comma and everything after it, remove trailing numbers, 'e', and ')'
+    print("Step 3: Cleaning 'type' column...")
+    print(f"  Original sample values:")
+    print(f"  {df['type'].head(10).tolist()}\n")
+
+    df['type'] = clean_column(df['type'], 'type')
+
+    print(f"  Cleaned sample values:")
+    print(f"  {df['type'].head(10).tolist()}\n")
+
+    # Step 3.5: Clean the 'commodity' column - remove malformed characters
+    print("Step 3.5: Cleaning 'commodity' column...")
+    print(f"  Original sample values:")
+    print(f"  {df['commodity'].head(10).tolist()}\n")
+
+    df['commodity'] = clean_column(df['commodity'], 'commodity')
+
+    print(f"  Cleaned sample values:")
+    print(f"  {df['commodity'].head(10).tolist()}\n")
+
+    # Step 4: Clean PROD_ columns
+    print("Step 4: Cleaning PROD_ columns...")
+
+    # Find all PROD_ columns
+    prod_columns = [col for col in df.columns if col.startswith('PROD_')]
+
+    print(f"Found {len(prod_columns)} PROD_ columns to clean")
+    print(f"PROD columns: {prod_columns[:5]}...\n")
+
+    # Clean and convert each PROD column
+    for col in prod_columns:
+        print(f"Cleaning: {col}")
+
+        # Show original data type
+        print(f"  Original dtype: {df[col].dtype}")
+
+        # Convert to string first to handle any mixed types
+        df[col] = df[col].astype(str)
+
+        # Clean the values:
+        # - Remove 'e' or 'E' anywhere (estimated values like "e1000", "1000e", "1e000" -> "1000")
+        # - Remove commas (e.g., "1,000" -> "1000")
+        # - Remove spaces
+        # - Replace common text values with NaN
+        df[col] = df[col].str.replace('e', '', regex=False, case=False)  # Remove all 'e' or 'E'
+        df[col] = df[col].str.replace('E', '', regex=False)  # Make sure capital E is also removed
+        df[col] = df[col].str.replace(',', '', regex=False)
+        df[col] = df[col].str.replace(' ', '', regex=False)
+        df[col] = df[col].str.strip()
+
+        # Replace common non-numeric values with empty string
+        df[col] = df[col].replace({
+            'nan': '',
+            'NaN': '',
+            'NA': '',
+            'N/A': '',
+            '--': '',
+            'W': '',  # Withheld
+            'XX': '',
+            '': ''
+        })
+
+        # Convert to numeric (coerce errors to NaN)
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        # Show new data type and sample values
+        print(f"  New dtype: {df[col].dtype}")
+        print(f"  Non-null count: {df[col].notna().sum()} / {len(df)}")
+        print(f"  Sample values: {df[col].dropna().head(3).tolist()}")
+        print()
+
+    # Step 4.5: Canonical units and normalized copies of the PROD_ columns
+    print("Step 4.5: Normalizing units...")
+    df = normalize_units(df, mapping_path)
+    parsed = df['units_multiplier'].notna()
+    print(f"  {parsed.sum()} / {len(df)} rows in a canonical unit: "
+          f"{sorted(df.loc[parsed, 'canonical_units'].unique())}")
+    if not parsed.all():
+        print(f"  ⚠ Units not recognized: {sorted(df.loc[~parsed, 'units'].astype(str).unique())[:10]}")
+    print()
 
-# Show data types
-print("\nData types of PROD columns:")
-for col in prod_columns[:5]:
-    print(f"  {col}: {df[col].dtype}")
\ No newline at end of file
+    return df
+
+
+def clean_chunked(input_file, output_file, chunksize, review_path=country_review_file, store_path=store_file,
+                  parquet_root=None, mapping_path=units_mapping_file):
+    """clean_combined over the file chunksize rows at a time; returns (rows, PROD_ columns)"""
+    # Pass 1: review counts need every row's cleaned country name, the units
+    # mapping every distinct cleaned units string
+    counts = pd.Series(dtype='int64')
+    units = set()
+    for chunk in read_pivoted(input_file, usecols=['country', 'units'], chunksize=chunksize):
+        counts = counts.add(clean_country_names(chunk['country'], record=False).value_counts(), fill_value=0)
+        units.update(clean_units(chunk['units'], record=False).unique())
+    review = write_country_review(counts.astype('int64'), review_path)
+    print(f"Country review: {len(review)} unresolved name(s) written to: {review_path}")
+    mapping = units_mapping(pd.Series(sorted(units), dtype=object))
+    to_csv(mapping, mapping_path)
+    print(f"Units mapping: {len(mapping)} distinct units written to: {mapping_path}\n")
+
+    with tempfile.TemporaryDirectory(prefix="clean_spill_", dir=".") as spill_dir:
+        spill_file = os.path.join(spill_dir, "cleaned.csv")
+
+        # Pass 2: clean each chunk (step by step report for the first one only)
+        rows, int_columns, prod_columns = 0, None, []
+        for i, chunk in enumerate(read_pivoted(input_file, chunksize=chunksize)):
+            report = contextlib.nullcontext() if i == 0 else contextlib.redirect_stdout(io.StringIO())
+            with report:
+                chunk = clean_combined(chunk, review_path=None, mapping_path=None)
+
+            prod_columns = [col for col in chunk.columns if col.startswith('PROD_')]
+            chunk_ints = {col for col in prod_columns if chunk[col].dtype.kind in 'iu'}
+            int_columns = chunk_ints if int_columns is None else int_columns & chunk_ints
+
+            to_csv(chunk, spill_file, header=(i == 0), mode='w' if i == 0 else 'a')
+            rows += len(chunk)
+
+        # Pass 3: one dtype per PROD_ column for the whole file, as to_numeric gives in memory
+        def final_chunks():
+            reader = read_csv(spill_file, dtype=str, keep_default_na=False, chunksize=chunksize)
+            for chunk in reader:
+                for col in prod_columns:
+                    values = pd.to_numeric(chunk[col], errors='coerce')
+                    chunk[col] = values.astype('int64' if col in int_columns else 'float64')
+                yield chunk
+
+        totals = []
+        parquet_rows = 0 if parquet_root and start_dataset(parquet_root) else None
+
+        def written_chunks():
+            nonlocal parquet_rows
+            for i, chunk in enumerate(final_chunks()):
+                to_csv(chunk, output_file, header=(i == 0), mode='w' if i == 0 else 'a')
+                chunk = typed(chunk)
+                totals.append(world_total_sums(chunk))
+                if parquet_rows is not None:
+                    parquet_rows += write_partitions(chunk, parquet_root, part=i)
+                yield chunk
+
+        print("\nStep 5: Writing SQLite query store...")
+        stored_rows = write_store_chunks(written_chunks(), store_path)
+        print(f"✓ Saved {stored_rows:,} production rows to: {store_path}")
+        if parquet_rows is not None:
+            print(f"✓ Saved {parquet_rows:,} rows to the Parquet dataset: {parquet_root}/")
+
+    # Step 6: per-chunk sums add up to the whole file's
+    print("\nStep 6: Checking 'World total' rows...")
+    write_report('cleaned', world_total_issues(totals))
+
+    return rows, prod_columns
+
+
+def main():
+    if chunksize:
+        print(f"Cleaning PROD_ columns in {input_file} in chunks of {chunksize:,} rows...\n")
+        rows, prod_columns = clean_chunked(input_file, output_file, chunksize,
+                                           parquet_root=dataset_folder if write_parquet else None)
+        print(f"{'='*60}")
+        print(f"✓ Saved cleaned file: {output_file}")
+        print(f"Total rows: {rows:,}")
+        print(f"PROD columns cleaned: {len(prod_columns)}")
+        write_rules_report()
+        print(f"{'='*60}")
+        return
+
+    print(f"Cleaning PROD_ columns in {input_file}...\n")
+
+    # Read the pivoted file
+    df = read_pivoted(input_file)
+
+    print(f"Original shape: {df.shape}")
+    print(f"Columns: {list(df.columns)}\n")
+
+    df = clean_combined(df)
+
+    # Find all PROD_ columns
+    prod_columns = [col for col in df.columns if col.startswith('PROD_')]
+
+    # Save cleaned file
+    to_csv(df, output_file)
+
+    print(f"{'='*60}")
+    print(f"✓ Saved cleaned file: {output_file}")
+    write_rules_report()
+    print(f"{'='*60}")
+
+    # Step 5: Load the query store
+    print("\nStep 5: Writing SQLite query store...")
+    stored_rows = write_store(df, store_file)
+    print(f"✓ Saved {stored_rows:,} production rows to: {store_file}")
+
+    if write_parquet:
+        parquet_rows = write_dataset([df], dataset_folder)
+        if parquet_rows is not None:
+            print(f"✓ Saved {parquet_rows:,} rows to the Parquet dataset: {dataset_folder}/")
+
+    # Step 6: World totals against the country sums
+    print("\nStep 6: Checking 'World total' rows...")
+    write_report('cleaned', world_total_issues(world_total_sums(df)))
+
+    # Show summary
+    print("\nSummary:")
+    print(f"Total rows: {len(df):,}")
+    print(f"PROD columns cleaned: {len(prod_columns)}")
+
+    # Show preview
+    print("\nPreview of cleaned data:")
+    print(df.head(10))
+
+    # Show data types
+    print("\nData types of PROD columns:")
+    for col in prod_columns[:5]:
+        print(f"  {col}: {df[col].dtype}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+SQLite Query Store
+Writes the cleaned world production data into a local SQLite database
+Normalized schema: commodity and country lookup tables plus one production
+row per (source, commodity, country, type, units, year) with value and flags,
+and the page and source_row the value was read from
+Indexed on (commodity, year) and (country, year) so single-commodity or
+single-country lookups don't need to parse the whole CSV, and on
+(source, page) so update_page() can replace one page's rows
+
+Usage:
+    from production_store import query_commodity, query_country
+    df = query_commodity("COPPER", start_year=1995)
+    df = query_country("Chile")
+"""
+
+import sqlite3
+import pandas as pd
+
+from parsing_yearly_prod_data import estimate_flags
+
+# Configuration
+db_path = "world_production.db"
+
+SCHEMA = """
+CREATE TABLE commodity (
+    commodity_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE country (
+    country_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE production (
+    source TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    source_row INTEGER NOT NULL,
+    commodity_id INTEGER NOT NULL REFERENCES commodity(commodity_id),
+    country_id INTEGER NOT NULL REFERENCES country(country_id),
+    type TEXT,
+    units TEXT,
+    year INTEGER NOT NULL,
+    value REAL,
+    flags TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX idx_production_commodity_year ON production(commodity_id, year);
+CREATE INDEX idx_production_country_year ON production(country_id, year);
+CREATE INDEX idx_production_source_page ON production(source, page);
+CREATE VIEW production_view AS
+    SELECT p.source, c.name AS commodity, k.name AS country, p.type, p.units,
+           p.year, p.value, p.flags, p.page, p.source_row
+    FROM production p
+    JOIN commodity c ON c.commodity_id = p.commodity_id
+    JOIN country k ON k.country_id = p.country_id;
+"""
+
+TABLES = ["production_view", "production", "commodity", "country"]
+
+
+def to_long(df):
+    """Melt the wide PROD_<year> columns into (year, value, flags) rows"""
+    prod_columns = [col for col in df.columns if col.startswith('PROD_')]
+    id_columns = ['source', 'commodity', 'country', 'type', 'units']
+    provenance = ['page', 'source_row']
+
+    long_df = df.melt(id_vars=id_columns + provenance, value_vars=prod_columns,
+                      var_name='year_column', value_name='value')
+    # Estimate bits of the 'estimated' mask, melted in the same order
+    long_df['estimated'] = estimate_flags(df, prod_columns).melt()['value'].to_numpy()
+    long_df = long_df[long_df['value'].notna()]
+
+    # PROD_1996 -> year 1996, flags 'e' if the mask marks it estimated
+    # (files from before the mask have PROD_1996e columns: the suffix is the flag)
+    parts = long_df['year_column'].str.extract(r'^PROD_(\d{4})(\D*)$')
+    flags = parts[1].fillna('').where(~long_df['estimated'], 'e')
+    long_df = long_df.assign(year=pd.to_numeric(parts[0]), flags=flags)
+    long_df = long_df[long_df['year'].notna()]
+    long_df['year'] = long_df['year'].astype(int)
+
+    for col in id_columns:
+        long_df[col] = long_df[col].astype(str)
+
+    for col in provenance:
+        long_df[col] = long_df[col].astype(int)
+
+    return long_df[id_columns + provenance + ['year', 'value', 'flags']]
+
+
+def _production_rows(long_df, commodities, countries):
+    """Rows for INSERT INTO production (or staging, with names), in table column order"""
+    return zip(long_df['source'], long_df['page'].tolist(), long_df['source_row'].tolist(),
+               commodities, countries, long_df['type'], long_df['units'],
+               long_df['year'].tolist(), long_df['value'].tolist(), long_df['flags'])
+
+
+def write_store(df, path=db_path):
+    """Rebuild the database from the cleaned wide DataFrame in one transaction"""
+    return write_store_chunks([df], path)
+
+
+def write_store_chunks(chunks, path=db_path):
+    """Rebuild the database from cleaned wide DataFrames arriving one at a time
+
+    Production rows are staged with their commodity/country names; the lookup
+    tables (ids in name order) and the production rows are built in SQL at
+    the end, so only one chunk is ever in memory.
+    """
+    # Autocommit mode so the whole rebuild is one explicit transaction
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        for table in TABLES:
+            kind = "VIEW" if table.endswith('_view') else "TABLE"
+            conn.execute(f"DROP {kind} IF EXISTS {table}")
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+        conn.execute("""CREATE TEMP TABLE staging (source, page, source_row, commodity, country,
+                                                   type, units, year, value, flags)""")
+        stored_rows = 0
+        for df in chunks:
+            long_df = to_long(df)
+            conn.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             _production_rows(long_df, long_df['commodity'], long_df['country']))
+            stored_rows += len(long_df)
+
+        # Integer keys for the lookup tables; production rows in to_long() order for
+        # the whole file (one PROD_ column per year, sorted, so by year, then row)
+        conn.execute("INSERT INTO commodity (name) SELECT DISTINCT commodity FROM staging ORDER BY commodity")
+        conn.execute("INSERT INTO country (name) SELECT DISTINCT country FROM staging ORDER BY country")
+        conn.execute("""
+            INSERT INTO production
+            SELECT s.source, s.page, s.source_row, c.commodity_id, k.country_id,
+                   s.type, s.units, s.year, s.value, s.flags
+            FROM staging s
+            JOIN commodity c ON c.name = s.commodity
+            JOIN country k ON k.name = s.country
+            ORDER BY s.year, s.rowid
+        """)
+        conn.execute("DROP TABLE staging")
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return stored_rows
+
+
+def update_page(df, source, page, path=db_path):
+    """Replace the rows of one (source, page) with df (that page's cleaned wide rows)"""
+    long_df = to_long(df)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM production WHERE source = ? AND page = ?", (source, page))
+
+        # New commodity/country names get the next free ids
+        conn.executemany("INSERT OR IGNORE INTO commodity (name) VALUES (?)",
+                         [(name,) for name in long_df['commodity'].unique()])
+        conn.executemany("INSERT OR IGNORE INTO country (name) VALUES (?)",
+                         [(name,) for name in long_df['country'].unique()])
+        commodity_ids = dict(conn.execute("SELECT name, commodity_id FROM commodity"))
+        country_ids = dict(conn.execute("SELECT name, country_id FROM country"))
+
+        rows = _production_rows(long_df, long_df['commodity'].map(commodity_ids).tolist(),
+                                long_df['country'].map(country_ids).tolist())
+        conn.executemany("INSERT INTO production VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return len(long_df)
+
+
+def query(sql, params=(), path=db_path):
+    """Run a SELECT against the store and return a DataFrame"""
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def _year_filter(start_year, end_year):
+    clauses, params = [], []
+    if start_year is not None:
+        clauses.append("p.year >= ?")
+        params.append(start_year)
+    if end_year is not None:
+        clauses.append("p.year <= ?")
+        params.append(end_year)
+    return clauses, params
+
+
+def query_commodity(commodity, country=None, start_year=None, end_year=None, path=db_path):
+    """All production rows for one commodity, optionally for one country/year range"""
+    clauses, params = _year_filter(start_year, end_year)
+    clauses.insert(0, "c.name = ?")
+    params.insert(0, commodity)
+    if country is not None:
+        clauses.append("k.name = ?")
+        params.append(country)
+
+    sql = f"""
+        SELECT p.source, c.name AS commodity, k.name AS country, p.type, p.units,
+               p.year, p.value, p.flags, p.page, p.source_row
+        FROM commodity c
+        JOIN production p ON p.commodity_id = c.commodity_id
+        JOIN country k ON k.country_id = p.country_id
+        WHERE {' AND '.join(clauses)}
+        ORDER BY p.year, k.name, p.type
+    """
+    return query(sql, params, path)
+
+
+def query_country(country, commodity=None, start_year=None, end_year=None, path=db_path):
+    """All production rows for one country across commodities"""
+    clauses, params = _year_filter(start_year, end_year)
+    clauses.insert(0, "k.name = ?")
+    params.insert(0, country)
+    if commodity is not None:
+        clauses.append("c.name = ?")
+        params.append(commodity)
+
+    sql = f"""
+        SELECT p.source, c.name AS commodity, k.name AS country, p.type, p.units,
+               p.year, p.value, p.flags, p.page, p.source_row
+        FROM country k
+        JOIN production p ON p.country_id = k.country_id
+        JOIN commodity c ON c.commodity_id = p.commodity_id
+        WHERE {' AND '.join(clauses)}
+        ORDER BY c.name, p.year, p.type
+    """
+    return query(sql, params, path)
@@ -0,0 +1,113 @@
+"""
+Shared-Memory Table Handoff
+Worker processes hand DataFrames back to the parent through shared memory
+instead of pickling them: share() writes the frame as an Arrow IPC stream
+into a new shared-memory segment and returns a small handle (segment name
+and size), receive() maps the segment in the parent and reads the record
+batches in place, without copying the cells
+
+The parent unlinks a segment's name as soon as it has mapped it, so
+nothing is left in /dev/shm after a run; the mapping itself lives as long
+as the Arrow buffers (and the frames read zero-copy from them) using it.
+A worker whose read fails hands the exception back instead, so the parent
+still gets every other handle and can discard() the segments it won't read
+
+Falls back to handing the DataFrame itself over (pickled by the pool) when
+pyarrow is not installed or shared memory can't be created
+
+Usage (worker side / parent side):
+    handle = share(df)
+    df = receive(handle)
+    discard(handle)      (segments of handles that were never received)
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from csv_io import read_csv
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pa
+
+
+def share(df):
+    """Handle for df: {'shm': name, 'size': bytes} in shared memory, else {'frame': df}"""
+    pa = _arrow()
+    if pa is None:
+        return {'frame': df}
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(sink):
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    # Size the stream first, then serialize straight into the segment
+    size = pa.MockOutputStream()
+    write(size)
+    try:
+        shm = shared_memory.SharedMemory(create=True, size=max(size.size(), 1))
+    except OSError:
+        return {'frame': df}
+    buffer = pa.py_buffer(shm.buf)
+    write(pa.FixedSizeBufferWriter(buffer))
+    del buffer
+    # The receiving process unlinks the segment, so this one's resource tracker must not
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    shm.close()
+    return {'shm': shm.name, 'size': size.size()}
+
+
+class _Segment:
+    """An attached segment, kept mapped for as long as the Arrow buffer over it lives"""
+
+    def __init__(self, shm, size):
+        self.shm = shm
+        self.view = np.frombuffer(shm.buf, dtype=np.uint8, count=size)
+
+    def __del__(self):
+        del self.view  # the last export of shm.buf, which close() releases
+        self.shm.close()
+
+
+def receive(handle):
+    """The DataFrame behind a share() handle (raises the worker's exception for a failed one)"""
+    if 'error' in handle:
+        raise handle['error']
+    if 'frame' in handle:
+        return handle['frame']
+
+    import pyarrow as pa
+    shm = shared_memory.SharedMemory(name=handle['shm'])
+    shm.unlink()  # the mapping stays valid; the name is no longer needed
+
+    segment = _Segment(shm, handle['size'])
+    buffer = pa.foreign_buffer(segment.view.ctypes.data, handle['size'], base=segment)
+    table = pa.ipc.open_stream(buffer).read_all()
+    return table.to_pandas()
+
+
+def discard(handle):
+    """Unlink the segment of a handle that won't be received (no-op once it was)"""
+    if 'shm' not in handle:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=handle['shm'])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def read_csv_shared(path):
+    """read_csv(path) in a worker, handed back with share() ({'error': exception} if it fails)"""
+    try:
+        return share(read_csv(path))
+    except Exception as e:
+        return {'error': e}
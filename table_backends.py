@@ -0,0 +1,167 @@
+"""
+Table Extraction Backends
+Each backend returns the tables on one PDF page as candidate dicts:
+    {'backend', 'df', 'accuracy', 'whitespace'}
+df holds strings ('' for empty cells), like camelot's table.df. accuracy is
+camelot's parsing-report accuracy (None for pdfplumber) and whitespace is the
+percentage of empty cells, computed the same way for every backend.
+
+choose_table() tries the backends in order - pdfplumber text strategies on the
+layout cache first, camelot stream/lattice only when the cheap result looks
+wrong - and reports which backend each page ended up with.
+
+Backends also take explicit settings (table_with_settings): backend
+parameters (pdfplumber table settings, camelot read_pdf keywords) and an
+optional area, the (top, bottom) fractions of the page height to look in.
+page_retry.py sweeps these for pages whose table fails the cleaning checks.
+"""
+
+import pandas as pd
+
+# Configuration
+backend_order = ["pdfplumber", "camelot_stream", "camelot_lattice"]
+pdfplumber_settings = {"vertical_strategy": "text", "horizontal_strategy": "text"}
+max_whitespace = 60.0  # % empty cells above which a table is rejected
+min_accuracy = 80.0    # camelot accuracy below which a table is rejected
+min_rows = 3
+min_cols = 2
+
+
+def whitespace(df):
+    """Percentage of empty cells, as in camelot's parsing report"""
+    if df.size == 0:
+        return 100.0
+    empty = (df.astype(str).apply(lambda col: col.str.strip()) == '').to_numpy().sum()
+    return 100.0 * empty / df.size
+
+
+def area_bbox(page, area):
+    """(x0, top, x1, bottom) of the (top, bottom) fractions of the page height"""
+    top, bottom = area
+    return 0, top * page.height, page.width, bottom * page.height
+
+
+def pdfplumber_tables(pdf_path, page_num, cache, area=None, **settings):
+    page = cache.page(page_num)
+    if area is not None:
+        page = page.within_bbox(area_bbox(page, area))
+    tables = page.extract_tables({**pdfplumber_settings, **settings})
+    frames = [pd.DataFrame(table).fillna('') for table in tables]
+    return [{'backend': 'pdfplumber', 'df': df, 'accuracy': None, 'whitespace': whitespace(df)}
+            for df in frames]
+
+
+def _camelot_tables(pdf_path, page_num, flavor, cache, area=None, **params):
+    import camelot
+    if area is not None:
+        # table_areas are "x1,y1,x2,y2" from the top left corner, in PDF space (y up)
+        page = cache.page(page_num)
+        x0, top, x1, bottom = area_bbox(page, area)
+        params['table_areas'] = [f"{x0},{page.height - top},{x1},{page.height - bottom}"]
+    tables = camelot.read_pdf(pdf_path, pages=str(page_num), flavor=flavor, **params)
+    return [{'backend': f'camelot_{flavor}', 'df': table.df,
+             'accuracy': table.parsing_report['accuracy'], 'whitespace': whitespace(table.df)}
+            for table in tables]
+
+
+def camelot_stream_tables(pdf_path, page_num, cache, **params):
+    return _camelot_tables(pdf_path, page_num, 'stream', cache, **params)
+
+
+def camelot_lattice_tables(pdf_path, page_num, cache, **params):
+    return _camelot_tables(pdf_path, page_num, 'lattice', cache, **params)
+
+
+BACKENDS = {
+    'pdfplumber': pdfplumber_tables,
+    'camelot_stream': camelot_stream_tables,
+    'camelot_lattice': camelot_lattice_tables,
+}
+
+
+def largest_table(candidates):
+    """The largest table on the page (typically the world production table)"""
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: c['df'].shape[0] * c['df'].shape[1])
+
+
+def settings_label(settings):
+    """'camelot_stream edge_tol=500 area=(0.5, 1.0)' for a settings dict"""
+    params = ' '.join(f"{key}={value}" for key, value in settings.items() if key != 'backend')
+    return f"{settings['backend']} {params}".strip()
+
+
+def table_with_settings(pdf_path, page_num, cache, settings):
+    """Largest table of one backend run with settings {'backend', 'area' (optional), parameters}"""
+    params = {key: value for key, value in settings.items() if key != 'backend'}
+    return largest_table(BACKENDS[settings['backend']](pdf_path, page_num, cache, **params))
+
+
+def tidy_table(df):
+    """A chosen table without its empty and whitespace-only rows (NA for empty cells)"""
+    df = df.replace('', pd.NA)  # Replace empty strings with NA
+    df = df.dropna(how='all')   # Drop rows that are all NA
+    df = df.reset_index(drop=True)
+
+    # Also remove rows where all cells are just whitespace
+    df = df[~df.apply(lambda row: all(str(cell).strip() == '' for cell in row), axis=1)]
+    return df.reset_index(drop=True)
+
+
+def is_acceptable(candidate):
+    rows, cols = candidate['df'].shape
+    if rows < min_rows or cols < min_cols:
+        return False
+    if candidate['whitespace'] > max_whitespace:
+        return False
+    return candidate['accuracy'] is None or candidate['accuracy'] >= min_accuracy
+
+
+def choose_table(pdf_path, page_num, cache, order=None, settings=None):
+    """Run backends in order until one gives an acceptable table
+
+    Returns (candidate or None, tried) where tried lists "backend: outcome"
+    strings. If no backend passes, the tried table with the least whitespace
+    is used. settings (a page's stored retry settings) are tried first, and
+    their table is taken as it is.
+    """
+    # The cache covers every existing page in the extraction range
+    if page_num not in cache:
+        return None, ["page not in PDF"]
+
+    tried, fallbacks = [], []
+    if settings:
+        label = f"stored {settings_label(settings)}"
+        try:
+            candidate = table_with_settings(pdf_path, page_num, cache, settings)
+        except Exception as e:
+            candidate = None
+            tried.append(f"{label}: error ({e})")
+        else:
+            tried.append(f"{label}: {candidate['df'].shape}" if candidate is not None else f"{label}: no tables")
+        if candidate is not None:
+            return candidate, tried
+
+    for name in order or backend_order:
+        try:
+            candidate = largest_table(BACKENDS[name](pdf_path, page_num, cache))
+        except ImportError as e:
+            tried.append(f"{name}: unavailable ({e})")
+            continue
+        except Exception as e:
+            tried.append(f"{name}: error ({e})")
+            continue
+
+        if candidate is None:
+            tried.append(f"{name}: no tables")
+            continue
+
+        tried.append(f"{name}: {candidate['df'].shape}, whitespace {candidate['whitespace']:.1f}%")
+        if is_acceptable(candidate):
+            return candidate, tried
+        fallbacks.append(candidate)
+
+    if fallbacks:
+        return min(fallbacks, key=lambda c: c['whitespace']), tried
+    return None, tried
@@ -0,0 +1,107 @@
+"""
+Units Normalization
+Parses each distinct 'units' string once into (canonical unit, multiplier),
+e.g. "thousand metric tons" -> ('metric tons', 1000.0), "kilograms" ->
+('metric tons', 0.001), "million cubic meters" -> ('cubic meters', 1e6)
+
+normalize_units() adds, next to the original PROD_ columns:
+    canonical_units   the canonical unit of the row
+    units_multiplier  factor from the row's units to the canonical unit
+    NORM_<year>       PROD_<year> * units_multiplier
+The units column becomes categorical codes and the multipliers are looked up
+per code, so every PROD_ column is scaled in one vectorized multiply
+
+Units that don't parse keep their text as canonical_units with no multiplier
+(NORM_ values empty); every distinct string and its mapping is written to
+units_mapping.csv for review
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from csv_io import to_csv
+
+# Configuration
+mapping_file = "units_mapping.csv"
+
+SCALES = {'hundred': 1e2, 'thousand': 1e3, 'million': 1e6, 'billion': 1e9}
+
+# (pattern, canonical unit, multiplier to the canonical unit), first match wins
+UNITS = [
+    (r'metric tons?|tonnes?', 'metric tons', 1.0),
+    (r'short tons?', 'metric tons', 0.90718474),
+    (r'long tons?', 'metric tons', 1.0160469088),
+    (r'kilograms?', 'metric tons', 1e-3),
+    (r'troy ounces?', 'metric tons', 3.11034768e-5),
+    (r'(?<!troy )ounces?', 'metric tons', 2.8349523125e-5),
+    (r'grams?', 'metric tons', 1e-6),
+    (r'flasks?', 'metric tons', 76 * 4.5359237e-4),  # 76-pound mercury flasks
+    (r'pounds?', 'metric tons', 4.5359237e-4),
+    (r'carats?', 'metric tons', 2e-7),
+    (r'cubic meters?', 'cubic meters', 1.0),
+    (r'cubic feet', 'cubic meters', 0.028316846592),
+    (r'liters?', 'cubic meters', 1e-3),
+    (r'barrels?', 'cubic meters', 0.158987294928),
+    (r'tons?', 'metric tons', 1.0),
+]
+UNIT_PATTERNS = [(re.compile(rf'\b(?:{pattern})\b'), canonical, multiplier)
+                 for pattern, canonical, multiplier in UNITS]
+SCALE_PATTERN = re.compile(r'\b(' + '|'.join(SCALES) + r')\b')
+
+NORMALIZED_COLUMNS = ['canonical_units', 'units_multiplier']
+
+
+@lru_cache(maxsize=None)
+def parse_units(units):
+    """(canonical unit, multiplier) for one units string; (text, nan) if it doesn't parse"""
+    text = re.sub(r'\s+', ' ', str(units).lower()).strip()
+    for pattern, canonical, multiplier in UNIT_PATTERNS:
+        if pattern.search(text):
+            for scale in SCALE_PATTERN.findall(text):
+                multiplier *= SCALES[scale]
+            return canonical, multiplier
+    return str(units).strip(), np.nan
+
+
+def normalized_columns(prod_columns):
+    """Columns normalize_units() adds for the given PROD_ columns, in order"""
+    return NORMALIZED_COLUMNS + ['NORM_' + col[len('PROD_'):] for col in prod_columns]
+
+
+def units_mapping(units):
+    """One row per distinct units string in the Series: units, canonical_units, units_multiplier"""
+    distinct = pd.Series(units.dropna().unique(), dtype=object)
+    parsed = [parse_units(u) for u in distinct]
+    return pd.DataFrame({'units': distinct,
+                         'canonical_units': [canonical for canonical, _ in parsed],
+                         'units_multiplier': [multiplier for _, multiplier in parsed]})
+
+
+def normalize_units(df, mapping_path=mapping_file):
+    """Add canonical_units, units_multiplier and NORM_<year> columns; returns df
+
+    mapping_path=None skips the units_mapping.csv report
+    """
+    prod_columns = [col for col in df.columns if col.startswith('PROD_')]
+    units = df['units'].astype('category')
+
+    # Parse each category once; code -1 (missing units) maps to the extra last entry
+    mapping = units_mapping(pd.Series(units.cat.categories, dtype=object))
+    canonical = np.append(mapping['canonical_units'].to_numpy(dtype=object), np.nan)
+    multiplier = np.append(mapping['units_multiplier'].to_numpy(dtype=float), np.nan)
+    codes = units.cat.codes.to_numpy()
+
+    row_multiplier = multiplier[codes]
+    normalized = df[prod_columns].to_numpy(dtype=float) * row_multiplier[:, np.newaxis]
+
+    added = pd.DataFrame(normalized, columns=normalized_columns(prod_columns)[2:], index=df.index)
+    added.insert(0, 'canonical_units', canonical[codes])
+    added.insert(1, 'units_multiplier', row_multiplier)
+    df = pd.concat([df.drop(columns=[c for c in added.columns if c in df.columns]), added], axis=1)
+
+    if mapping_path is not None:
+        to_csv(mapping.sort_values('units'), mapping_path)
+    return df
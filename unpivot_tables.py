@@ -1,64 +1,77 @@
 """
 Unpivot Tables (Wide to Long)
 Transforms tables from wide format to long format
-Keeps 'source' and 'country' columns, unpivots everything else
+Keeps 'source', 'page', 'source_row' and 'country' columns, unpivots everything else
+The unpivoted header names go into the 'type' column
 """
 
 import pandas as pd
 from pathlib import Path
 
+from csv_io import read_csv, to_csv
+from parallel_executor import exit_on_errors, run_per_file, print_summary
+
 # Configuration
 input_folder = "world_production_with_source"
 output_folder = "world_production_long_format"
 
-# Create output folder
-Path(output_folder).mkdir(exist_ok=True)
-
-print(f"Unpivoting tables in {input_folder}/...\n")
-
-# Process each CSV file
-csv_files = list(Path(input_folder).glob("*.csv"))
 
-for csv_file in csv_files:
-    print(f"Processing: {csv_file.name}")
-    
-    # Read CSV - first row is headers
-    df = pd.read_csv(csv_file, header=0)
-    
-    print(f"  Original shape: {df.shape}")
-    print(f"  Columns: {list(df.columns)[:5]}...")
-    
+def unpivot_table(df):
+    """Melt everything except the id columns into ('type', 'value') pairs"""
     # Get the column names
-    # First two columns are 'source' and 'country' (id_vars)
+    # First four columns are 'source', 'page', 'source_row' and 'country' (id_vars)
     # Everything else gets unpivoted (value_vars)
-    id_columns = ['source', 'country']
+    id_columns = ['source', 'page', 'source_row', 'country']
     value_columns = [col for col in df.columns if col not in id_columns]
-    
+
     # Melt/unpivot the dataframe
-    df_long = pd.melt(
+    return pd.melt(
         df,
         id_vars=id_columns,
         value_vars=value_columns,
-        var_name='metric',
+        var_name='type',
         value_name='value'
     )
-    
-    print(f"  New shape: {df_long.shape}")
-    
+
+
+def process_file(csv_file, output_folder=output_folder):
+    """Unpivot one page CSV; returns (status, detail) for the summary"""
+    # Read CSV - first row is headers
+    df = read_csv(csv_file, header=0)
+
+    df_long = unpivot_table(df)
+
     # Save
-    output_file = Path(output_folder) / csv_file.name
-    df_long.to_csv(output_file, index=False)
-    
-    print(f"  ✓ Saved\n")
-
-print(f"{'='*60}")
-print(f"Done! Processed {len(csv_files)} files")
-print(f"Output: {output_folder}/")
-print(f"{'='*60}")
-
-# Show preview of first file
-if csv_files:
-    first_file = Path(output_folder) / csv_files[0].name
-    df_preview = pd.read_csv(first_file)
-    print("\nPreview of first file:")
-    print(df_preview.head(10))
+    output_file = Path(output_folder) / Path(csv_file).name
+    to_csv(df_long, output_file)
+
+    return 'ok', f"{df.shape} → {df_long.shape}, columns: {list(df.columns)[:5]}..."
+
+
+def main():
+    # Create output folder
+    Path(output_folder).mkdir(exist_ok=True)
+
+    print(f"Unpivoting tables in {input_folder}/...\n")
+
+    # Process each CSV file
+    csv_files = list(Path(input_folder).glob("*.csv"))
+
+    results = run_per_file(process_file, csv_files, output_folder=output_folder)
+    counts = print_summary(results)
+    exit_on_errors(counts)
+
+    print(f"Done! Processed {len(csv_files)} files")
+    print(f"Output: {output_folder}/")
+    print(f"{'='*60}")
+
+    # Show preview of first file
+    if csv_files:
+        first_file = Path(output_folder) / csv_files[0].name
+        df_preview = read_csv(first_file)
+        print("\nPreview of first file:")
+        print(df_preview.head(10))
+
+
+if __name__ == "__main__":
+    main()
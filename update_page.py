@@ -0,0 +1,173 @@
+"""
+Update Single Pages
+Re-runs re-extracted pages through the per-page steps (cleaning_script.py
+through unpivot_tables.py) and splices their rows into the existing outputs
+instead of rebuilding them:
+    mcs1996_all_world_production_usgs.csv          (combined long rows)
+    mcs1996_all_world_production_usgs_cleaned.csv  (pivoted)
+    combined_world_production_cleaned.csv          (final)
+    world_production.db                            (query store)
+    world_production_parquet/                      (the pages' commodity partitions, if exported)
+    aggregates/                                    (changed commodities, if materialized)
+Rows are matched on the source/page provenance columns; only the given pages
+are cleaned, pivoted and re-cleaned, every other row is kept as it is. The
+files are read as the pipeline reads them (text as written), so untouched
+rows are written back unchanged
+
+Usage:
+    python update_page.py 35 [37 ...]
+"""
+
+import io
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+import add_country_header
+import add_source_column
+import aggregate_production
+import cleaning_odd_pages
+import cleaning_script
+from csv_io import read_csv, to_csv
+import forward_filling_script
+import merge_headers
+import unpivot_tables
+from add_commodities import add_commodities
+from parquet_dataset import dataset_folder, replace_partitions
+from parsing_yearly_prod_data import PIVOT_INDEX, add_year_columns, pivot_years, read_combined, with_prod_columns
+from post_merge_cleaning_script import clean_combined, read_pivoted
+from production_store import update_page
+from units_normalization import normalized_columns
+
+# Configuration
+raw_folder = "world_production"
+combined_file = "mcs1996_all_world_production_usgs.csv"
+pivoted_file = "mcs1996_all_world_production_usgs_cleaned.csv"
+cleaned_file = "combined_world_production_cleaned.csv"
+store_file = "world_production.db"
+source = add_source_column.source
+
+# Per-page steps in pipeline order (each has process_file and output_folder)
+STEPS = [cleaning_script, cleaning_odd_pages, forward_filling_script, merge_headers,
+         add_country_header, add_source_column, unpivot_tables]
+
+
+def page_file_name(page):
+    return f"page_{page}_world_production.csv"
+
+
+def run_page_steps(page):
+    """Run one raw page through steps 2-8; returns its long-format rows or None"""
+    csv_file = Path(raw_folder) / page_file_name(page)
+    if not csv_file.exists():
+        print(f"  ✗ {csv_file} not found")
+        return None
+
+    for step in STEPS:
+        Path(step.output_folder).mkdir(exist_ok=True)
+        status, detail, *_ = step.process_file(csv_file, output_folder=step.output_folder)
+        print(f"  {step.__name__}: {status} - {detail}")
+        if status != 'ok':
+            return None
+        csv_file = Path(step.output_folder) / csv_file.name
+
+    return read_csv(csv_file)
+
+
+def replace_rows(df, new_rows, pages):
+    """df without the rows of the given pages, with new_rows appended"""
+    old = (df['source'] == source) & df['page'].isin(pages)
+    return pd.concat([df[~old], new_rows], ignore_index=True)
+
+
+def replace_wide_rows(df, new_rows, pages):
+    """replace_rows for pivoted/cleaned rows: both sides get every PROD_ column first,
+    so their estimate masks count the same columns"""
+    prod_columns = sorted({col for col in [*df.columns, *new_rows.columns] if col.startswith('PROD_')})
+    return replace_rows(with_prod_columns(df, prod_columns), with_prod_columns(new_rows, prod_columns), pages)
+
+
+def main():
+    pages = [int(arg) for arg in sys.argv[1:]]
+    if not pages:
+        print(__doc__)
+        sys.exit(1)
+
+    print(f"Updating page(s) {', '.join(str(p) for p in pages)}...\n")
+
+    # Steps 2-8 for just these pages
+    long_dfs, updated = [], []
+    for page in pages:
+        print(f"Page {page}:")
+        long_df = run_page_steps(page)
+        if long_df is None:
+            print(f"  ⚠ Page {page} did not make it through the per-page steps, outputs left unchanged")
+            continue
+        long_dfs.append(long_df)
+        updated.append(page)
+    if not updated:
+        print("\nNothing to update")
+        return
+    pages = updated
+
+    # Combined long rows: replace the pages' rows, keep file order (pages sorted by file name)
+    print(f"\n{'='*60}")
+    new_long = add_commodities(pd.concat(long_dfs, ignore_index=True))
+    combined = replace_rows(read_combined(combined_file), new_long, pages)
+    combined = combined.sort_values('page', key=lambda p: p.map(page_file_name), kind='stable')
+    to_csv(combined, combined_file)
+    print(f"✓ Spliced {len(new_long)} long rows into: {combined_file}")
+
+    # Pivot and clean only the new rows, read back from CSV text like the pipeline's steps read them
+    new_pivoted = pivot_years(add_year_columns(read_combined(io.StringIO(new_long.to_csv(index=False)))))
+    new_pivoted = read_pivoted(io.StringIO(new_pivoted.to_csv(index=False)))
+    new_cleaned = clean_combined(new_pivoted.copy(), review_path=None, mapping_path=None)
+
+    # The pivoted and cleaned files are row-aligned, so splice both with one ordering
+    old_cleaned = read_pivoted(cleaned_file)
+    pivoted = replace_wide_rows(read_pivoted(pivoted_file), new_pivoted, pages)
+    cleaned = replace_wide_rows(old_cleaned, new_cleaned, pages)
+    order = pivoted.rename(columns={'type': 'type_base'}).sort_values(PIVOT_INDEX, kind='stable').index
+
+    # Same PROD_ columns a full pivot would produce: sorted, none left all empty
+    prod_columns = sorted(col for col in pivoted.columns
+                          if col.startswith('PROD_') and pivoted[col].notna().any())
+    pivoted = with_prod_columns(pivoted, prod_columns)
+    cleaned = with_prod_columns(cleaned, prod_columns)
+    id_columns = [col for col in pivoted.columns if not col.startswith('PROD_')]
+
+    to_csv(pivoted.loc[order, id_columns + prod_columns], pivoted_file)
+    cleaned_columns = id_columns + prod_columns + normalized_columns(prod_columns)
+    to_csv(cleaned.loc[order, cleaned_columns], cleaned_file)
+    print(f"✓ Spliced {len(new_pivoted)} pivoted rows into: {pivoted_file} and {cleaned_file}")
+
+    # Query store
+    stored_rows = 0
+    for page in pages:
+        page_rows = new_cleaned[new_cleaned['page'] == page]
+        stored_rows += update_page(page_rows, source, page, store_file)
+    print(f"✓ Replaced {stored_rows:,} production rows in: {store_file}")
+
+    # Parquet dataset: rewrite the partitions of every commodity the pages had or now have
+    if Path(dataset_folder).exists():
+        before = old_cleaned[(old_cleaned['source'] == source) & old_cleaned['page'].isin(pages)]
+        commodities = set(before['commodity']) | set(new_cleaned['commodity'])
+        final = read_csv(cleaned_file, float_precision='round_trip')
+        rows = final[(final['source'] == source) & final['commodity'].isin(commodities)]
+        parquet_rows = replace_partitions(rows)
+        if parquet_rows is not None:
+            print(f"✓ Rewrote {len(commodities)} commodity partition(s), {parquet_rows:,} rows, "
+                  f"in: {dataset_folder}/")
+
+    # Aggregates: the manifest hashes pick out the changed commodities
+    if (Path(aggregate_production.output_folder) / aggregate_production.manifest_file).exists():
+        changed, removed = aggregate_production.refresh(read_csv(cleaned_file))
+        print(f"✓ Refreshed {len(changed)} commodities ({len(removed)} removed) "
+              f"in: {aggregate_production.output_folder}/")
+
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Inline Data-Quality Checks
+Vectorized checks run on the in-memory frames at stage boundaries (no output
+file is read back), replacing the after-the-fact diagnostic_script.py pass
+Failures go to validation_report.csv, one row per issue:
+    stage, check, source, page, commodity, field, observed, expected
+Each stage replaces only its own rows, so the report always holds the latest
+run of every stage
+
+Stage         Check                 Run by
+header_fill   empty_header_cell     forward_filling_script.py / batch_cleaning.py
+combined      header_year           append_append_append_all.py
+combined      missing_units         append_append_append_all.py
+cleaned       missing_world_total   post_merge_cleaning_script.py
+cleaned       world_total_mismatch  post_merge_cleaning_script.py
+
+Usage:
+    issues = combined_issues(combined_df)
+    write_report('combined', issues)
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+from csv_io import read_csv, to_csv
+
+# Configuration
+report_file = "validation_report.csv"
+world_total = "World total"
+world_total_tolerance = 0.05  # relative difference allowed between the country sum and 'World total'
+
+REPORT_COLUMNS = ['stage', 'check', 'source', 'page', 'commodity', 'field', 'observed', 'expected']
+TABLE_KEYS = ['source', 'page', 'commodity', 'type', 'units']
+
+# Year suffix parsing_yearly_prod_data.py pivots on; reserve columns have none
+YEAR_SUFFIX = r'_(?:19|20)\d{2}e?$'
+NO_YEAR_EXPECTED = r'(?i)reserve'
+
+
+def issue_frame(stage, check, rows, **values):
+    """Issue rows for the report from rows (a DataFrame) plus constant or per-row values"""
+    issues = pd.DataFrame(index=rows.index, columns=REPORT_COLUMNS, dtype=object)
+    issues['stage'] = stage
+    issues['check'] = check
+    for col in ['source', 'page', 'commodity']:
+        if col in rows.columns:
+            issues[col] = rows[col]
+    for col, value in values.items():
+        issues[col] = value
+    return issues.reset_index(drop=True)
+
+
+def empty_header_cells(header, stage='header_fill'):
+    """Header cells (columns source, page, col, text; col 0 excluded) still empty after the fill"""
+    header = header[header['col'] >= 1]
+    empty = header['text'].isna() | (header['text'].astype(str).str.strip() == '')
+    rows = header[empty]
+    return issue_frame(stage, 'empty_header_cell', rows,
+                       field='col ' + rows['col'].astype(str), observed='', expected='header text')
+
+
+def header_row_cells(first_row, source, page):
+    """A page's header row (a Series) as the frame empty_header_cells() takes"""
+    return pd.DataFrame({'source': source, 'page': page,
+                         'col': range(len(first_row)), 'text': first_row.tolist()})
+
+
+def combined_issues(df, stage='combined'):
+    """Checks on the combined long rows after the commodity/units join"""
+    types = df['type'].astype(str)
+    no_year = ~types.str.contains(YEAR_SUFFIX) & ~types.str.contains(NO_YEAR_EXPECTED)
+    bad_types = df.loc[no_year, ['source', 'page', 'commodity', 'type']].drop_duplicates()
+    header_year = issue_frame(stage, 'header_year', bad_types, field='type',
+                              observed=bad_types['type'], expected='<type>_<year>')
+
+    units = df['units'] if 'units' in df.columns else pd.Series(pd.NA, index=df.index)
+    no_units = units.isna() | (units.astype(str).str.strip() == '')
+    pages = df.loc[no_units, ['source', 'page', 'commodity']].drop_duplicates()
+    missing_units = issue_frame(stage, 'missing_units', pages, field='units',
+                                observed='', expected='units from commodity_names_with_units.csv')
+
+    return pd.concat([header_year, missing_units], ignore_index=True)
+
+
+def world_total_sums(df):
+    """Per table (TABLE_KEYS) and PROD_ column: sums of the country rows and of the 'World total' rows
+
+    One groupby over the wide frame; partial results from chunks of the same
+    file can be concatenated and passed to world_total_issues() together.
+    """
+    prod_columns = [col for col in df.columns if col.startswith('PROD_')]
+    is_world = (df['country'] == world_total).rename('is_world')
+    grouped = df.groupby([df[key] for key in TABLE_KEYS] + [is_world], dropna=False)
+    sums = grouped[prod_columns].sum(min_count=1)
+    sums['rows'] = grouped.size()
+    return sums
+
+
+def world_total_issues(sums, stage='cleaned', tolerance=world_total_tolerance):
+    """missing_world_total / world_total_mismatch issues from one or more world_total_sums() results"""
+    if isinstance(sums, (list, tuple)):
+        sums = pd.concat(sums)
+    sums = sums.groupby(level=sums.index.names, dropna=False).sum(min_count=1)
+
+    # Pages with no 'World total' row in any of their tables
+    rows = sums.pop('rows').unstack('is_world', fill_value=0).reindex(columns=[False, True], fill_value=0)
+    per_page = rows.groupby(level=['source', 'page', 'commodity'], dropna=False).sum()
+    missing = per_page[per_page[True] == 0].index.to_frame(index=False)
+    missing_world_total = issue_frame(stage, 'missing_world_total', missing, field='country',
+                                      observed='', expected=world_total)
+
+    # Country sum against World total, for every table and year that has both
+    values = sums.stack().rename('value')
+    values.index = values.index.set_names('field', level=-1)
+    compared = values.unstack('is_world').reindex(columns=[False, True])
+    compared = compared.dropna()
+    countries, world = compared[False], compared[True]
+    off = (countries - world).abs() > tolerance * world.abs()
+    mismatched = compared[off].reset_index()
+    world_total_mismatch = issue_frame(
+        stage, 'world_total_mismatch', mismatched,
+        field=mismatched['type'].astype(str) + ' ' + mismatched['field'],
+        observed=mismatched[False], expected=mismatched[True]
+    )
+
+    return pd.concat([missing_world_total, world_total_mismatch], ignore_index=True)
+
+
+def write_report(stage, issues, path=report_file):
+    """Replace the stage's rows in the report with issues; returns the number of issues"""
+    if isinstance(issues, (list, tuple)):
+        issues = pd.concat(issues, ignore_index=True) if issues else pd.DataFrame(columns=REPORT_COLUMNS)
+
+    # Page order, whatever order the pages were processed in
+    report = issues[REPORT_COLUMNS].sort_values(['source', 'page'], kind='stable')
+    if Path(path).exists():
+        earlier = read_csv(path, dtype=str, keep_default_na=False)
+        report = pd.concat([earlier[earlier['stage'] != stage], report], ignore_index=True)
+    to_csv(report, path)
+
+    if len(issues):
+        counts = issues['check'].value_counts()
+        print(f"⚠ Validation ({stage}): {len(issues)} issue(s) written to {path}: " +
+              ", ".join(f"{check} {count}" for check, count in counts.items()))
+    else:
+        print(f"✓ Validation ({stage}): no issues")
+    return len(issues)